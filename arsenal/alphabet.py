@@ -1,3 +1,6 @@
+from arsenal.integerizer import Integerizer
+
+
 class Alphabet(object):
     """
     Class for maintaining a perfect hash for a set of keys.
@@ -124,3 +127,11 @@ class Alphabet(object):
     encode = __getitem__
     decode = lookup
 
+    # Bulk encoding to and from NumPy arrays (see `Integerizer`).
+    _add = __getitem__
+    _encode_ndarray = Integerizer._encode_ndarray
+    _encode_distinct = Integerizer._encode_distinct
+    encode_array = Integerizer.encode_array
+    decode_array = Integerizer.decode_array
+    merge = Integerizer.merge
+
@@ -1,2 +1,7 @@
 from arsenal.cache.memoize import *
 from arsenal.cache.lazy import *
+from arsenal.cache.logstore import LogStore
+from arsenal.cache.codehash import code_hash
+from arsenal.cache.backends import Shelf, Serializer
+from arsenal.cache.stats import CacheStats, all_stats
+from arsenal.cache.keys import canonical_key, Canonicalizer
@@ -0,0 +1,260 @@
+"""Storage and serialization backends for on-disk caches (see `ShelfBasedCache`).
+
+A `Shelf` maps arbitrary keys to arbitrary values by combining
+
+ - a `Serializer`, which turns values into bytes: pickle (protocol 5 by
+   default, with large buffers such as ndarray data kept out-of-band rather
+   than copied into the pickle stream), optionally followed by compression
+   (`'zlib'`, `'lz4'`, or `'zstd'`) of values larger than a threshold; and
+
+ - a storage, which maps bytes to bytes: `DbmStorage` or `SqliteStorage`.
+
+Writes are only made durable (`sync`) every `sync_every` writes and on
+`close`, rather than after every write.
+
+"""
+import os
+import dbm
+import zlib
+import pickle
+import sqlite3
+import struct
+
+
+def _codec(name, level):
+    "Return `(compress, decompress)` functions for codec `name`."
+    if name == 'zlib':
+        level = 6 if level is None else level
+        return (lambda b: zlib.compress(b, level)), zlib.decompress
+    elif name == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError('install `lz4` to use lz4 compression.')
+        level = 0 if level is None else level
+        return (lambda b: lz4.frame.compress(b, compression_level=level)), lz4.frame.decompress
+    elif name == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('install `zstandard` to use zstd compression.')
+        c = zstandard.ZstdCompressor(level=3 if level is None else level)
+        d = zstandard.ZstdDecompressor()
+        return c.compress, d.decompress
+    else:
+        raise ValueError('unknown compression codec %r' % (name,))
+
+
+class Serializer(object):
+    """
+    Pickle values, optionally compressing the result when it has at least
+    `threshold` bytes.  Out-of-band buffers are not copied on `loads`, so
+    ndarrays in the result are read-only.  `loads` also reads plain pickles
+    (protocol 2 or higher), as written by `shelve`.
+
+    >>> import numpy as np
+    >>> s = Serializer(compress='zlib')
+    >>> x = {'a': np.zeros(10000)}
+    >>> b = s.dumps(x)
+    >>> len(b) < 1000
+    True
+    >>> bool((s.loads(b)['a'] == x['a']).all())
+    True
+
+    """
+
+    # Format: 1-byte codec tag, 4-byte number of out-of-band buffers, 8-byte
+    # length of each buffer, the pickle, and then the buffers.
+    TAGS = {None: b'-', 'zlib': b'z', 'lz4': b'4', 'zstd': b's'}
+
+    def __init__(self, compress=None, threshold=1024, level=None, protocol=5):
+        self.compress = compress
+        self.threshold = threshold
+        self.protocol = protocol
+        self.codecs = {None: (None, None)}
+        if compress is not None:
+            self.codecs[compress] = _codec(compress, level)
+
+    def dumps(self, x):
+        buffers = []
+        if self.protocol >= 5:
+            p = pickle.dumps(x, protocol=self.protocol, buffer_callback=buffers.append)
+        else:
+            p = pickle.dumps(x, protocol=self.protocol)
+        raws = [b.raw() for b in buffers]
+        header = struct.pack('<I%dQ' % len(raws), len(raws), *[r.nbytes for r in raws])
+        body = b''.join([header, p, *raws])
+        codec = None
+        if self.compress is not None and len(body) >= self.threshold:
+            codec = self.compress
+            body = self.codecs[codec][0](body)
+        return self.TAGS[codec] + body
+
+    def loads(self, b):
+        if b[:1] == b'\x80': return pickle.loads(b)   # plain pickle (PROTO opcode)
+        codec = _CODECS[b[:1]]
+        body = memoryview(b)[1:]
+        if codec is not None:
+            if codec not in self.codecs:
+                self.codecs[codec] = _codec(codec, None)
+            body = memoryview(self.codecs[codec][1](body))
+        [n] = struct.unpack_from('<I', body)
+        sizes = struct.unpack_from('<%dQ' % n, body, 4)
+        end = len(body) - sum(sizes)
+        buffers = []
+        i = end
+        for size in sizes:
+            buffers.append(body[i:i+size])
+            i += size
+        return pickle.loads(body[4 + 8*n:end], buffers=buffers)
+
+
+_CODECS = {v: k for k, v in Serializer.TAGS.items()}
+
+
+class DbmStorage(object):
+    "Bytes-to-bytes storage in a `dbm` database."
+
+    def __init__(self, filename):
+        self.db = dbm.open(filename, 'c')
+
+    def __getitem__(self, k):
+        return self.db[k]
+
+    def __setitem__(self, k, v):
+        self.db[k] = v
+
+    def __contains__(self, k):
+        return k in self.db
+
+    def __len__(self):
+        return len(self.db)
+
+    def sync(self):
+        if hasattr(self.db, 'sync'): self.db.sync()
+
+    def close(self):
+        self.db.close()
+
+
+class SqliteStorage(object):
+    """
+    Bytes-to-bytes storage in a sqlite table.  Writes between calls to `sync`
+    are batched into a single transaction.
+    """
+
+    def __init__(self, filename, timeout=60):
+        # `timeout` is how long to wait for another process's write lock.
+        self.db = sqlite3.connect(filename, timeout=timeout, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS claims (key BLOB PRIMARY KEY, pid INTEGER)')
+        self.db.commit()
+
+    def claim(self, k):
+        """
+        Claim key `k` for this process (e.g., while computing its value).
+        Returns False if another live process holds the claim.
+        """
+        pid = os.getpid()
+        cur = self.db.execute('INSERT OR IGNORE INTO claims (key, pid) VALUES (?, ?)', (k, pid))
+        self.db.commit()
+        if cur.rowcount == 1: return True
+        row = self.db.execute('SELECT pid FROM claims WHERE key = ?', (k,)).fetchone()
+        if row is None: return self.claim(k)   # released in the meantime
+        if row[0] == pid or _alive(row[0]): return row[0] == pid
+        # The claim's process died; take it over.
+        cur = self.db.execute('UPDATE claims SET pid = ? WHERE key = ? AND pid = ?', (pid, k, row[0]))
+        self.db.commit()
+        return cur.rowcount == 1
+
+    def release(self, k):
+        self.db.execute('DELETE FROM claims WHERE key = ? AND pid = ?', (k, os.getpid()))
+        self.db.commit()
+
+    def __getitem__(self, k):
+        row = self.db.execute('SELECT value FROM cache WHERE key = ?', (k,)).fetchone()
+        if row is None: raise KeyError(k)
+        return row[0]
+
+    def __setitem__(self, k, v):
+        self.db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', (k, v))
+
+    def __contains__(self, k):
+        return self.db.execute('SELECT 1 FROM cache WHERE key = ?', (k,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def sync(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+STORAGE = {'dbm': DbmStorage, 'sqlite': SqliteStorage}
+
+
+class Shelf(object):
+    """
+    Persistent mapping from (picklable) keys to (picklable) values.
+
+    >>> import tempfile
+    >>> s = Shelf(tempfile.mkdtemp() + '/shelf', storage='sqlite', compress='zlib')
+    >>> s['a', 1] = list(range(1000))
+    >>> ('a', 1) in s, ('a', 2) in s
+    (True, False)
+    >>> s['a', 1][-1]
+    999
+    >>> s.close()
+
+    """
+
+    def __init__(self, filename, storage='dbm', serializer=None, sync_every=64, **kw):
+        if isinstance(storage, str):
+            storage = STORAGE[storage](filename)
+        self.filename = filename
+        self.storage = storage
+        self.serializer = serializer or Serializer(**kw)
+        self.sync_every = sync_every
+        self.unsynced = 0
+
+    def encode_key(self, k):
+        # Strings are encoded like `shelve` does.  (A utf-8 encoded string
+        # can't begin with the pickle's first byte, so there are no collisions.)
+        if isinstance(k, str): return k.encode('utf-8')
+        return pickle.dumps(k, protocol=4)
+
+    def __getitem__(self, k):
+        return self.serializer.loads(self.storage[self.encode_key(k)])
+
+    def __setitem__(self, k, v):
+        self.storage[self.encode_key(k)] = self.serializer.dumps(v)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def __contains__(self, k):
+        return self.encode_key(k) in self.storage
+
+    def __len__(self):
+        return len(self.storage)
+
+    def sync(self):
+        self.storage.sync()
+        self.unsynced = 0
+
+    def close(self):
+        self.storage.close()
@@ -0,0 +1,105 @@
+"""Fingerprint a function's code, for invalidating persistent caches.
+
+"""
+import re
+import sys
+import types
+import hashlib
+from functools import partial
+
+
+def _unwrap(f):
+    "Strip off decorators (e.g., `memoize`) and partial applications."
+    seen = set()
+    while id(f) not in seen:
+        seen.add(id(f))
+        if isinstance(f, partial):
+            f = f.func
+        elif isinstance(f, types.MethodType):
+            f = f.__func__
+        elif hasattr(f, '__wrapped__'):
+            f = f.__wrapped__
+        elif not isinstance(f, types.FunctionType) and callable(getattr(f, 'func', None)):
+            f = f.func
+        else:
+            break
+    return f
+
+
+def _repr(x):
+    "`repr` that is stable across processes (no addresses, sorted sets)."
+    if isinstance(x, (frozenset, set)):
+        return '{%s}' % ', '.join(sorted(map(_repr, x)))
+    elif isinstance(x, tuple):
+        return '(%s)' % ', '.join(map(_repr, x))
+    return re.sub(' at 0x[0-9a-fA-F]+', '', repr(x))
+
+
+def _package(module):
+    return (module or '').split('.')[0]
+
+
+def code_hash(func):
+    """
+    Hash of the bytecode, constants, and defaults of `func` and, transitively,
+    of every function it references by a global name which is defined in the
+    same top-level package as `func` (including attribute lookups on modules in
+    that package, e.g., `util.helper`).  Functions from other packages (e.g.,
+    the standard library) are not followed.
+
+    The hash changes when the code that computes a function's results is
+    edited, which makes it suitable as a version key for persistent caches.
+    Note that the hash also depends on the Python version because bytecode
+    does.
+
+    >>> def f(x): return x + 1
+    >>> def g(x): return x + 1
+    >>> def h(x): return x + 2
+    >>> code_hash(f) == code_hash(g) != code_hash(h)
+    True
+
+    """
+    func = _unwrap(func)
+    package = _package(getattr(func, '__module__', None))
+    h = hashlib.sha1(repr(sys.version_info[:2]).encode())
+    seen = set()
+
+    def visit_code(code, env):
+        h.update(code.co_code)
+        for c in code.co_consts:
+            if isinstance(c, types.CodeType):
+                visit_code(c, env)
+            else:
+                h.update(_repr(c).encode())
+        h.update(_repr(code.co_names).encode())
+        # Follow functions referenced by global name, or attributes of modules
+        # referenced by global name.
+        for name in code.co_names:
+            x = env.get(name)
+            if isinstance(x, types.ModuleType) and _package(x.__name__) == package:
+                for attr in code.co_names:
+                    if hasattr(x, attr):
+                        visit(getattr(x, attr))
+            else:
+                visit(x)
+
+    def visit(f):
+        if f is None or not callable(f): return
+        f = _unwrap(f)
+        if not isinstance(f, types.FunctionType) or id(f) in seen: return
+        if _package(f.__module__) != package: return
+        seen.add(id(f))
+        h.update(_repr(f.__defaults__).encode())
+        h.update(_repr(f.__kwdefaults__).encode())
+        for cell in f.__closure__ or ():
+            try:
+                visit(cell.cell_contents)
+            except ValueError:   # empty cell
+                pass
+        visit_code(f.__code__, f.__globals__)
+
+    if isinstance(func, types.FunctionType):
+        visit(func)
+    else:
+        h.update(_repr(func).encode())
+    return h.hexdigest()
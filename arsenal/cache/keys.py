@@ -0,0 +1,108 @@
+"""Cache keys for memoized functions.
+
+By default, `memoize` keys its cache on the (hashable) positional arguments
+plus the keyword arguments sorted by name.  Pass `key=canonical_key` to also
+accept unhashable arguments: lists, dicts, sets, and ndarrays (which are keyed
+by a digest of their contents).
+
+"""
+import hashlib
+
+
+class kwargs_marker:
+    "Separates positional and keyword arguments in cache keys."
+
+
+def make_key(args, kwargs):
+    "Default cache key for a call with positional `args` and keyword `kwargs`."
+    if not kwargs: return args
+    return args + (kwargs_marker,) + tuple(sorted(kwargs.items()))
+
+
+def array_digest(x, sample=None):
+    """
+    Digest of an ndarray's contents.  If `sample` is given and the array has
+    more than `sample` elements, only `sample` evenly spaced elements are
+    hashed, which is faster but means that arrays that differ elsewhere will
+    collide.
+    """
+    x = x.ravel()
+    if sample is not None and x.shape[0] > sample:
+        x = x[::x.shape[0] // sample][:sample]
+    if not x.flags.c_contiguous: x = x.copy()
+    return hashlib.blake2b(x.view('u1'), digest_size=16).hexdigest()
+
+
+class Canonicalizer(object):
+    """
+    Cache key function which turns unhashable arguments into hashable
+    equivalents.
+
+    >>> key = Canonicalizer()
+    >>> key([1, {'b': 2, 'a': [3]}], y={4}) == key([1, {'a': [3], 'b': 2}], y={4})
+    True
+    >>> key([1, 2]) == key((1, 2))
+    False
+
+    >>> import numpy as np
+    >>> key(np.arange(3)) == key(np.arange(3)) != key(np.arange(3.))
+    True
+
+    """
+
+    def __init__(self, sample=None):
+        self.sample = sample
+
+    def canonicalize(self, x):
+        if isinstance(x, (str, bytes, int, float, bool, type(None))):
+            return x
+        elif isinstance(x, tuple):
+            return tuple(map(self.canonicalize, x))
+        elif isinstance(x, list):
+            return (list, tuple(map(self.canonicalize, x)))
+        elif isinstance(x, dict):
+            items = [(self.canonicalize(k), self.canonicalize(v)) for k, v in x.items()]
+            try:
+                items.sort()
+            except TypeError:   # keys of different types
+                items.sort(key=repr)
+            return (dict, tuple(items))
+        elif isinstance(x, (set, frozenset)):
+            return (frozenset, frozenset(map(self.canonicalize, x)))
+        elif type(x).__module__ == 'numpy' and hasattr(x, 'dtype'):
+            if x.shape == ():   # numpy scalar
+                return x.item() if not x.dtype.hasobject else self.canonicalize(x.item())
+            if x.dtype.hasobject:
+                return ('ndarray', x.shape, tuple(map(self.canonicalize, x.ravel())))
+            return ('ndarray', x.dtype.str, x.shape, array_digest(x, self.sample))
+        return x
+
+    def __call__(self, *args, **kwargs):
+        return make_key(self.canonicalize(args),
+                        {k: self.canonicalize(v) for k, v in kwargs.items()})
+
+
+canonical_key = Canonicalizer()
+
+
+def stable_key(k):
+    """
+    Equivalent of the cache key `k` whose pickle does not depend on hash
+    randomization (i.e., is the same in every process): sets and frozensets in
+    `k` are replaced by their sorted elements.  Used to key caches that are
+    shared between processes.
+
+    >>> stable_key((1, frozenset({'b', 'a'}), (kwargs_marker, {3})))[1]
+    (<class 'frozenset'>, ('a', 'b'))
+
+    """
+    if isinstance(k, tuple):
+        return tuple(map(stable_key, k))
+    elif isinstance(k, (set, frozenset)):
+        xs = [stable_key(x) for x in k]
+        try:
+            xs.sort()
+        except TypeError:   # elements of different types
+            xs.sort(key=repr)
+        return (frozenset, tuple(xs))
+    return k
@@ -1,7 +1,7 @@
-# TODO:
-#  - consider allowing lazy things to depend on one another
-
+import weakref
+from time import perf_counter
 from types import GeneratorType
+from arsenal.cache.stats import CacheStats
 
 class lazy(object):
     """
@@ -12,10 +12,13 @@ class lazy(object):
     Note: instances must have a `__dict__` attribute in order for this property
     to work, i.e. no '__slots__' class attribute.
 
-    Implementation detail: this is not implemented as a data descriptor so that
-    we can completely avoid the function call overhead. If one choses to invoke
-    `__get__` by hand the property will still work as expected because the
-    lookup logic is replicated in `__get__` for manual invocation.
+    Implementation detail: this is a data descriptor (it defines `__set__`, so
+    the property cannot be assigned), which means that every attribute access
+    goes through `__get__`; the computed value is stored in the instance's
+    `__dict__` under the same name and looked up there.
+
+    The `stats` attribute records computations and hits, i.e., every access
+    after the first (see `arsenal.cache.stats`).
     """
 
     def __init__(self, func):
@@ -23,6 +26,7 @@ class lazy(object):
         self.__module__ = func.__module__
         self.__doc__ = func.__doc__
         self.func = func
+        self.stats = CacheStats('lazy(%s)' % func.__qualname__, track_keys=False)
 
     def __get__(self, obj, type_=None):
         if obj is None:
@@ -30,10 +34,14 @@ class lazy(object):
         try:
             value = obj.__dict__[self.__name__]
         except KeyError:
+            b4 = perf_counter()
             value = self.func(obj)
             if isinstance(value, GeneratorType):   # store generators as lists
                 value = list(value)
             obj.__dict__[self.__name__] = value
+            self.stats.miss(None, perf_counter() - b4, value)
+        else:
+            self.stats.hit(None)
         return value
 
     def __set__(self, obj, value):
@@ -42,3 +50,149 @@ class lazy(object):
     def __delete__(self, obj):
         raise NotImplementedError
 
+
+
+class _WeakIdTable(object):
+    """
+    Map from objects (by identity, so they need not be hashable) to values.
+    Entries are dropped when their object is garbage collected.
+    """
+    def __init__(self):
+        self.data = {}   # id(obj) -> (weakref(obj), value)
+
+    def get(self, obj):
+        e = self.data.get(id(obj))
+        return None if e is None else e[1]
+
+    def setdefault(self, obj, factory):
+        i = id(obj)
+        e = self.data.get(i)
+        if e is None:
+            data = self.data
+            e = data[i] = (weakref.ref(obj, lambda _: data.pop(i, None)), factory())
+        return e[1]
+
+    def __len__(self):
+        return len(self.data)
+
+
+_stack = []                      # reads recorded while computing `tracked_lazy` values
+_values = _WeakIdTable()         # obj -> {name: value} for objects without a `__dict__`
+_dependents = _WeakIdTable()     # obj -> {attr: {(id(dep), name): weakref(dep)}}
+
+
+class Tracked(object):
+    """
+    Mixin for objects whose attributes are inputs to `tracked_lazy` properties:
+    it records attribute reads made while a `tracked_lazy` value is computed
+    and invalidates the values that read an attribute when it is reassigned or
+    deleted.  (In-place mutation, e.g., `obj.xs.append(x)`, is not detected.)
+    """
+    __slots__ = ('__weakref__',)
+
+    def __getattribute__(self, name):
+        if _stack and name[:2] != '__':
+            _stack[-1][id(self), name] = self
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        invalidate(self, name)
+
+    def __delattr__(self, name):
+        object.__delattr__(self, name)
+        invalidate(self, name)
+
+
+def invalidate(obj, name):
+    "Forget all `tracked_lazy` values computed from `obj.name`, transitively."
+    deps = _dependents.get(obj)
+    if not deps: return
+    for (_, lazy_name), ref in deps.pop(name, {}).items():
+        d = ref()
+        if d is not None and _forget(d, lazy_name):
+            invalidate(d, lazy_name)
+
+
+def _store(obj):
+    try:
+        return object.__getattribute__(obj, '__dict__')
+    except AttributeError:   # `__slots__` class
+        return _values.setdefault(obj, dict)
+
+
+def _forget(obj, name):
+    return _store(obj).pop(name, _store) is not _store
+
+
+class tracked_lazy(lazy):
+    """
+    Variant of `lazy` that records the attributes of `Tracked` objects (e.g.,
+    `self`) that the method reads, including other `tracked_lazy` properties,
+    and is recomputed after any of them are reassigned.  Classes with
+    `__slots__` are supported (values are kept in a side table keyed weakly on
+    the instance).
+
+    >>> class Box(Tracked):
+    ...     __slots__ = ('w', 'h', 'd')
+    ...     def __init__(self, w, h, d):
+    ...         self.w = w; self.h = h; self.d = d
+    ...     @tracked_lazy
+    ...     def area(self):
+    ...         print('compute area')
+    ...         return self.w * self.h
+    ...     @tracked_lazy
+    ...     def volume(self):
+    ...         print('compute volume')
+    ...         return self.area * self.d
+    >>> b = Box(2, 3, 4)
+    >>> b.volume
+    compute volume
+    compute area
+    24
+    >>> b.d = 5          # only `volume` depends on `d`
+    >>> b.volume
+    compute volume
+    30
+    >>> b.w = 1          # `area` and, transitively, `volume` depend on `w`
+    >>> b.volume
+    compute volume
+    compute area
+    15
+
+    Values are computed at most once per instance until they are invalidated
+    or `reset`.  Dependency tracking is not thread safe.
+
+    """
+
+    def __get__(self, obj, type_=None):
+        if obj is None:
+            return self
+        store = _store(obj)
+        try:
+            value = store[self.__name__]
+        except KeyError:
+            pass
+        else:
+            self.stats.hit(None)
+            return value
+        reads = {}
+        _stack.append(reads)
+        try:
+            b4 = perf_counter()
+            value = self.func(obj)
+            if isinstance(value, GeneratorType):   # store generators as lists
+                value = list(value)
+        finally:
+            _stack.pop()
+        store[self.__name__] = value
+        self.stats.miss(None, perf_counter() - b4, value)
+        ref = weakref.ref(obj)
+        for (_, attr), x in reads.items():
+            _dependents.setdefault(x, dict).setdefault(attr, {})[id(obj), self.__name__] = ref
+        return value
+
+    def reset(self, obj):
+        "Forget the value for `obj` and the values that depend on it."
+        if _forget(obj, self.__name__):
+            invalidate(obj, self.__name__)
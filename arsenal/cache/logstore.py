@@ -0,0 +1,229 @@
+"""Append-only, log-structured on-disk key-value store.
+
+Values are appended to a record file as they are written and an offset index
+(key -> position in the record file) is appended to a second, much smaller
+file.  Opening a store only reads the index; values are unpickled lazily, one
+key at a time.  A crash can only lose the record that was being written.
+
+Overwriting a key leaves a stale record behind; once stale records make up
+more than `compact_ratio` of the record file, it is compacted in a background
+thread.
+
+Both files start with a random generation token, which compaction changes, so
+an index is only used with the record file that it was written for.  (If
+compaction is interrupted between replacing the two files, the new index is
+recovered from its temporary file; otherwise, the store is emptied.)
+
+"""
+import os
+import pickle
+import threading
+import uuid
+
+
+def _header(filename):
+    "First pickle in `filename`, or None."
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+class LogStore(object):
+    """
+    Persistent mapping backed by an append-only record file and offset index.
+
+    >>> import tempfile
+    >>> filename = tempfile.mkdtemp() + '/store'
+    >>> s = LogStore(filename)
+    >>> s['a'] = [1, 2, 3]
+    >>> s['b'] = 'B'
+    >>> s.close()
+
+    >>> s = LogStore(filename)
+    >>> s['a'], 'b' in s, 'c' in s, len(s)
+    ([1, 2, 3], True, False, 2)
+
+    The store is invalidated (emptied) if it is opened with a different
+    `version` than the one it was written with.
+
+    >>> s.close()
+    >>> len(LogStore(filename, version=1))
+    0
+
+    """
+
+    def __init__(self, filename, version=None, compact_ratio=0.5,
+                 min_compact_size=2**20, protocol=pickle.HIGHEST_PROTOCOL):
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.version = version
+        self.compact_ratio = compact_ratio
+        self.min_compact_size = min_compact_size
+        self.protocol = protocol
+        self.lock = threading.RLock()
+        self.compactor = None
+        self.index = {}      # key -> (offset, length) of its value in the record file
+        self.size = 0        # size of the record file in bytes
+        self.stale = 0       # bytes in the record file used by overwritten values
+        self._open()
+
+    def _open(self):
+        self.index = {}
+        self.stale = 0
+        good = 0
+        valid = False
+        try:
+            with open(self.filename, 'rb') as f:
+                token = pickle.load(f)
+                start = f.tell()
+            # Finish an interrupted compaction (see `_compact`).
+            tmp_idx = self.index_filename + '.compact~'
+            if (_header(self.index_filename) != (self.version, token)
+                and _header(tmp_idx) == (self.version, token)):
+                os.replace(tmp_idx, self.index_filename)
+            with open(self.index_filename, 'rb') as f:
+                size = os.path.getsize(self.filename)
+                valid = (pickle.load(f) == (self.version, token))
+                good = f.tell()
+                while valid:
+                    try:
+                        k, off, n = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        break     # partially written entry (e.g., crash during write)
+                    if off + n > size: break
+                    if k in self.index: self.stale += self.index[k][1]
+                    self.index[k] = (off, n)
+                    good = f.tell()
+        except (IOError, EOFError, pickle.UnpicklingError):
+            valid = False
+
+        if valid:
+            # Drop anything after the last complete entry so that future
+            # appends are readable.
+            self.size = max((off + n for off, n in self.index.values()), default=start)
+            self.data = open(self.filename, 'r+b')
+            self.data.truncate(self.size)
+            self.data.seek(self.size)
+            self.idx = open(self.index_filename, 'r+b')
+            self.idx.truncate(good)
+            self.idx.seek(good)
+        else:
+            self.index = {}
+            self.stale = 0
+            token = uuid.uuid4().hex
+            self.data = open(self.filename, 'wb')
+            pickle.dump(token, self.data, protocol=self.protocol)
+            self.data.flush()
+            self.size = self.data.tell()
+            self.idx = open(self.index_filename, 'wb')
+            pickle.dump((self.version, token), self.idx, protocol=self.protocol)
+            self.idx.flush()
+        self.reader = open(self.filename, 'rb')
+
+    def __contains__(self, k):
+        return k in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def keys(self):
+        return list(self.index)
+
+    def __getitem__(self, k):
+        with self.lock:
+            off, n = self.index[k]
+            self.reader.seek(off)
+            return pickle.loads(self.reader.read(n))
+
+    def get(self, k, default=None):
+        try:
+            return self[k]
+        except KeyError:
+            return default
+
+    def __setitem__(self, k, v):
+        b = pickle.dumps(v, protocol=self.protocol)
+        with self.lock:
+            off = self.size
+            self.data.write(b)
+            self.data.flush()
+            self.size += len(b)
+            # The index entry is written after the record, so an entry is
+            # never visible before its value is on disk.
+            pickle.dump((k, off, len(b)), self.idx, protocol=self.protocol)
+            self.idx.flush()
+            if k in self.index: self.stale += self.index[k][1]
+            self.index[k] = (off, len(b))
+            if self.needs_compaction():
+                self.compact(background=True)
+
+    def needs_compaction(self):
+        return (self.size >= self.min_compact_size
+                and self.stale > self.compact_ratio * self.size)
+
+    def compact(self, background=False):
+        "Rewrite the record file without stale records."
+        if background:
+            if self.compactor is None or not self.compactor.is_alive():
+                self.compactor = threading.Thread(target=self._compact, daemon=True)
+                self.compactor.start()
+            return self.compactor
+        self._compact()
+
+    def _compact(self):
+        tmp = self.filename + '.compact~'
+        tmp_idx = self.index_filename + '.compact~'
+        with self.lock:
+            snapshot = dict(self.index)
+        new_index = {}
+        token = uuid.uuid4().hex   # new generation
+        with open(self.filename, 'rb') as src, open(tmp, 'wb') as dst, open(tmp_idx, 'wb') as idx:
+            pickle.dump(token, dst, protocol=self.protocol)
+            pickle.dump((self.version, token), idx, protocol=self.protocol)
+
+            def copy(k, off, n):
+                src.seek(off)
+                new_index[k] = (dst.tell(), n)
+                dst.write(src.read(n))
+                pickle.dump((k, new_index[k][0], n), idx, protocol=self.protocol)
+
+            # Most of the copying happens without holding the lock; the record
+            # file is append-only, so the snapshot's offsets remain valid.
+            for k, (off, n) in snapshot.items():
+                copy(k, off, n)
+
+            with self.lock:
+                # Catch up with the writes that happened during the copy.
+                for k, (off, n) in self.index.items():
+                    if snapshot.get(k) != (off, n):
+                        copy(k, off, n)
+                dst.close(); idx.close()
+                self._close_files()
+                # A crash between these leaves a record file whose token does
+                # not match the index; `_open` then finishes the second step.
+                os.replace(tmp, self.filename)
+                os.replace(tmp_idx, self.index_filename)
+                self._open()
+
+    def _close_files(self):
+        self.data.close()
+        self.idx.close()
+        self.reader.close()
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            if not self.data.closed:
+                # Writes during a background compaction may have left it
+                # needed again.
+                if self.needs_compaction(): self._compact()
+                self._close_files()
+
+    def __repr__(self):
+        return 'LogStore(%r, size=%s, stale=%s)' % (self.filename, len(self), self.stale)
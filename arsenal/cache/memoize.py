@@ -1,74 +1,586 @@
+import os
 import atexit
-import shelve
+import asyncio
+import inspect
+import threading
 import pickle as pickle
 
+from time import time, perf_counter, sleep
 from functools import partial
+from collections import OrderedDict, namedtuple
+
+from arsenal.cache.logstore import LogStore
+from arsenal.cache.codehash import code_hash
+from arsenal.cache.backends import Shelf
+from arsenal.cache.stats import CacheStats, sizeof
+from arsenal.cache.keys import make_key, canonical_key, Canonicalizer, stable_key
+
+
+# Same fields as `functools.lru_cache(...).cache_info()`.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """
+    Bounded mapping which evicts the least-recently used entry when full.  All
+    operations are O(1).
+    """
+    def __init__(self, maxsize):
+        assert maxsize > 0, maxsize
+        self.maxsize = maxsize
+        self.data = OrderedDict()     # ordered from least to most recently used
+        self.evictions = 0
+        self.on_evict = None          # called with each evicted key
+
+    def __getitem__(self, k):
+        v = self.data[k]
+        self.data.move_to_end(k)
+        return v
+
+    def __setitem__(self, k, v):
+        if k in self.data:
+            self.data.move_to_end(k)
+        elif len(self.data) >= self.maxsize:
+            old, _ = self.data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None: self.on_evict(old)
+        self.data[k] = v
+
+    def __contains__(self, k):
+        return k in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+
+class LFUCache(object):
+    """
+    Bounded mapping which evicts the least-frequently used entry when full (ties
+    are broken by recency).  Keys are kept in buckets by use count, so all
+    operations are O(1).
+    """
+    def __init__(self, maxsize):
+        assert maxsize > 0, maxsize
+        self.maxsize = maxsize
+        self.data = {}       # key -> value
+        self.freq = {}       # key -> use count
+        self.bucket = {}     # use count -> keys ordered from least to most recently used
+        self.min_freq = 0
+        self.evictions = 0
+        self.on_evict = None          # called with each evicted key
+
+    def _touch(self, k):
+        f = self.freq[k]
+        b = self.bucket[f]
+        del b[k]
+        if not b:
+            del self.bucket[f]
+            if self.min_freq == f: self.min_freq = f + 1
+        self.freq[k] = f + 1
+        if f + 1 not in self.bucket: self.bucket[f + 1] = OrderedDict()
+        self.bucket[f + 1][k] = None
+
+    def __getitem__(self, k):
+        v = self.data[k]
+        self._touch(k)
+        return v
+
+    def __setitem__(self, k, v):
+        if k in self.data:
+            self.data[k] = v
+            self._touch(k)
+            return
+        if len(self.data) >= self.maxsize:
+            b = self.bucket[self.min_freq]
+            old, _ = b.popitem(last=False)
+            if not b: del self.bucket[self.min_freq]
+            del self.data[old], self.freq[old]
+            self.evictions += 1
+            if self.on_evict is not None: self.on_evict(old)
+        self.data[k] = v
+        self.freq[k] = 1
+        if 1 not in self.bucket: self.bucket[1] = OrderedDict()
+        self.bucket[1][k] = None
+        self.min_freq = 1
+
+    def __contains__(self, k):
+        return k in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+        self.freq.clear()
+        self.bucket.clear()
+        self.min_freq = 0
+
+
+class TTLCache(object):
+    """
+    Mapping whose entries expire `ttl` seconds after they were written.  If
+    `maxsize` is given, the entry closest to expiring is evicted when full.
+    Entries are kept in order of expiration, so all operations are amortized
+    O(1).
+    """
+    def __init__(self, maxsize, ttl, timer=time):
+        assert maxsize is None or maxsize > 0, maxsize
+        assert ttl > 0, ttl
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.data = OrderedDict()     # key -> (expiration time, value)
+        self.evictions = 0
+        self.on_evict = None          # called with each evicted key
+
+    def expire(self, now=None):
+        "Drop all expired entries."
+        if now is None: now = self.timer()
+        while self.data:
+            k, (t, _) = next(iter(self.data.items()))
+            if t > now: break
+            del self.data[k]
+            self.evictions += 1
+            if self.on_evict is not None: self.on_evict(k)
+
+    def __getitem__(self, k):
+        t, v = self.data[k]
+        if t <= self.timer():
+            del self.data[k]
+            self.evictions += 1
+            if self.on_evict is not None: self.on_evict(k)
+            raise KeyError(k)
+        return v
+
+    def __setitem__(self, k, v):
+        now = self.timer()
+        self.expire(now)
+        if k in self.data:
+            del self.data[k]
+        elif self.maxsize is not None and len(self.data) >= self.maxsize:
+            old, _ = self.data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None: self.on_evict(old)
+        self.data[k] = (now + self.ttl, v)
+
+    def __contains__(self, k):
+        try:
+            self[k]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+
+_UNCACHABLE = ('uncachable arguments %r passed to memoized function'
+               ' (see the `key` option of `memoize`).')
 
 
 # TODO:
 #  * add option to pass a reference to another cache
 class memoize(object):
-    """ cache a function's return value to avoid recalulation """
-    def __init__(self, func):
+    """
+    Cache a function's return value to avoid recalulation.
+
+    By default, the cache is unbounded.  Pass `maxsize` to bound it, with
+    `policy` picking what gets evicted when it is full: `'lru'` (least-recently
+    used), `'lfu'` (least-frequently used), or `'ttl'` (entries also expire
+    `ttl` seconds after they are computed).
+
+    >>> @memoize(maxsize=2)
+    ... def f(x):
+    ...     return x**2
+    >>> [f(x) for x in [1, 2, 1, 3, 1]]
+    [1, 4, 1, 9, 1]
+    >>> f.cache_info()
+    CacheInfo(hits=2, misses=3, maxsize=2, currsize=2)
+    >>> f.evictions
+    1
+
+    When used on a method, all instances share a single cache (keyed on `self`)
+    unless `shared=False`, in which case each instance gets its own cache.
+
+    Hit counts, compute times, and the hottest keys are recorded in `stats`
+    (see `arsenal.cache.stats`).  Per-key statistics are only kept for
+    unbounded caches unless `track_keys=True`.
+
+    The cache is keyed on the positional arguments and the keyword arguments
+    (sorted by name), which must be hashable.  Pass `key`, a function of the
+    same arguments as `func`, to compute keys differently, e.g.,
+    `key=canonical_key` to allow lists, dicts, sets, and ndarrays (see
+    `arsenal.cache.keys`).
+
+    >>> @memoize(key=canonical_key)
+    ... def total(xs, scale=1):
+    ...     return scale * sum(xs)
+    >>> total([1, 2, 3]), total([1, 2, 3], scale=1), total.cache_info().hits
+    (6, 6, 0)
+    >>> total([1, 2, 3]), total.cache_info().hits
+    (6, 1)
+
+    """
+
+    def __new__(cls, func=None, **kw):
+        if func is None:   # called with options, e.g., `@memoize(maxsize=128)`
+            return lambda func: cls(func, **kw)
+        return super().__new__(cls)
+
+    def __init__(self, func, maxsize=None, policy='lru', ttl=None, shared=True, key=None,
+                 track_keys=None):
         self.func = func
-        self.cache = {}
+        self.key = key
+        self.maxsize = maxsize
+        self.policy = policy
+        self.ttl = ttl
+        self.shared = shared
+        self.cache = self._new_cache()
+        # Per-instance copies (see `__get__`) wrap a `partial` of the method.
+        wrapped = func.func if isinstance(func, partial) else func
         try:
-            self.__name__ = func.__name__
-            self.__doc__ = func.__doc__
+            self.__name__ = wrapped.__name__
+            self.__doc__ = wrapped.__doc__
         except AttributeError:
             pass
+        if track_keys is None: track_keys = maxsize is None
+        self.track_keys = track_keys
+        self.stats = CacheStats(getattr(self, '__name__', repr(func)), track_keys=track_keys)
+        if hasattr(self.cache, 'on_evict'): self.cache.on_evict = self.stats.evict
+
+    def _new_cache(self):
+        if self.policy == 'ttl':
+            assert self.ttl is not None, 'policy="ttl" requires a `ttl`'
+            return TTLCache(self.maxsize, self.ttl)
+        elif self.policy not in ('lru', 'lfu'):
+            raise ValueError('unknown cache policy %r' % (self.policy,))
+        elif self.maxsize is None:
+            return {}
+        elif self.policy == 'lru':
+            return LRUCache(self.maxsize)
+        else:
+            return LFUCache(self.maxsize)
 
     def __get__(self, obj, objtype=None):
         "define `__get__` in case this function is a method."
         #print('  method get', obj, objtype)
         if obj is None: return self.func
-        return partial(self, obj)
+        if self.shared: return partial(self, obj)
+        # Give the instance its own cache; storing it in the instance's
+        # `__dict__` means we won't be called again for this instance.
+        m = obj.__dict__[self.__name__] = type(self)(partial(self.func, obj), **self._options())
+        return m
 
-    def __call__(self, *args):
+    def _options(self):
+        "Keyword arguments for creating a copy of this cache (see `__get__`)."
+        return dict(maxsize=self.maxsize, policy=self.policy, ttl=self.ttl,
+                    key=self.key, track_keys=self.track_keys)
+
+    def _key(self, args, kw):
+        if self.key is not None: return self.key(*args, **kw)
+        return make_key(args, kw)
+
+    def __call__(self, *args, **kw):
+        k = args if self.key is None and not kw else self._key(args, kw)
         try:
-            return self.cache[args]
+            value = self.cache[k]
         except KeyError:
-            value = self.func(*args)
+            b4 = perf_counter()
+            value = self.func(*args, **kw)
             try:
-                self.cache[args] = value
+                self.cache[k] = value
             except TypeError:
                 # uncachable -- for instance, passing a list as an argument.
-                raise TypeError('uncachable arguments %r passed to memoized function.' % (args,))
+                raise TypeError(_UNCACHABLE % (k,))
+            self.stats.miss(k, perf_counter() - b4, value)
             return value
         except TypeError:
             # uncachable -- for instance, passing a list as an argument.
-            raise TypeError('uncachable arguments %r passed to memoized function.' % (args,))
+            raise TypeError(_UNCACHABLE % (k,))
+        else:
+            self.stats.hit(k)
+            return value
+
+    @property
+    def hits(self):
+        return self.stats.hits
+
+    @property
+    def misses(self):
+        return self.stats.misses
+
+    @property
+    def evictions(self):
+        return getattr(self.cache, 'evictions', 0)
+
+    def cache_info(self):
+        "Report cache statistics in the same format as `functools.lru_cache`."
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.cache))
+
+    def cache_clear(self):
+        "Clear the cache and statistics."
+        self.cache.clear()
+        self.stats.clear()
+        if hasattr(self.cache, 'evictions'): self.cache.evictions = 0
 
     def __repr__(self):
         return '<memoize(%r)>' % self.func
 
 
+class _InFlight(object):
+    "A computation that other threads may wait on."
+    __slots__ = 'done', 'value', 'error'
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class memoize_concurrent(memoize):
+    """
+    Variant of `memoize` which is safe to call from many threads, or from many
+    coroutines if the function is an `async def`.
+
+    Concurrent calls with the same (uncached) arguments are deduplicated: the
+    first caller runs the function, the others wait for its result (or its
+    exception, which is not cached).  Waiters are counted as hits.  For `async
+    def` functions, callers share a single task, so cancelling one caller does
+    not cancel the computation for the others; all callers must use the same
+    event loop.
+
+    """
+
+    def __init__(self, func, **kw):
+        super().__init__(func, **kw)
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.is_coroutine = inspect.iscoroutinefunction(func)
+
+    def __call__(self, *args, **kw):
+        k = self._key(args, kw)
+        if self.is_coroutine:
+            return self._acall(k, args, kw)
+        with self.lock:
+            try:
+                value = self.cache[k]
+            except KeyError:
+                pass
+            except TypeError:
+                raise TypeError(_UNCACHABLE % (k,))
+            else:
+                self.stats.hit(k)
+                return value
+            call = self.inflight.get(k)
+            if call is None:
+                call = self.inflight[k] = _InFlight()
+                leader = True
+            else:
+                self.stats.hit(k)
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        b4 = perf_counter()
+        try:
+            call.value = self.func(*args, **kw)
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            with self.lock:
+                self.cache[k] = call.value
+                self.stats.miss(k, perf_counter() - b4, call.value)
+            return call.value
+        finally:
+            with self.lock:
+                del self.inflight[k]
+            call.done.set()
+
+    async def _acall(self, k, args, kw):
+        try:
+            value = self.cache[k]
+        except KeyError:
+            pass
+        except TypeError:
+            raise TypeError(_UNCACHABLE % (k,))
+        else:
+            self.stats.hit(k)
+            return value
+        task = self.inflight.get(k)
+        if task is None:
+            task = self.inflight[k] = asyncio.ensure_future(self.func(*args, **kw))
+            task.add_done_callback(partial(self._adone, k, perf_counter()))
+        else:
+            self.stats.hit(k)
+        return await asyncio.shield(task)
+
+    def _adone(self, k, b4, task):
+        del self.inflight[k]
+        if not task.cancelled() and task.exception() is None:
+            self.cache[k] = task.result()
+            self.stats.miss(k, perf_counter() - b4, task.result())
+
+    def __repr__(self):
+        return '<memoize_concurrent(%r)>' % self.func
+
+
+class memoize_shared(memoize):
+    """
+    Variant of `memoize` whose results are shared between processes (e.g., the
+    workers of a `multiprocessing.Pool`) through a sqlite file, which takes
+    care of locking.  Each process also keeps the results it has seen in its
+    own (optionally bounded, see `memoize`) cache.  Hits in the shared cache
+    are counted in `shared_hits` as well as `hits`.
+
+    A process claims a key (in a table of the sqlite file) before computing
+    its value, so a key is computed by only one process at a time; other
+    processes poll the file every `poll` seconds until the value appears.
+    Claims of processes that died are taken over; if the function raises, the
+    claim is released and the next caller computes the value.  (Claims are
+    identified by process id, so all processes must be on the same machine.)
+    Keys are stored as pickles, with sets in them sorted (see `stable_key`),
+    so that every process encodes a key the same way.
+
+    Module-level functions decorated with `memoize_shared` are pickled by
+    reference, so they can be passed to `Pool.map`.  Each process opens its
+    own connection to the file, including processes created by `fork`.
+
+    """
+
+    def __init__(self, func, filename=None, compress=None, poll=0.01, **kw):
+        super().__init__(func, **kw)
+        self.filename = filename or '{self.__name__}.shared.sqlite~'.format(self=self)
+        self.compress = compress
+        self.poll = poll
+        self.shared_hits = 0
+        self._shelf = None
+        self._pid = None
+        wrapped = func.func if isinstance(func, partial) else func
+        self.__module__ = getattr(wrapped, '__module__', None)
+        self.__qualname__ = getattr(wrapped, '__qualname__', None)
+        # The shared file is keyed on the instance for per-instance copies.
+        self._owner = func.args if isinstance(func, partial) else ()
+
+    def _options(self):
+        return dict(super()._options(), filename=self.filename, compress=self.compress,
+                    poll=self.poll)
+
+    @property
+    def shelf(self):
+        if self._pid != os.getpid():
+            self._shelf = Shelf(self.filename, storage='sqlite', compress=self.compress,
+                                sync_every=1)
+            self._pid = os.getpid()
+        return self._shelf
+
+    def __call__(self, *args, **kw):
+        k = self._key(args, kw)
+        try:
+            value = self.cache[k]
+        except KeyError:
+            pass
+        except TypeError:
+            raise TypeError(_UNCACHABLE % (k,))
+        else:
+            self.stats.hit(k)
+            return value
+        shelf = self.shelf
+        sk = stable_key(k)
+        if self._owner: sk = self._owner + (sk,)
+        while True:
+            try:
+                value = shelf[sk]
+            except KeyError:
+                pass
+            else:
+                self.stats.hit(k)
+                self.shared_hits += 1
+                break
+            if shelf.storage.claim(shelf.encode_key(sk)):
+                try:
+                    try:
+                        value = shelf[sk]   # finished before we claimed it
+                    except KeyError:
+                        b4 = perf_counter()
+                        value = shelf[sk] = self.func(*args, **kw)
+                        self.stats.miss(k, perf_counter() - b4, value)
+                    else:
+                        self.stats.hit(k)
+                        self.shared_hits += 1
+                finally:
+                    shelf.storage.release(shelf.encode_key(sk))
+                break
+            sleep(self.poll)   # another process is computing it
+        self.cache[k] = value
+        return value
+
+    def cache_clear(self):
+        "Clear this process's cache and statistics (not the shared cache)."
+        super().cache_clear()
+        self.shared_hits = 0
+
+    def __reduce__(self):
+        return self.__qualname__
+
+    def __repr__(self):
+        return '<memoize_shared(%r)>' % self.func
+
+
 class ShelfBasedCache(object):
-    """ cache a function's return value to avoid recalulation and save cache in a shelve. """
-    def __init__(self, func, key, None_is_bad=False):
+    """
+    cache a function's return value to avoid recalulation and save cache in a
+    `Shelf` (see `arsenal.cache.backends`).
+
+    `storage` is `'dbm'` or `'sqlite'`; `compress` (`None`, `'zlib'`, `'lz4'`
+    or `'zstd'`) compresses values with at least `threshold` bytes after
+    pickling.  The shelf is synced every `sync_every` writes and at exit.
+
+    The default `filename` is `{func.__name__}.shelf~` for dbm storage (as
+    when caches were `shelve` files, which are still readable) and
+    `{func.__name__}.sqlite~` for sqlite storage.
+    """
+    def __init__(self, func, key, None_is_bad=False, filename=None, storage='dbm',
+                 compress=None, threshold=1024, sync_every=64):
         self.func = func
-        self.filename = '{self.func.__name__}.shelf~'.format(self=self)
-        self.cache = shelve.open(self.filename, flag='c') #, writeback=True)
+        ext = 'shelf' if storage == 'dbm' else storage
+        self.filename = filename or '{self.func.__name__}.{ext}~'.format(self=self, ext=ext)
+        self.cache = Shelf(self.filename, storage=storage, compress=compress,
+                           threshold=threshold, sync_every=sync_every)
         self.key = key
         self.None_is_bad = None_is_bad
         self.__name__ = 'ShelfBasedCache(%s)' % func.__name__
+        self.stats = CacheStats(self.__name__)
+        atexit.register(self.cache.sync)
     def __call__(self, *args):
         p_args = self.key(args)
         value = None
         recompute = True
-        if self.cache.has_key(p_args):
+        if p_args in self.cache:
             recompute = False
             value = self.cache[p_args]
             if value is None and self.None_is_bad:
                 recompute = True
         if recompute:
+            b4 = perf_counter()
             self.cache[p_args] = value = self.func(*args)
-            self.cache.sync()
+            self.stats.miss(p_args, perf_counter() - b4, value)
+        else:
+            self.stats.hit(p_args)
         return value
 
-def persistent_cache(key=lambda x: x, None_is_bad=False):
+def persistent_cache(key=lambda x: x, None_is_bad=False, **kw):
     def wrap(f):
-        return ShelfBasedCache(f, key, None_is_bad=None_is_bad)
+        return ShelfBasedCache(f, key, None_is_bad=None_is_bad, **kw)
     return wrap
 
 
@@ -80,19 +592,39 @@ class memoize_persistent(object):
     cache a function's return value to avoid recalulation and save the
     cache (via pickle) at system exit so that it persists.
 
-    WARNING: retrieves cache for functions which might not be equivalent
-             if a revision is made to the code which is used to compute it.
+    If `incremental=True`, each new result is instead appended to a
+    `LogStore` (see `arsenal.cache.logstore`) as soon as it is computed, and
+    previously saved results are loaded lazily, one key at a time.
+
+    Saved results are only reused if they were computed by the same version of
+    the code.  By default, the version is the `code_hash` of `func`, i.e., a
+    hash of its bytecode and of the functions it calls from the same package.
+    Pass `version` to manage versions by hand.
+
+    WARNING: changes that the code hash cannot see (e.g., to data files, or to
+             functions from other packages) will not invalidate the cache.
     """
-    def __init__(self, func, filename=None):
+    def __init__(self, func, filename=None, incremental=False, version=None):
         self.func = func
-        self.filename = filename or '{self.func.__name__}.cache.pkl~'.format(self=self)
+        self.incremental = incremental
+        self.filename = filename or (
+            '{self.func.__name__}.cache.log~' if incremental else
+            '{self.func.__name__}.cache.pkl~'
+        ).format(self=self)
         self.dirty = False
-        self.key = 0
+        self.key = version
         self.cache = {}
+        self.store = None
         self.loaded = False
+        self.stats = CacheStats('memoize_persistent(%s)' % func.__name__)
         atexit.register(self.save)
 
     def save(self):
+        if self.incremental:
+            # Results were written as they were computed; nothing left to do
+            # but flush and close the files.
+            if self.store is not None: self.store.close()
+            return
         if self.cache and self.dirty:
             with open(self.filename, 'wb') as f:
                 pickle.dump((self.cache, self.key), f)
@@ -102,6 +634,13 @@ class memoize_persistent(object):
 
     def load(self):
         self.loaded = True
+        # Hash the code on first use, rather than at decoration time, so that
+        # functions defined after `func` in its module are already bound.
+        if self.key is None:
+            self.key = code_hash(self.func)
+        if self.incremental:
+            self.store = LogStore(self.filename, version=self.key)
+            return
         loaded_key = None
         try:
             with open(self.filename, 'rb') as f:
@@ -111,6 +650,7 @@ class memoize_persistent(object):
         finally:
             if self.key == loaded_key:
                 self.cache = cache
+                self.stats.nbytes += sum(map(sizeof, cache.values()))
                 #print 'loaded cache for {self.func.__name__}'.format(self=self)
             else:
                 self.cache = {}
@@ -121,8 +661,14 @@ class memoize_persistent(object):
         if not self.loaded:
             self.load()
         try:
-            return self.cache[args]
+            value = self.cache[args]
         except KeyError:
+            if self.store is not None and args in self.store:
+                value = self.cache[args] = self.store[args]
+                self.stats.hit(args)
+                self.stats.nbytes += sizeof(value)
+                return value
+            b4 = perf_counter()
             value = self.func(*args)
             try:
                 self.cache[args] = value
@@ -131,10 +677,15 @@ class memoize_persistent(object):
                 raise TypeError('uncachable arguments %r passed to memoized function.' % (args,))
             else:
                 self.dirty = True
+                if self.store is not None: self.store[args] = value
+                self.stats.miss(args, perf_counter() - b4, value)
             return value
         except TypeError:
             # uncachable -- for instance, passing a list as an argument.
             raise TypeError('uncachable arguments %r passed to memoized function.' % (args,))
+        else:
+            self.stats.hit(args)
+            return value
 
     def get_cached(self, *args):
         """ If result is cached return it, otherwise return `None`. """
@@ -143,6 +694,7 @@ class memoize_persistent(object):
             self.load()
         if args in self.cache:
             return self.cache[args]
+        elif self.store is not None and args in self.store:
+            return self.store[args]
         else:
             return None
-
@@ -1,42 +1,98 @@
 """Caching with pickle and the file system.
 
+With `save(..., mmap=True)`, ndarrays anywhere inside the saved value are
+written as separate `.npy` segments (in the directory `<filename>.arrays`)
+and `load` returns them memory-mapped (read-only), so they are neither copied
+nor deserialized and processes loading the same file share one copy in the
+page cache.
+
 """
+import os
 import pickle
+import numpy as np
 from path import Path as path
 from arsenal.fsutils import filesize
 from arsenal.timer import timeit
 
 
-def load(filename, default=None, saveit=False, verbose=False):
+def load(filename, default=None, saveit=False, verbose=False, mmap=False):
     "Load cached item by `name`, on miss call `get` function and cached results."
     f = path(filename)
     if f.exists():
         if verbose:
             print('[load] %s, size = %s' % (f, filesize(f)))
             with timeit('[load] %s' % filename):
-                with open(f) as pkl:
-                    return pickle.load(pkl)
+                return _load(f)
         else:
-            with open(f) as pkl:
-                return pickle.load(pkl)
+            return _load(f)
     else:
         if default is None:
             raise OSError("File not found '%s'" % filename)
         with timeit('[load] make %s' % filename):
             val = default()
         if saveit:
-            save(filename, val, verbose=verbose)
+            save(filename, val, verbose=verbose, mmap=mmap)
         return val
 
 
-def save(filename, val, verbose=False):
+def save(filename, val, verbose=False, mmap=False):
     "Save `val` so we can load it via `load`."
     if verbose:
         with timeit('[save] %s' % filename):
-            with open(filename, 'w') as pkl:
-                pickle.dump(val, pkl)
+            _save(filename, val, mmap)
             print('[save] %s, size = %s' % (filename, filesize(filename)))
     else:
-        with open(filename, 'w') as pkl:
-            pickle.dump(val, pkl)
+        _save(filename, val, mmap)
     return val
+
+
+def _segments(filename):
+    return '%s.arrays' % filename
+
+
+class _ArrayPickler(pickle.Pickler):
+    "Pickler which writes ndarrays to `.npy` segments instead of the pickle."
+
+    def __init__(self, f, directory):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.n = 0
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray and not obj.dtype.hasobject:
+            name = '%s.npy' % self.n
+            self.n += 1
+            np.save(os.path.join(self.directory, name), obj)
+            return ('npy', name)
+        return None
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+
+    def __init__(self, f, directory):
+        super().__init__(f)
+        self.directory = directory
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        assert kind == 'npy', pid
+        return np.load(os.path.join(self.directory, name), mmap_mode='r')
+
+
+def _save(filename, val, mmap):
+    directory = _segments(filename)
+    if os.path.isdir(directory):   # remove segments from a previous save
+        for x in os.listdir(directory):
+            if x.endswith('.npy'):
+                os.remove(os.path.join(directory, x))
+    with open(filename, 'wb') as pkl:
+        if mmap:
+            os.makedirs(directory, exist_ok=True)
+            _ArrayPickler(pkl, directory).dump(val)
+        else:
+            pickle.dump(val, pkl)
+
+
+def _load(filename):
+    with open(filename, 'rb') as pkl:
+        return _ArrayUnpickler(pkl, _segments(filename)).load()
@@ -0,0 +1,172 @@
+"""Statistics and hot-key instrumentation for the caches in `arsenal.cache`.
+
+Every cache (`memoize` and its variants, `memoize_persistent`,
+`ShelfBasedCache`, and `lazy`) has a `stats` attribute, a `CacheStats`, which
+records
+
+ - hits and misses,
+ - the time spent computing values (and each computation's time),
+ - the time saved by hits (i.e., the time it took to compute the values that
+   were reused),
+ - the (approximate) number of bytes of the values held by the cache, and
+ - per-key hit counts and compute times, for finding the hottest and the most
+   expensive keys (if `track_keys`; bounded caches turn this off by default).
+
+Memory use is bounded by the cache's: evicted keys are forgotten, and only the
+most recent `max_times` compute times are kept.
+
+All live `CacheStats` can be listed with `all_stats`, printed with `report`,
+or turned into an `arsenal.timer.Benchmark` with `benchmark`.
+
+"""
+import sys
+import heapq
+import weakref
+from collections import deque
+
+_registry = weakref.WeakSet()
+
+
+def sizeof(x):
+    "Approximate size of `x` in bytes (ndarray data, plus a shallow size for containers)."
+    n = getattr(x, 'nbytes', None)
+    if isinstance(n, int): return n
+    size = sys.getsizeof(x)
+    if isinstance(x, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in x.items())
+    elif isinstance(x, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(y) for y in x)
+    return size
+
+
+class KeyStats(object):
+    __slots__ = 'hits', 'time', 'nbytes'
+    def __init__(self, time, nbytes):
+        self.hits = 0
+        self.time = time
+        self.nbytes = nbytes
+    def __repr__(self):
+        return 'KeyStats(hits=%s, time=%g, nbytes=%s)' % (self.hits, self.time, self.nbytes)
+
+
+class CacheStats(object):
+    """
+    Statistics for one cache.
+
+    >>> s = CacheStats('f')
+    >>> s.miss('a', 2.0, 'A'); s.miss('b', 1.0, 'B')
+    >>> s.hit('a'); s.hit('a'); s.hit('b')
+    >>> s.hits, s.misses, s.compute_time, s.saved
+    (3, 2, 3.0, 5.0)
+    >>> [key for key, _ in s.hottest(1)], [key for key, _ in s.most_expensive(2)]
+    (['a'], ['a', 'b'])
+
+    """
+
+    def __init__(self, name, track_keys=True, max_times=10000):
+        self.name = name
+        self.track_keys = track_keys
+        self.max_times = max_times
+        self.keys = {}     # key -> KeyStats
+        self.sizes = {}    # key -> nbytes (for evictions, if not `track_keys`)
+        self.clear()
+        _registry.add(self)
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.compute_time = 0.0
+        self.saved = 0.0
+        self.nbytes = 0
+        self.times = deque(maxlen=self.max_times)   # times of the most recent computations
+        self.keys.clear()
+        self.sizes.clear()
+
+    def hit(self, key):
+        self.hits += 1
+        if self.track_keys:
+            s = self.keys.get(key)
+            if s is not None:
+                s.hits += 1
+                self.saved += s.time
+                return
+        # Values which were not computed in this process (e.g., loaded from
+        # disk) are assumed to take the average compute time.
+        if self.misses: self.saved += self.compute_time / self.misses
+
+    def miss(self, key, time, value):
+        self.misses += 1
+        self.compute_time += time
+        self.times.append(time)
+        nbytes = sizeof(value)
+        self.nbytes += nbytes
+        if self.track_keys:
+            self.keys[key] = KeyStats(time, nbytes)
+        elif key is not None:
+            self.sizes[key] = nbytes
+
+    def evict(self, key):
+        s = self.keys.pop(key, None)
+        if s is not None:
+            self.nbytes -= s.nbytes
+        else:
+            self.nbytes -= self.sizes.pop(key, 0)
+
+    @property
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
+
+    def hottest(self, k=10):
+        "The `k` keys with the most hits."
+        return heapq.nlargest(k, self.keys.items(), key=lambda x: x[1].hits)
+
+    def most_expensive(self, k=10):
+        "The `k` keys that took the longest to compute."
+        return heapq.nlargest(k, self.keys.items(), key=lambda x: x[1].time)
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'compute_time': self.compute_time,
+            'saved': self.saved,
+            'nbytes': self.nbytes,
+        }
+
+    def __repr__(self):
+        return ('CacheStats(%s, hits=%s, misses=%s, compute_time=%g, saved=%g, nbytes=%s)'
+                % (self.name, self.hits, self.misses, self.compute_time, self.saved, self.nbytes))
+
+
+def all_stats():
+    "`CacheStats` of all live caches, sorted by name."
+    return sorted(_registry, key=lambda s: str(s.name))
+
+
+def report(stats=None, k=3):
+    "Print a summary of each cache's statistics along with its hottest and most expensive keys."
+    from arsenal.humanreadable import htime
+    if stats is None: stats = all_stats()
+    for s in stats:
+        print('%s: hits=%s misses=%s hit-rate=%.1f%% compute=%s saved=%s bytes=%s' % (
+            s.name, s.hits, s.misses, 100*s.hit_rate, htime(s.compute_time),
+            htime(s.saved), s.nbytes))
+        if s.keys:
+            print('  hottest:        ', ', '.join('%r (%s hits)' % (key, x.hits) for key, x in s.hottest(k)))
+            print('  most expensive: ', ', '.join('%r (%s)' % (key, htime(x.time)) for key, x in s.most_expensive(k)))
+
+
+def benchmark(stats=None, title='cache compute times'):
+    """
+    `arsenal.timer.Benchmark` with one `Timer` per cache holding the times of
+    its computations, e.g., `benchmark().compare()`.
+    """
+    from arsenal.timer import Benchmark
+    if stats is None: stats = all_stats()
+    B = Benchmark(title)
+    for s in stats:
+        B[s.name].times.extend(s.times)
+    return B
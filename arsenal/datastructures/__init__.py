@@ -1,3 +1,4 @@
 from arsenal.datastructures.heap import *
 from arsenal.datastructures.orderedset import OrderedSet
 from arsenal.datastructures.unionfind import UnionFind
+from arsenal.datastructures.intunionfind import IntUnionFind
@@ -1,3 +1,7 @@
+import struct
+from heapq import heappush, heappop, nsmallest
+
+
 class BucketQueue:
     """BucketQueue.py
     Taken from https://github.com/timvieira/dyna-pi/blob/main/dyna/util/bucket_queue.py
@@ -93,3 +97,249 @@ class BucketQueue:
     def __len__(self):
         "Container class length."
         return len(self._D)
+
+
+def _float_key(x):
+    "Map a float to an integer with the same order (via its IEEE-754 bits)."
+    [u] = struct.unpack('<Q', struct.pack('<d', x))
+    return u ^ 0xFFFFFFFFFFFFFFFF if u >> 63 else u | (1 << 63)
+
+
+class RadixHeap:
+    """Monotone priority queue with integer or float priorities.
+
+    Same interface as `BucketQueue`, but every priority inserted must be at
+    least the priority of the last item popped (as in Dijkstra's algorithm);
+    otherwise, `ValueError` is raised.  Items are kept in buckets by the
+    highest bit in which their priority differs from the last popped one, so
+    each item moves down through at most O(log C) buckets, where C is the
+    range of the priorities, no matter how sparse they are.
+
+    Priorities must either be all integers or all floats (integers are
+    accepted in a float queue).  Integer priorities may be negative, but must
+    be at least `-2**63`.
+
+    References:
+    * Ahuja, Mehlhorn, Orlin, and Tarjan. Faster algorithms for the shortest
+      path problem. JACM 1990.
+
+    """
+    def __init__(self):
+        self._D = {}        # map from items to priorities
+        self._B = [{}]      # buckets: maps from items to (integer) keys
+        self._W = {}        # map from items to buckets
+        self._last = None   # key of the last item popped
+        self._float = None  # are priorities floats?
+
+    def _key(self, priority):
+        if self._float is None:
+            if not isinstance(priority, (int, float)):
+                raise TypeError("Priority must be an integer or a float")
+            self._float = isinstance(priority, float)
+        if self._float:
+            return _float_key(float(priority))
+        if not isinstance(priority, int):
+            raise TypeError("Priority must be an integer")
+        # Bias into non-negative keys, since the buckets compare the keys' bits.
+        key = priority + (1 << 63)
+        if key < 0:
+            raise ValueError(f"Priority {priority!r} is less than -2**63")
+        return key
+
+    def _bucket(self, key):
+        return 0 if self._last is None else (key ^ self._last).bit_length()
+
+    def __getitem__(self, item):
+        "Look up the priority of an item."
+        return self._D[item]
+
+    def __delitem__(self, item):
+        "Remove an item from the priority queue."
+        del self._D[item]
+        del self._B[self._W.pop(item)][item]
+
+    def __setitem__(self, item, priority):
+        "Add an element to the priority queue with the given priority."
+        key = self._key(priority)
+        if self._last is not None and key < self._last:
+            raise ValueError(f"Priority {priority!r} is less than the last priority popped")
+        if item in self._D:
+            del self[item]
+        self._D[item] = priority
+        self._put(item, key)
+
+    def _put(self, item, key):
+        b = self._bucket(key)
+        while len(self._B) <= b:
+            self._B.append({})
+        self._W[item] = b
+        self._B[b][item] = key
+
+    def _find(self):
+        "Make sure that bucket 0 holds the items with the min priority."
+        if self._B[0] and self._last is not None:
+            return
+        for i, bucket in enumerate(self._B):
+            if bucket: break
+        else:
+            raise KeyError('pop from an empty priority queue')
+        self._last = min(bucket.values())
+        self._B[i] = {}
+        for x, key in bucket.items():
+            self._put(x, key)
+
+    def __iter__(self):
+        """Repeatedly find and remove the min-priority item from the queue.
+        It is ok for the queue to be modified between iterations."""
+        while self._D:
+            yield self.pop()
+
+    def popitem(self):
+        self._find()
+        x = next(iter(self._B[0]))      # arbitrary item in 1st bucket
+        priority = self._D[x]
+        del self[x]
+        return (x, priority)
+
+    def pop(self):
+        return self.popitem()[0]
+
+    def items(self):
+        "Variant iterator that generates (item,priority) pairs."
+        while self._D:
+            yield self.popitem()
+
+    def __contains__(self, item):
+        "Container class membership test."
+        return item in self._D
+
+    def __len__(self):
+        "Container class length."
+        return len(self._D)
+
+
+class CalendarQueue:
+    """Priority queue for priorities that are roughly uniformly spread out.
+
+    Same interface as `BucketQueue` (priorities may be any numbers).  Like a
+    desk calendar, the priority axis is divided into days of a fixed width;
+    day `d` goes into bucket `d % nbuckets`, each bucket being a small heap.
+    The number of buckets and the width of a day are adjusted as the queue
+    grows and shrinks so that each bucket holds O(1) items, which makes the
+    operations O(1) on average when priorities are spread evenly.
+
+    Priorities may decrease, but popping is fastest when they are popped in
+    roughly increasing order.
+
+    References:
+    * R. Brown. Calendar queues: A fast O(1) priority queue implementation
+      for the simulation event set problem. CACM 1988.
+
+    """
+    def __init__(self, nbuckets=2, width=1.0):
+        self._D = {}        # map from items to priorities
+        self._S = {}        # map from items to the serial number of their live entry
+        self._serial = 0
+        self._resize(nbuckets, width)
+
+    def _resize(self, nbuckets, width):
+        entries = [(p, self._S[x], x) for x, p in self._D.items()]
+        self._nb = nbuckets
+        self._width = width
+        self._B = [[] for _ in range(nbuckets)]     # heaps of (priority, serial, item)
+        self._entries = 0                           # live + stale entries
+        self._day = None                            # current day
+        for e in entries:
+            self._push(e)
+
+    def _push(self, entry):
+        day = entry[0] // self._width
+        heappush(self._B[int(day % self._nb)], entry)
+        self._entries += 1
+        if self._day is None or day < self._day:
+            self._day = day
+
+    def _new_width(self):
+        "Three times the average gap between the first few priorities (Brown's heuristic)."
+        ps = nsmallest(min(len(self._D), 25), self._D.values())
+        gaps = [b - a for a, b in zip(ps, ps[1:])]
+        if not gaps: return self._width
+        mean = sum(gaps) / len(gaps)
+        gaps = [g for g in gaps if g <= 2 * mean]
+        mean = sum(gaps) / len(gaps) if gaps else mean
+        return 3 * mean if mean > 0 else self._width
+
+    def _clean(self, bucket):
+        "Drop stale entries from the top of `bucket`."
+        while bucket and self._S.get(bucket[0][2]) != bucket[0][1]:
+            heappop(bucket)
+            self._entries -= 1
+
+    def __getitem__(self, item):
+        "Look up the priority of an item."
+        return self._D[item]
+
+    def __delitem__(self, item):
+        "Remove an item from the priority queue."
+        # Its entry becomes stale and is dropped lazily.
+        del self._D[item]
+        del self._S[item]
+        if len(self._D) < self._nb // 2 and self._nb > 2:
+            self._resize(self._nb // 2, self._new_width())
+
+    def __setitem__(self, item, priority):
+        "Add an element to the priority queue with the given priority."
+        self._serial += 1
+        self._D[item] = priority
+        self._S[item] = self._serial
+        self._push((priority, self._serial, item))
+        if len(self._D) > 2 * self._nb:
+            self._resize(2 * self._nb, self._new_width())
+        elif self._entries > 2 * len(self._D) + self._nb:
+            self._resize(self._nb, self._width)     # purge stale entries
+
+    def _find(self):
+        "Index of the bucket whose top entry has the min priority."
+        if not self._D:
+            raise KeyError('pop from an empty priority queue')
+        # Scan the days of the current year, starting from the current day.
+        for _ in range(self._nb):
+            i = int(self._day % self._nb)
+            bucket = self._B[i]
+            self._clean(bucket)
+            if bucket and bucket[0][0] // self._width <= self._day:
+                return i
+            self._day += 1
+        # No item this year: jump directly to the min.
+        for bucket in self._B:
+            self._clean(bucket)
+        i = min((j for j in range(self._nb) if self._B[j]), key=lambda j: self._B[j][0])
+        self._day = self._B[i][0][0] // self._width
+        return i
+
+    def __iter__(self):
+        """Repeatedly find and remove the min-priority item from the queue.
+        It is ok for the queue to be modified between iterations."""
+        while self._D:
+            yield self.pop()
+
+    def popitem(self):
+        priority, _, x = self._B[self._find()][0]
+        del self[x]
+        return (x, priority)
+
+    def pop(self):
+        return self.popitem()[0]
+
+    def items(self):
+        "Variant iterator that generates (item,priority) pairs."
+        while self._D:
+            yield self.popitem()
+
+    def __contains__(self, item):
+        "Container class membership test."
+        return item in self._D
+
+    def __len__(self):
+        "Container class length."
+        return len(self._D)
@@ -0,0 +1,205 @@
+# cython: language_level=3, boundscheck=False, infer_types=True, nonecheck=False
+# cython: overflowcheck=False, initializedcheck=False, wraparound=False, cdivision=True
+"""
+DFA minimization with Hopcroft's algorithm over array-based partition
+refinement (see `arsenal.datastructures.partition_refinement`).
+"""
+import numpy as np
+
+
+def _transition_table(delta, alphabet, finals):
+    "Convert `delta` (an array or a dict) into an (n, k) array; -1 means no transition."
+    if isinstance(delta, dict):
+        sym = {a: j for j, a in enumerate(alphabet)}
+        states = [q for (q, _) in delta] + list(delta.values()) + list(finals)
+        n = 1 + max(states, default=-1)
+        table = np.full((n, len(sym)), -1, dtype=np.intp)
+        for (q, a), r in delta.items():
+            table[q, sym[a]] = r
+        return table
+    table = np.asarray(delta, dtype=np.intp)
+    if table.ndim == 1: table = table[:, None]
+    assert table.ndim == 2 and table.shape[1] == len(alphabet), \
+        'delta must have one column per symbol of the alphabet'
+    return table
+
+
+def minimize_dfa(delta, alphabet, finals):
+    """
+    Minimize the deterministic automaton with states `0, ..., n-1`, transitions
+    `delta`, and final states `finals` by merging equivalent states
+    (Hopcroft's algorithm, O(k n log n) time for `k` symbols).  Unreachable
+    states are not removed.
+
+    `delta` is either an (n, k) integer array, where `delta[q, j]` is the
+    successor of state `q` on symbol `alphabet[j]`, or a dict mapping `(q, a)`
+    to a state.  Missing transitions (-1 in the array) go to an implicit
+    dead state.
+
+    Returns `(labels, table, final)`, where `labels[q]` is the state of the
+    minimal automaton that contains `q` (states are numbered in order of their
+    smallest member), `table` is the minimal automaton's transition array (with
+    -1 for transitions into the dead state), and `final` is a boolean array
+    marking its final states.
+
+    >>> # states 1 and 2 are equivalent: both go to 3 on 'b'
+    >>> labels, table, final = minimize_dfa({(0, 'a'): 1, (0, 'b'): 2,
+    ...                                      (1, 'b'): 3, (2, 'b'): 3}, 'ab', [3])
+    >>> labels.tolist(), table.tolist(), final.tolist()
+    ([0, 1, 1, 2], [[1, 1], [-1, 2], [-1, -1]], [False, False, True])
+
+    """
+    table = _transition_table(delta, alphabet, finals)
+    n, k = table.shape
+    if n == 0:
+        return np.empty(0, dtype=np.intp), table, np.zeros(0, dtype=bool)
+
+    is_final = np.zeros(n, dtype=bool)
+    is_final[np.asarray(list(finals), dtype=np.intp)] = True
+
+    if k == 0:
+        # No transitions: states are equivalent iff they agree on finality.
+        _, first, labels = np.unique(is_final, return_index=True, return_inverse=True)
+        order = np.argsort(np.argsort(first))   # number blocks by smallest member
+        labels = order[labels.ravel()]
+        return labels, np.empty((len(first), 0), dtype=np.intp), is_final[np.sort(first)]
+    assert table.max() < n, 'transition to an unknown state'
+
+    # Make the automaton total by adding a dead state if needed.
+    total = table
+    N = n
+    if (table < 0).any():
+        N = n + 1
+        total = np.vstack([table, np.full((1, k), n, dtype=np.intp)])
+        total[total < 0] = n
+        is_final = np.append(is_final, False)
+
+    block = _hopcroft(np.ascontiguousarray(total), is_final.astype(np.intp))
+
+    # Renumber the blocks in order of their smallest (original) member.
+    _, first = np.unique(block[:n], return_index=True)
+    renumber = np.full(N, -1, dtype=np.intp)
+    renumber[block[np.sort(first)]] = np.arange(len(first))
+    labels = renumber[block[:n]]
+
+    m = len(first)
+    rep = np.empty(m, dtype=np.intp)
+    rep[labels] = np.arange(n)           # a representative state of each block
+    table = renumber[block[total[rep]]]  # -1 for the dead state's block
+    return labels, table, is_final[rep]
+
+
+cdef _hopcroft(Py_ssize_t[:, :] delta, Py_ssize_t[:] init):
+    """
+    Coarsest partition of the states which refines the partition `init` (a
+    block id for each state) and is stable with respect to each symbol's
+    transition function, i.e., states in a block go to the same block on each
+    symbol.  Returns the block id of each state.
+    """
+    cdef Py_ssize_t n = delta.shape[0], k = delta.shape[1]
+    cdef Py_ssize_t i, j, a, b, c, x, y, t, p, m, S, new, small, nb, sp, ntouched, nS
+
+    # Inverse transitions in CSR form: the predecessors of `x` on symbol `a`
+    # are `pred[a, ptr[a, x]:ptr[a, x+1]]`.
+    ptr_ = np.zeros((k, n + 1), dtype=np.intp)
+    pred_ = np.empty((k, n), dtype=np.intp)
+    for a in range(k):
+        ptr_[a, 1:] = np.cumsum(np.bincount(delta[:, a], minlength=n))
+        pred_[a] = np.argsort(delta[:, a], kind='stable')
+    cdef Py_ssize_t[:, :] ptr = ptr_, pred = pred_
+
+    # Partition refinement arrays (see `PartitionRefinement`): each block is a
+    # contiguous range `first[b]:end[b]` of `elems`; `mid[b]` is the end of its
+    # marked prefix.
+    init_ = np.asarray(init)
+    cdef Py_ssize_t[:] elems = np.argsort(init_, kind='stable').astype(np.intp)
+    cdef Py_ssize_t[:] loc = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] block = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] first = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] end = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] mid = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] touched = np.empty(n, dtype=np.intp)
+    cdef Py_ssize_t[:] members = np.empty(n, dtype=np.intp)
+
+    nb = 0
+    for i in range(n):
+        x = elems[i]
+        loc[x] = i
+        if i == 0 or init[x] != init[elems[i-1]]:
+            first[nb] = mid[nb] = i
+            nb += 1
+        block[x] = nb - 1
+        end[nb - 1] = i + 1
+
+    # Worklist of (block, symbol) pairs, encoded as `b*k + a`.  Every pair is
+    # on the stack at most once, as recorded by `waiting`.
+    cdef unsigned char[:] waiting = np.zeros(n * k, dtype=np.uint8)
+    cdef Py_ssize_t[:] stack = np.empty(n * k, dtype=np.intp)
+    sp = 0
+    m = 0
+    for b in range(nb):   # every block but the largest
+        if end[b] - first[b] > end[m] - first[m]: m = b
+    for b in range(nb):
+        if b == m: continue
+        for a in range(k):
+            stack[sp] = b*k + a
+            waiting[b*k + a] = 1
+            sp += 1
+
+    while sp > 0:
+        sp -= 1
+        S = stack[sp] // k
+        a = stack[sp] % k
+        waiting[S*k + a] = 0
+
+        # Copy the splitter, since marking may reorder its own elements.
+        nS = end[S] - first[S]
+        for i in range(nS):
+            members[i] = elems[first[S] + i]
+
+        # Mark the predecessors of the splitter.
+        ntouched = 0
+        for i in range(nS):
+            x = members[i]
+            for t in range(ptr[a, x], ptr[a, x + 1]):
+                y = pred[a, t]
+                b = block[y]
+                p = loc[y]
+                m = mid[b]
+                if p < m: continue   # already marked
+                if m == first[b]:
+                    touched[ntouched] = b
+                    ntouched += 1
+                # swap y into the marked prefix
+                c = elems[m]
+                elems[m] = y; loc[y] = m
+                elems[p] = c; loc[c] = p
+                mid[b] = m + 1
+
+        # Split each partially marked block; the marked part is a new block.
+        for i in range(ntouched):
+            b = touched[i]
+            m = mid[b]
+            if m == end[b]:
+                mid[b] = first[b]
+                continue
+            new = nb
+            nb += 1
+            first[new] = mid[new] = first[b]
+            end[new] = m
+            first[b] = mid[b] = m
+            for p in range(first[new], m):
+                block[elems[p]] = new
+            # Hopcroft's "smaller half": enqueue the smaller part unless the
+            # block was already waiting (then both parts must be).
+            small = new if m - first[new] <= end[b] - m else b
+            for c in range(k):
+                if waiting[b*k + c]:
+                    j = new*k + c
+                else:
+                    j = small*k + c
+                waiting[j] = 1
+                stack[sp] = j
+                sp += 1
+
+    return np.asarray(block)
@@ -1,4 +1,5 @@
 from arsenal.datastructures.heap.heap import (
-    MaxHeap, LocatorMaxHeap, MinMaxHeap, BoundedMaxHeap
+    MaxHeap, LocatorMaxHeap, IntLocatorMaxHeap, DaryLocatorMaxHeap,
+    PairingLocatorMaxHeap, MinMaxHeap, BoundedMaxHeap
 )
 from arsenal.datastructures.heap.sumheap import SumHeap
@@ -8,6 +8,7 @@ cdef class Vector:
     cpdef int push(self, double x)
     cpdef object pop(self)
     cdef void grow(self)
+    cdef void reserve(self, int n)
     cdef void ensure_size(self, int i)
     cdef double get(self, int i)
     cdef void set(self, int i, double v)
@@ -26,6 +27,7 @@ cdef class MaxHeap:
     cdef int down(self, int i)
     cdef int _update(self, int i, double old, double new)
     cdef void _remove(self, int i)
+    cdef void _heapify(self)
 
 
 cdef class LocatorMaxHeap(MaxHeap):
@@ -55,3 +57,13 @@ cdef class LocatorMaxHeap(MaxHeap):
     cdef void swap(self, int i, int j)
 #    def check(self)
 #    cdef _update(self, int i, double old, double new)
+
+
+cdef class DaryLocatorMaxHeap(LocatorMaxHeap):
+
+    cdef public:
+        int d
+
+    cdef int up(self, int i)
+    cdef int down(self, int i)
+    cdef void _heapify(self)
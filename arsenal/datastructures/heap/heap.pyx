@@ -46,6 +46,15 @@ cdef class Vector:
         new[:self.end] = self.val[:self.end]
         self.val = new
 
+    cdef void reserve(self, int n):
+        "grow capacity to at least `n`"
+        if self.val.shape[0] >= n: return
+        self.cap = max(self.cap, 1)
+        while self.cap < n: self.cap *= 2
+        new = np.empty(self.cap, dtype=Vt)
+        new[:self.end] = self.val[:self.end]
+        self.val = new
+
     cdef void ensure_size(self, int i):
         "grow in needed"
         if self.val.shape[0] < i + 1: self.grow()
@@ -76,9 +85,10 @@ cdef class MaxHeap:
 #    cdef public:
 #        Vector val
 
-    def __init__(self, cap=2**8):
+    def __init__(self, cap=2**8, values=None):
         self.val = Vector(cap)
         self.val.push(np.nan)
+        if values is not None: self.heapify(values)
 
     def __len__(self):
         return len(self.val) - 1   # subtract one for dummy root element
@@ -95,6 +105,46 @@ cdef class MaxHeap:
         # put new element last and bubble up
         return self.up(self.val.push(v))
 
+    def push_many(self, double[:] values):
+        "Push each of `values`."
+        cdef int i, m = values.shape[0], n = self.val.end
+        self.val.reserve(n + m)
+        if m > n:
+            # Cheaper to append everything and rebuild the heap in O(n + m).
+            self.val.end = n + m
+            for i in range(m):
+                self.val.val[n + i] = values[i]
+            self._heapify()
+        else:
+            for i in range(m):
+                self.up(self.val.push(values[i]))
+
+    def heapify(self, double[:] values):
+        "Replace the contents of the heap with `values` in O(n) time."
+        cdef int i, n = values.shape[0]
+        self.val.reserve(n + 1)
+        self.val.end = n + 1
+        for i in range(n):
+            self.val.val[i + 1] = values[i]
+        self._heapify()
+
+    cdef void _heapify(self):
+        "Restore the heap property in O(n) time."
+        cdef int i
+        for i in range((self.val.end - 1) // 2, 0, -1):
+            self.down(i)
+
+    def pop_k(self, int k):
+        "Pop the `k` largest values (or all of them, if fewer), in decreasing order."
+        cdef int i
+        k = min(k, len(self))
+        out = np.empty(k, dtype=Vt)
+        cdef double[:] o = out
+        for i in range(k):
+            o[i] = self.val.val[1]
+            self._remove(1)
+        return out
+
     cdef void swap(self, int i, int j):
         assert i < self.val.end
         assert j < self.val.end
@@ -165,10 +215,11 @@ cdef class LocatorMaxHeap(MaxHeap):
 #        dict key
 #        dict loc
 
-    def __init__(self, **kw):
+    def __init__(self, keys=None, values=None, **kw):
         super().__init__(**kw)
         self.key = {}   # map from index `i` to `key`
         self.loc = {}   # map from `key` to index in `val`
+        if values is not None: self.heapify(keys, values)
 
     def __repr__(self):
         return repr({k: self[k] for k in self.loc})
@@ -181,6 +232,62 @@ cdef class LocatorMaxHeap(MaxHeap):
     def popitem(self):
         return self.pop()
 
+    def pop_k(self, int k):
+        """
+        Pop the `k` items with the largest values (or all of them, if fewer) in
+        decreasing order; returns a list of keys and an array of values.
+        """
+        cdef int i
+        k = min(k, len(self))
+        keys = []
+        out = np.empty(k, dtype=Vt)
+        cdef double[:] o = out
+        for i in range(k):
+            keys.append(self.key[1])
+            o[i] = self.val.val[1]
+            self._remove(1)
+        return keys, out
+
+    def heapify(self, keys, double[:] values):
+        "Replace the contents of the heap with `keys` and `values` in O(n) time."
+        cdef int i, n = values.shape[0]
+        if isinstance(keys, np.ndarray): keys = keys.tolist()
+        assert len(keys) == n
+        self.key = {}
+        self.loc = {}
+        self.val.reserve(n + 1)
+        self.val.end = n + 1
+        for i in range(n):
+            k = keys[i]
+            assert k not in self.loc, f'duplicate key {k!r}'
+            self.val.val[i + 1] = values[i]
+            self.key[i + 1] = k
+            self.loc[k] = i + 1
+        self._heapify()
+
+    def update_many(self, keys, double[:] values):
+        "Upsert `self[keys[i]] = values[i]` for each `i`."
+        cdef int i, j, m = values.shape[0], n = self.val.end
+        if isinstance(keys, np.ndarray): keys = keys.tolist()
+        assert len(keys) == m
+        if m > n:
+            # Cheaper to write everything and rebuild the heap in O(n + m).
+            self.val.reserve(n + m)
+            for i in range(m):
+                k = keys[i]
+                if k in self.loc:
+                    j = self.loc[k]
+                else:
+                    j = self.val.end
+                    self.val.end += 1
+                    self.key[j] = k
+                    self.loc[k] = j
+                self.val.val[j] = values[i]
+            self._heapify()
+        else:
+            for i in range(m):
+                self._setitem(keys[i], values[i])
+
     def peek(self):
         return self.key[1], super().peek()
 
@@ -242,68 +349,620 @@ cdef class LocatorMaxHeap(MaxHeap):
             assert self.loc[self.key[i]] == i
 
 
-class MinMaxHeap:
+cdef class DaryLocatorMaxHeap(LocatorMaxHeap):
+    """
+    `LocatorMaxHeap` where each node has `d` children instead of two.  Wider
+    nodes make the tree shallower (cheaper pushes and increases) and keep
+    siblings adjacent in memory; pops and decreases compare more children per
+    level.  `d=4` or `d=8` is often faster than the binary heap.
+    """
+
+#    cdef public:
+#        int d
+
+    def __init__(self, d=4, **kw):
+        assert d >= 2, d
+        self.d = d
+        super().__init__(**kw)
+
+    # With the root at position 1, the children of `i` are at positions
+    # `d*(i-1)+2, ..., d*(i-1)+d+1`, and its parent is at `(i-2)//d + 1`.
+
+    cdef int up(self, int i):
+        cdef int p
+        while 1 < i:
+            p = (i - 2) // self.d + 1
+            if self.val.val[p] < self.val.val[i]:
+                self.swap(i, p)
+                i = p
+            else:
+                break
+        return i
+
+    cdef int down(self, int i):
+        cdef int a, b, c, j, n = self.val.end
+        while True:
+            a = self.d * (i - 1) + 2
+            if a >= n: break
+            b = min(a + self.d, n)
+            c = i
+            for j in range(a, b):
+                if self.val.val[c] < self.val.val[j]:
+                    c = j
+            if c == i:
+                break
+            self.swap(i, c)
+            i = c
+        return i
+
+    cdef void _heapify(self):
+        cdef int i
+        for i in range((self.val.end - 3) // self.d + 1, 0, -1):
+            self.down(i)
+
+    def check(self):
+        for i in range(2, self.val.end):
+            p = (i - 2) // self.d + 1
+            assert self.val[i] <= self.val[p], (self.val[p], self.val[i])   # child <= parent
+        for key in self.loc:
+            assert self.key[self.loc[key]] == key
+        for i in range(1, self.val.end):
+            assert self.loc[self.key[i]] == i
+
+
+cdef class PairingLocatorMaxHeap:
+    """
+    Pairing heap with the `LocatorMaxHeap` interface.  Inserting and
+    increasing a key's value take O(1) time (increasing is the max-heap
+    analogue of decrease-key); pops, deletes, and decreasing a value take
+    O(log n) amortized time.
+
+    Nodes live in arrays (`child`, `sibling`, `prev`) indexed by slot; the
+    slots of removed keys are reused.
+    """
+
+    cdef public dict loc    # key -> slot
+    cdef list key           # slot -> key
+    cdef double[:] val      # slot -> value
+    cdef int[:] child       # slot -> first child
+    cdef int[:] sibling     # slot -> next sibling
+    cdef int[:] prev        # slot -> previous sibling, or parent if first child
+    cdef int[:] tmp         # scratch space for `_combine`
+    cdef int root, used
+    cdef list free
+
+    def __init__(self, cap=2**8):
+        cap = max(cap, 1)
+        self.loc = {}
+        self.key = [None] * cap
+        self.val = np.full(cap, NaN, dtype=Vt)
+        self.child = np.full(cap, -1, dtype=np.intc)
+        self.sibling = np.full(cap, -1, dtype=np.intc)
+        self.prev = np.full(cap, -1, dtype=np.intc)
+        self.tmp = np.empty(cap, dtype=np.intc)
+        self.root = -1
+        self.used = 0
+        self.free = []
 
-    def __init__(self, **kw):
-        self.max = LocatorMaxHeap(**kw)
-        self.min = LocatorMaxHeap(**kw)   # will pass negative values here
+    def __len__(self):
+        return len(self.loc)
 
     def __contains__(self, k):
-        return k in self.max
+        return k in self.loc
 
-    def __setitem__(self, k, v):
-        self.max[k] = v
-        self.min[k] = -v
+    def __getitem__(self, k):
+        return self.val[self.loc[k]]
 
-    def peekmin(self):
-        k, v = self.min.peek()
-        return k, -v
+    def __setitem__(self, k, double v):
+        self._setitem(k, v)
 
-    def peekmax(self):
-        return self.max.peek()
+    def __delitem__(self, k):
+        self._remove(self.loc[k])
 
-    def popmax(self):
-        k, v = self.max.pop()
-        del self.min[k]  # remove it from the min heap
+    def __repr__(self):
+        return repr({k: self[k] for k in self.loc})
+
+    def peek(self):
+        if self.root == -1: raise IndexError('peek from empty heap')
+        return self.key[self.root], self.val[self.root]
+
+    def pop(self):
+        k, v = self.peek()
+        self._remove(self.root)
         return k, v
 
-    def popmin(self):
-        k, v = self.min.pop()
-        del self.max[k]  # remove it from the max heap
-        return k, -v
+    def popitem(self):
+        return self.pop()
+
+    cdef int _alloc(self, k, double v):
+        cdef int x, cap
+        if self.free:
+            x = self.free.pop()
+        else:
+            cap = self.val.shape[0]
+            if self.used == cap:
+                self.key.extend([None] * cap)
+                self.val = np.concatenate([self.val, np.full(cap, NaN, dtype=Vt)])
+                self.child = np.concatenate([self.child, np.full(cap, -1, dtype=np.intc)])
+                self.sibling = np.concatenate([self.sibling, np.full(cap, -1, dtype=np.intc)])
+                self.prev = np.concatenate([self.prev, np.full(cap, -1, dtype=np.intc)])
+                self.tmp = np.empty(2 * cap, dtype=np.intc)
+            x = self.used
+            self.used += 1
+        self.key[x] = k
+        self.val[x] = v
+        self.loc[k] = x
+        return x
+
+    cdef void _free(self, int x):
+        del self.loc[self.key[x]]
+        self.key[x] = None
+        self.val[x] = NaN
+        self.child[x] = self.sibling[x] = self.prev[x] = -1
+        self.free.append(x)
+
+    cdef int _meld(self, int a, int b) noexcept:
+        "Meld the trees rooted at `a` and `b`; returns the new root."
+        if a == -1: return b
+        if b == -1: return a
+        if self.val[a] < self.val[b]: a, b = b, a
+        # b becomes the first child of a
+        self.sibling[b] = self.child[a]
+        if self.child[a] != -1: self.prev[self.child[a]] = b
+        self.prev[b] = a
+        self.child[a] = b
+        return a
+
+    cdef void _cut(self, int x) noexcept:
+        "Detach the subtree rooted at `x` (not the root) from its parent."
+        cdef int p = self.prev[x], s = self.sibling[x]
+        if self.child[p] == x:
+            self.child[p] = s
+        else:
+            self.sibling[p] = s
+        if s != -1: self.prev[s] = p
+        self.sibling[x] = self.prev[x] = -1
+
+    cdef int _combine(self, int x) noexcept:
+        "Two-pass pairing of the sibling list starting at `x`; returns the new root."
+        cdef int n = 0, m = 0, i = 0, j, r, nxt
+        while x != -1:
+            nxt = self.sibling[x]
+            self.sibling[x] = self.prev[x] = -1
+            self.tmp[n] = x
+            n += 1
+            x = nxt
+        if n == 0: return -1
+        while i + 1 < n:    # left-to-right pass: meld pairs
+            self.tmp[m] = self._meld(self.tmp[i], self.tmp[i + 1])
+            m += 1
+            i += 2
+        if i < n:
+            self.tmp[m] = self.tmp[i]
+            m += 1
+        r = self.tmp[m - 1]
+        for j in range(m - 2, -1, -1):   # right-to-left pass: meld into one tree
+            r = self._meld(self.tmp[j], r)
+        return r
+
+    cdef void _detach_children(self, int x):
+        "Make `x` a singleton; its children are melded back into the heap."
+        cdef int sub = self._combine(self.child[x])
+        self.child[x] = -1
+        self.root = self._meld(self.root, sub)
+
+    cdef _setitem(self, object k, double v):
+        "upsert (update or insert) value associated with key."
+        cdef int x
+        cdef double old
+        if k in self.loc:
+            x = self.loc[k]
+            old = self.val[x]
+            self.val[x] = v
+            if v >= old:
+                if x != self.root:
+                    self._cut(x)
+                    self.root = self._meld(self.root, x)
+            elif x == self.root:
+                self.root = self._combine(self.child[x])
+                self.child[x] = -1
+                self.root = self._meld(self.root, x)
+            else:
+                self._cut(x)
+                self._detach_children(x)
+                self.root = self._meld(self.root, x)
+        else:
+            x = self._alloc(k, v)
+            self.root = self._meld(self.root, x)
+
+    cdef void _remove(self, int x):
+        if x == self.root:
+            self.root = self._combine(self.child[x])
+        else:
+            self._cut(x)
+            self._detach_children(x)
+        self._free(x)
+
+    def check(self):
+        n = 0
+        stack = [self.root] if self.root != -1 else []
+        assert self.root == -1 or self.prev[self.root] == -1
+        while stack:
+            x = stack.pop()
+            n += 1
+            assert self.loc[self.key[x]] == x
+            c = self.child[x]
+            p = x
+            while c != -1:
+                assert self.val[c] <= self.val[x], (self.val[x], self.val[c])   # child <= parent
+                assert self.prev[c] == p
+                stack.append(c)
+                p = c
+                c = self.sibling[c]
+        assert n == len(self.loc), [n, len(self.loc)]
+
+
+cdef class IntLocatorMaxHeap:
+    """
+    `LocatorMaxHeap` specialized to integer keys `0 <= k < n` (e.g., the nodes
+    of a graph).  The key-to-position map and the position-to-key map are
+    typed arrays rather than dicts, and the heap operations release the GIL.
+    The key range grows automatically when a larger key is inserted.
+
+    >>> h = IntLocatorMaxHeap(4)
+    >>> h[2] = 1.0; h[0] = 3.0; h[3] = 2.0
+    >>> h[2] = 5.0
+    >>> h.pop(), h.pop(), len(h)
+    ((2, 5.0), (0, 3.0), 1)
+
+    """
+
+    cdef readonly int n     # keys range over 0..n-1
+    cdef readonly int end   # 1 + number of elements (position 0 is unused)
+    cdef double[:] val      # position -> value
+    cdef int[:] key         # position -> key
+    cdef int[:] loc         # key -> position (0 if absent)
+
+    def __init__(self, int n=0):
+        self.n = 0
+        self.end = 1
+        self.val = np.zeros(1, dtype=Vt)
+        self.key = np.zeros(1, dtype=np.intc)
+        self.loc = np.zeros(0, dtype=np.intc)
+        self._resize(max(n, 1))
+
+    def _resize(self, int n):
+        "Grow the key range to `0..n-1`."
+        if n <= self.n: return
+        val = np.full(n + 1, NaN, dtype=Vt); val[:self.end] = self.val[:self.end]
+        key = np.zeros(n + 1, dtype=np.intc); key[:self.end] = self.key[:self.end]
+        loc = np.zeros(n, dtype=np.intc); loc[:self.n] = self.loc
+        self.val, self.key, self.loc = val, key, loc
+        self.n = n
+
+    cdef inline void _check_key(self, int k) except *:
+        if k < 0: raise KeyError(k)
+        if k >= self.n: self._resize(max(k + 1, 2 * self.n))
+
+    def __len__(self):
+        return self.end - 1
+
+    def __contains__(self, int k):
+        return 0 <= k < self.n and self.loc[k] != 0
+
+    def __getitem__(self, int k):
+        if k not in self: raise KeyError(k)
+        return self.val[self.loc[k]]
+
+    def __setitem__(self, int k, double v):
+        self._check_key(k)
+        self._set(k, v)
+
+    def __delitem__(self, int k):
+        if k not in self: raise KeyError(k)
+        self._remove(self.loc[k])
+
+    def __repr__(self):
+        return repr({self.key[i]: self.val[i] for i in range(1, self.end)})
+
+    def peek(self):
+        if self.end == 1: raise IndexError('peek from empty heap')
+        return self.key[1], self.val[1]
+
+    def pop(self):
+        k, v = self.peek()
+        self._remove(1)
+        return k, v
+
+    def popitem(self):
+        return self.pop()
+
+    def update_many(self, keys, values):
+        "Upsert `self[keys[i]] = values[i]` for each `i`."
+        cdef int[:] ks = np.asarray(keys, dtype=np.intc)
+        cdef double[:] vs = np.asarray(values, dtype=Vt)
+        cdef int i, m = ks.shape[0]
+        assert vs.shape[0] == m
+        if m == 0: return
+        if np.min(ks) < 0: raise KeyError(np.min(ks))
+        self._check_key(np.max(ks))
+        with nogil:
+            for i in range(m):
+                self._set(ks[i], vs[i])
+
+    def pop_k(self, int k):
+        """
+        Pop the `k` items with the largest values (or all of them, if fewer) in
+        decreasing order; returns an array of keys and an array of values.
+        """
+        cdef int i
+        k = min(k, self.end - 1)
+        keys = np.empty(k, dtype=np.intc)
+        vals = np.empty(k, dtype=Vt)
+        cdef int[:] ko = keys
+        cdef double[:] vo = vals
+        with nogil:
+            for i in range(k):
+                ko[i] = self.key[1]
+                vo[i] = self.val[1]
+                self._remove(1)
+        return keys, vals
+
+    cdef void _set(self, int k, double v) noexcept nogil:
+        "upsert (update or insert) value associated with key."
+        cdef int i = self.loc[k]
+        cdef double old
+        if i != 0:
+            old = self.val[i]
+            self.val[i] = v
+            if old < v:
+                self._up(i)
+            elif v < old:
+                self._down(i)
+        else:
+            i = self.end
+            self.end += 1
+            self.val[i] = v
+            self.key[i] = k
+            self.loc[k] = i
+            self._up(i)
+
+    cdef inline void _swap(self, int i, int j) noexcept nogil:
+        self.val[i], self.val[j] = self.val[j], self.val[i]
+        self.key[i], self.key[j] = self.key[j], self.key[i]
+        self.loc[self.key[i]] = i
+        self.loc[self.key[j]] = j
+
+    cdef int _up(self, int i) noexcept nogil:
+        cdef int p
+        while 1 < i:
+            p = i // 2
+            if self.val[p] < self.val[i]:
+                self._swap(i, p)
+                i = p
+            else:
+                break
+        return i
+
+    cdef int _down(self, int i) noexcept nogil:
+        cdef int a, c, n = self.end
+        while 2*i < n:
+            a = 2 * i
+            c = i
+            if self.val[c] < self.val[a]:
+                c = a
+            if a + 1 < n and self.val[c] < self.val[a + 1]:
+                c = a + 1
+            if c == i:
+                break
+            self._swap(i, c)
+            i = c
+        return i
+
+    cdef void _remove(self, int i) noexcept nogil:
+        cdef int last = self.end - 1
+        cdef double old = self.val[i]
+        self._swap(i, last)
+        self.loc[self.key[last]] = 0
+        self.val[last] = NaN
+        self.end -= 1
+        if i == last: return
+        if old < self.val[i]:
+            self._up(i)
+        else:
+            self._down(i)
 
     def check(self):
-        self.min.check()
-        self.max.check()
+        for i in range(2, self.end):
+            assert self.val[i] <= self.val[i // 2], (self.val[i // 2], self.val[i])
+        for i in range(1, self.end):
+            assert self.loc[self.key[i]] == i
+        assert sum(1 for k in range(self.n) if self.loc[k] != 0) == self.end - 1
+
+
+cdef inline bint _min_level(int i) noexcept nogil:
+    "Is position `i` on a min level?  (The root, at position 1, is on level 0.)"
+    cdef int d = 0
+    while i > 1:
+        i >>= 1
+        d += 1
+    return d % 2 == 0
+
+
+cdef class MinMaxHeap:
+    """
+    Min-max heap with locators (Atkinson et al., 1986).  A single array heap in
+    which nodes on even levels are no larger than their descendants and nodes
+    on odd levels are no smaller.  The min is the root and the max is one of
+    its children, so `peekmin` and `peekmax` are O(1); upserts, deletes,
+    `popmin`, and `popmax` are O(log n).
+    """
+
+    cdef public Vector val
+    cdef public list key    # position -> key (position 0 is unused)
+    cdef public dict loc    # key -> position
+
+    def __init__(self, cap=2**8):
+        self.val = Vector(cap)
+        self.val.push(NaN)
+        self.key = [None]
+        self.loc = {}
 
     def __len__(self):
-        return len(self.max)
+        return self.val.end - 1
+
+    def __contains__(self, k):
+        return k in self.loc
+
+    def __getitem__(self, k):
+        return self.val.val[self.loc[k]]
+
+    def __setitem__(self, k, double v):
+        self._setitem(k, v)
+
+    def __delitem__(self, k):
+        self._remove(self.loc[k])
 
     def __repr__(self):
-        return repr(self.max)
+        return repr(self.map())
 
     def map(self):
-        return {k: self.max[k] for k in self.max.loc}
+        return {k: self.val.val[i] for k, i in self.loc.items()}
+
+    cdef int _argmax(self):
+        if self.val.end <= 2: return 1
+        if self.val.end == 3 or self.val.val[3] <= self.val.val[2]: return 2
+        return 3
+
+    def peekmin(self):
+        if self.val.end <= 1: raise IndexError('peek from empty heap')
+        return self.key[1], self.val.val[1]
+
+    def peekmax(self):
+        if self.val.end <= 1: raise IndexError('peek from empty heap')
+        i = self._argmax()
+        return self.key[i], self.val.val[i]
+
+    def popmin(self):
+        k, v = self.peekmin()
+        self._remove(1)
+        return k, v
+
+    def popmax(self):
+        k, v = self.peekmax()
+        self._remove(self._argmax())
+        return k, v
+
+    cdef void swap(self, int i, int j):
+        self.val.val[i], self.val.val[j] = self.val.val[j], self.val.val[i]
+        self.key[i], self.key[j] = self.key[j], self.key[i]
+        self.loc[self.key[i]] = i
+        self.loc[self.key[j]] = j
+
+    cdef inline bint _before(self, int a, int b, bint mn):
+        "Should `a` be above `b` on a min (`mn`) or max level?"
+        if mn: return self.val.val[a] < self.val.val[b]
+        return self.val.val[a] > self.val.val[b]
+
+    cdef int up(self, int i):
+        cdef bint mn
+        if i == 1: return i
+        mn = _min_level(i)
+        if self._before(i // 2, i, mn):
+            # belongs on the parent's levels, e.g., larger than a max parent.
+            self.swap(i, i // 2)
+            i //= 2
+            mn = not mn
+        while i >= 4 and self._before(i, i // 4, mn):
+            self.swap(i, i // 4)
+            i //= 4
+        return i
+
+    cdef int down(self, int i):
+        "Trickle down the element at `i`; returns its final position."
+        cdef int j, m, n = self.val.end, pos = -1
+        cdef bint mn = _min_level(i)
+        while 2*i < n:
+            # most extreme of the children and grandchildren
+            m = 2*i
+            for j in range(2*i + 1, min(2*i + 2, n)):
+                if self._before(j, m, mn): m = j
+            for j in range(4*i, min(4*i + 4, n)):
+                if self._before(j, m, mn): m = j
+            if not self._before(m, i, mn):
+                break
+            self.swap(i, m)
+            if pos == -1: pos = m
+            if m < 4*i:   # a child, so it has no more extreme descendants
+                break
+            if self._before(m // 2, m, mn):
+                # Doesn't fit below its parent (on the opposite kind of
+                # level); the parent's element continues down instead.
+                self.swap(m, m // 2)
+                if pos == m: pos = m // 2
+            i = m
+        return i if pos == -1 else pos
+
+    cdef void _update(self, int i):
+        "Restore the invariants after the value at position `i` changed."
+        self.up(self.down(i))
+
+    cdef _setitem(self, object k, double v):
+        "upsert (update or insert) value associated with key."
+        cdef int i
+        if k in self.loc:
+            i = self.loc[k]
+            self.val.val[i] = v
+        else:
+            i = self.val.push(v)
+            self.key.append(k)
+            self.loc[k] = i
+        self._update(i)
 
+    cdef void _remove(self, int i):
+        cdef int last = self.val.end - 1
+        self.swap(i, last)
+        self.val.pop()
+        del self.loc[self.key.pop()]
+        if i != last: self._update(i)
 
-class BoundedMaxHeap(MinMaxHeap):
+    def check(self):
+        for i in range(2, self.val.end):
+            a = i // 2
+            while a >= 1:
+                if _min_level(a):
+                    assert self.val[a] <= self.val[i], (a, i)
+                else:
+                    assert self.val[a] >= self.val[i], (a, i)
+                a //= 2
+        assert len(self.key) == self.val.end
+        for i in range(1, self.val.end):
+            assert self.loc[self.key[i]] == i
+
+
+cdef class BoundedMaxHeap(MinMaxHeap):
+    "Keeps the `maxsize` keys with the largest values; smaller ones are evicted."
+
+    cdef public int maxsize
 
     def __init__(self, maxsize, **kw):
         super().__init__(**kw)
         self.maxsize = maxsize
 
-    def __setitem__(self, k, v):
-        super().__setitem__(k, v)
-        if len(self) > self.maxsize:
-            if v < self.peekmin()[1]:  # smaller than the smallest element.
-                return
-            else:
-                self.popmin()   # evict the smallest element
+    def __setitem__(self, k, double v):
+        if k in self.loc or self.val.end - 1 < self.maxsize:
+            self._setitem(k, v)
+        elif self.maxsize > 0 and self.val.val[1] < v:
+            # evict the smallest element by overwriting it in place
+            del self.loc[self.key[1]]
+            self.key[1] = k
+            self.loc[k] = 1
+            self.val.val[1] = v
+            self._update(1)
 
     def pop(self):
         return self.popmax()
 
     def check(self):
         super().check()
-        assert len(self.max) <= self.maxsize
-        assert len(self.min) <= self.maxsize
+        assert len(self) <= self.maxsize
@@ -2,27 +2,45 @@
 # cython: overflowcheck=False, initializedcheck=False, wraparound=False, cdivision=True
 import numpy as np
 
-from libc.stdlib cimport rand
 from libc.math cimport log2, ceil
-cdef extern from "limits.h":
-    int INT_MAX
-
-cdef double MAX = float(INT_MAX)
-cdef inline double uniform() nogil:
-    return rand() / MAX
+from cpython.pycapsule cimport PyCapsule_GetPointer
+from numpy.random cimport bitgen_t
 
 
 cdef class SumHeap:
+    """
+    Weights `w[0..n-1]` stored at the leaves of a complete binary tree whose
+    internal nodes hold the sums of their children, which supports sampling
+    `k ~ w[k] / sum(w)` and updating a weight in O(log n) time.
+
+    Random draws come from numpy's PCG64 bit generator; pass `seed` (an int, a
+    `numpy.random.BitGenerator`, or a `numpy.random.Generator`) for
+    reproducible samples.
+
+    """
+
     cdef readonly:
         double[:] S
         int n, d
+        object bit_generator
+    cdef bitgen_t *rng
 
-    def __init__(self, double[:] w):
+    def __init__(self, double[:] w, seed=None):
         self.n = w.shape[0]
-        self.d = int(2**ceil(log2(self.n)))   # number of intermediates
+        self.d = int(2**ceil(log2(max(self.n, 1))))   # number of intermediates
         self.S = np.zeros(2*self.d)           # intermediates + leaves
+        self.seed(seed)
         self.heapify(w)
 
+    def seed(self, seed=None):
+        "Reset the random number generator."
+        if isinstance(seed, np.random.Generator):
+            seed = seed.bit_generator
+        if not isinstance(seed, np.random.BitGenerator):
+            seed = np.random.PCG64(seed)
+        self.bit_generator = seed
+        self.rng = <bitgen_t *> PyCapsule_GetPointer(seed.capsule, "BitGenerator")
+
     def __getitem__(self, int k):
         return self.S[self.d + k]
 
@@ -38,17 +56,59 @@ cdef class SumHeap:
 
     cpdef void update(self, int k, double v):
         "Update w[k] = v` in time O(log n)."
-        i = self.d + k
+        self._update(k, v)
+
+    cdef inline void _update(self, int k, double v) noexcept nogil:
+        cdef int i = self.d + k
         self.S[i] = v
-        while i > 0:   # fix parents in the tree.
+        while i > 1:   # fix parents in the tree.
             i //= 2
             self.S[i] = self.S[2*i] + self.S[2*i + 1]
 
-    cpdef int sample(self, u=None):
+    def update_many(self, idx, vals):
+        """
+        Update `w[idx[j]] = vals[j]` for each `j` (later duplicates win).  Each
+        ancestor of the updated leaves is recomputed once, rather than once per
+        leaf below it.
+        """
+        cdef Py_ssize_t[:] I = np.asarray(idx, dtype=np.intp).ravel()
+        cdef double[:] V = np.asarray(vals, dtype=np.double).ravel()
+        cdef Py_ssize_t j, m = I.shape[0], w
+        assert V.shape[0] == m
+        if m == 0: return
+        if not (0 <= np.min(I) and np.max(I) < self.n):
+            raise IndexError('index out of range')
+        with nogil:
+            for j in range(m):
+                self.S[self.d + I[j]] = V[j]
+        # Parents of the updated leaves, deduplicated level by level.
+        cdef Py_ssize_t[:] nodes = np.unique(np.asarray(I) + self.d) // 2
+        m = nodes.shape[0]
+        with nogil:
+            while m > 0 and nodes[0] > 0:
+                w = 0
+                for j in range(m):
+                    self.S[nodes[j]] = self.S[2*nodes[j]] + self.S[2*nodes[j] + 1]
+                    if w == 0 or nodes[w - 1] != nodes[j] // 2:
+                        nodes[w] = nodes[j] // 2
+                        w += 1
+                m = w
+
+    cdef void _check_mass(self) except *:
+        if not self.S[1] > 0:
+            raise ValueError('cannot sample: the total weight is not positive')
+
+    cpdef int sample(self, u=None) except -1:
         "Sample from sumheap, O(log n) per sample."
+        self._check_mass()
+        if u is None:
+            with self.bit_generator.lock:
+                u = self.rng.next_double(self.rng.state)
+        return self._sample(u)
+
+    cdef inline int _sample(self, double u) noexcept nogil:
         cdef double left, p
-        if u is None: u = uniform()
-        d = self.S.shape[0]//2     # number of internal nodes.
+        cdef int i, d = self.d     # number of internal nodes.
         p = u * self.S[1]  # random probe, p ~ Uniform(0, z)
         # Use binary search to find the index of the largest CDF (represented as a
         # heap) value that is less than a random probe.
@@ -62,11 +122,32 @@ cdef class SumHeap:
                 i += 1        # Point at right child
         return i - d
 
-    cpdef long[:] swor(self, int k):
-        "Sample without replacement `k` times."
-        cdef long[:] z = np.zeros(k, dtype=int)
-        for i in range(k):
-            k = self.sample()
-            z[i] = k
-            self.update(k, 0)
-        return z
+    def sample_many(self, Py_ssize_t n):
+        "Sample `n` times with replacement; returns an array of indices."
+        out = np.empty(n, dtype=np.intp)
+        cdef Py_ssize_t[:] z = out
+        cdef Py_ssize_t i
+        if n > 0: self._check_mass()
+        with self.bit_generator.lock, nogil:
+            for i in range(n):
+                z[i] = self._sample(self.rng.next_double(self.rng.state))
+        return out
+
+    def swor(self, int k):
+        """
+        Sample without replacement `k` times; returns an array of indices.  The
+        weights are restored afterwards.
+        """
+        cdef int i
+        assert k <= np.count_nonzero(self.S[self.d:self.d + self.n]), \
+            'fewer than k nonzero weights'
+        out = np.empty(k, dtype=np.intp)
+        cdef Py_ssize_t[:] z = out
+        cdef double[:] old = np.empty(k)
+        with self.bit_generator.lock, nogil:
+            for i in range(k):
+                z[i] = self._sample(self.rng.next_double(self.rng.state))
+                old[i] = self.S[self.d + z[i]]
+                self._update(z[i], 0)
+        self.update_many(out, old)
+        return out
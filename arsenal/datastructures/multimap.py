@@ -1,58 +1,440 @@
-class MultiMap:
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+from arsenal.integerizer import Integerizer
+from arsenal.iterextras.sorted_intersection import sorted_intersection
+
+_EMPTY = array('q')
+
+
+def _query(q):
+    if not isinstance(q, (list, tuple)): q = (q,)
+    return tuple(q)
+
+
+class _Vals(Mapping):
+    "Read-only mapping view of the entries of a `MultiMap` or `MultiMapView`."
+    __slots__ = ('mm',)
+
+    def __init__(self, mm):
+        self.mm = mm
+
+    def __getitem__(self, item):
+        r = self.mm._lookup(item) if isinstance(item, tuple) else None
+        if r is None: raise KeyError(item)
+        return self.mm._store.values[r]
+
+    def __iter__(self):
+        return iter(self.mm)
+
+    def __len__(self):
+        return len(self.mm)
+
+    def items(self):
+        return self.mm.items()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _MultiMapBase:
+    "Methods shared by `MultiMap` and `MultiMapView`."
+
+    @property
+    def vals(self):
+        "Read-only live mapping view of the entries (rows are decoded only as they are iterated)."
+        return _Vals(self)
+
+    def _pattern(self, query):
+        "Validate `query`; returns its length, fixed positions, and their values."
+        for y in query:
+            if isinstance(y, slice):
+                assert y == slice(None, None, None), 'only simple slices allowed.'
+        m = tuple(i for i, y in enumerate(query) if not isinstance(y, slice))
+        return len(query), m, tuple(query[i] for i in m)
+
+    def copy(self):
+        "Independent `MultiMap` of the entries (which shares the symbol table only if it was passed explicitly)."
+        store = self._store
+        return MultiMap(dict(self.items()), symbols=store.symbols if store._shared_symbols else None)
+
+    def __eq__(self, other):
+        if not isinstance(other, _MultiMapBase): return NotImplemented
+        if len(self) != len(other): return False
+        values = other._store.values
+        for x, v in self.items():
+            r = other._lookup(x)
+            if r is None or values[r] != v: return False
+        return True
+
+    def __str__(self):
+        vals = self.vals
+        # Sort if types allow it, otherwise fall back to the order in vals dictionary
+        try:
+            vs = sorted(vals)
+        except TypeError:
+            vs = vals
+        return 'MultiMap {\n%s\n}' % '\n'.join(f'  {x}: {vals[x]},' for x in vs)
+
+
+class MultiMap(_MultiMapBase):
     """
     Multi-dimensional map data structure.
+
+    Maps tuples (of any lengths) to values.  A query such as `m[a, :, c]`
+    returns a `MultiMapView` of the entries of length three whose first and
+    third components are `a` and `c`.
+
+    Each tuple is stored as a row of integer codes (from the symbol table
+    `symbols`, which is private to the map unless one is passed in) in one
+    flat array.  Each query pattern gets an index from the codes of its fixed
+    components to a sorted array of row ids; an index is built the first time
+    its pattern is queried and maintained as entries are added and deleted.
+    Deleted rows are reclaimed (and the indexes rebuilt) once they make up
+    more than `compact_ratio` of the rows.
     """
 
-    def __init__(self, vals=None):
-        self.vals = {} if vals is None else vals
-        self.index = {}
+    compact_ratio = 0.5   # max fraction of deleted rows
+    compact_min = 64      # don't bother compacting fewer deleted rows than this
+
+    def __init__(self, vals=None, symbols=None):
+        self._shared_symbols = symbols is not None
+        self.symbols = Integerizer() if symbols is None else symbols
+        self._clear()
+        if vals is not None:
+            for x, v in vals.items():
+                self[x] = v
+
+    def _clear(self):
+        self.data = array('q')       # codes of all rows, concatenated
+        self.start = array('q', [0]) # row id -> offset of its codes in `data`
+        self.values = []             # row id -> value
+        self.alive = bytearray()     # row id -> not deleted?
+        self.dead = 0                # number of deleted rows
+        self.rows = {}               # packed codes -> row id
+        self.index = {}              # (length, fixed positions) -> {codes: row ids}
+
+    @property
+    def _store(self):
+        return self
+
+    def _encode(self, item, add=False):
+        "Integer codes of the components of `item` (None if some component is unknown)."
+        if add: return array('q', [self.symbols.encode(y) for y in item])
+        codes = array('q')
+        for y in item:
+            if y not in self.symbols: return None
+            codes.append(self.symbols.encode(y))
+        return codes
+
+    def _decode(self, r):
+        return tuple(self.symbols.decode(c) for c in self.data[self.start[r]:self.start[r+1]])
+
+    def _rowids(self):
+        return (r for r in range(len(self.values)) if self.alive[r])
 
     def __iter__(self):
-        return iter(self.vals)
+        return (self._decode(r) for r in self._rowids())
+
+    def __len__(self):
+        return len(self.rows)
+
+    def items(self):
+        return ((self._decode(r), self.values[r]) for r in self._rowids())
+
+    def _row(self, item):
+        codes = self._encode(item)
+        return None if codes is None else self.rows.get(codes.tobytes())
+
+    def _lookup(self, item):
+        "Row id of the entry `item` (None if there is no such entry)."
+        return self._row(item)
+
+    def __contains__(self, item):
+        return self._row(_query(item)) is not None
 
     def __setitem__(self, item, val):
-        if not isinstance(item, (list, tuple)): item = (item,)
+        item = _query(item)
         assert not any(isinstance(y, slice) for y in item), 'setting range values not supported'
-        if item not in self.vals:
+        codes = self._encode(item, add=True)
+        r = self.rows.get(codes.tobytes())
+        if r is None:
+            r = len(self.values)
+            self.rows[codes.tobytes()] = r
+            self.data.extend(codes)
+            self.start.append(len(self.data))
+            self.values.append(val)
+            self.alive.append(1)
             # We only need to update indexes when we get a new item because
             # indexes only track the support.  To update, we loop through all
-            # active indexes (i.e., query patterns).
-            for m,ix in self.index.items():
-                k = tuple(item[i] for i in m)
-                if k not in ix: ix[k] = set()
-                ix[k].add(item)
-        self.vals[item] = val
+            # active indexes (i.e., query patterns).  Row ids increase, so
+            # appending keeps the index's arrays sorted.
+            for (n, m), ix in self.index.items():
+                if n == len(item):
+                    k = tuple(codes[i] for i in m)
+                    if k not in ix: ix[k] = array('q')
+                    ix[k].append(r)
+        else:
+            self.values[r] = val
+
+    def __delitem__(self, query):
+        "Delete an entry, or every entry matching a query with slices."
+        query = _query(query)
+        if any(isinstance(y, slice) for y in query):
+            for r in list(self[query].rowids):
+                self._delete(r)
+        else:
+            r = self._row(query)
+            if r is None: raise KeyError(query)
+            self._delete(r)
+        self._maybe_compact()
+
+    def _delete(self, r):
+        "Delete row `r` (callers must `_maybe_compact` afterwards, as it renumbers rows)."
+        codes = self.data[self.start[r]:self.start[r+1]]
+        del self.rows[codes.tobytes()]
+        self.values[r] = None
+        self.alive[r] = 0
+        self.dead += 1
+        for (n, m), ix in self.index.items():
+            if n == len(codes):
+                k = tuple(codes[i] for i in m)
+                a = ix[k]
+                del a[bisect_left(a, r)]
+                if not a: del ix[k]
+
+    def _maybe_compact(self):
+        if self.dead > max(self.compact_min, self.compact_ratio * len(self.values)):
+            self.compact()
+
+    def compact(self):
+        """
+        Drop deleted rows (and, unless the symbol table is shared, unused
+        symbols).  Rows are renumbered and indexes are rebuilt when next used.
+        """
+        items = list(self.items())
+        if not self._shared_symbols: self.symbols = Integerizer()
+        self._clear()
+        for x, v in items:
+            self[x] = v
 
     def __getitem__(self, query):
-        if not isinstance(query, (list, tuple)): query = (query,)
-        for y in query:
-            if isinstance(y, slice):
-                assert y == slice(None, None, None), 'only simple slices allowed.'
-        m = tuple(i for i, y in enumerate(query) if not isinstance(y, slice))
-        k = tuple(y for i, y in enumerate(query) if not isinstance(y, slice))
-        if m not in self.index: self._index(m)
-        return MultiMap({x: self.vals[x] for x in self.index[m].get(k, set())
-                         if len(x) == len(query)})
-
-    def _index(self, m):
-        self.index[m] = ix = {}
-        for x in self.vals:
-            k = tuple(x[i] for i in m)
-            if k not in ix: ix[k] = set()
-            ix[k].add(x)
+        n, m, k = self._pattern(_query(query))
+        return MultiMapView(self, n, m, k)
+
+    def _index(self, n, m):
+        if (n, m) in self.index: return self.index[n, m]
+        self.index[n, m] = ix = {}
+        data = self.data
+        for r in self._rowids():
+            s = self.start[r]
+            if self.start[r+1] - s != n: continue
+            k = tuple(data[s + i] for i in m)
+            if k not in ix: ix[k] = array('q')
+            ix[k].append(r)
         return ix
 
     def __repr__(self):
-        return f'MultiMap({self.vals})'
+        return f'MultiMap({dict(self.items())})'
+
+
+class MultiMapView(_MultiMapBase):
+    """
+    Live view of the entries of a `MultiMap` with length `n` whose components
+    at positions `m` equal `key`.  Nothing is copied: the view reads the
+    parent's index, so it reflects later changes to the parent.  Use `copy` to
+    get an independent `MultiMap`.
+    """
+
+    def __init__(self, parent, n, m, key):
+        self.parent = parent
+        self.n = n
+        self.m = m
+        self.key = key
+
+    @property
+    def _store(self):
+        return self.parent
+
+    @property
+    def symbols(self):
+        return self.parent.symbols
+
+    @property
+    def rowids(self):
+        "Sorted array of the row ids (in the parent) of the entries in the view."
+        codes = self.parent._encode(self.key)
+        if codes is None: return _EMPTY
+        return self.parent._index(self.n, self.m).get(tuple(codes), _EMPTY)
+
+    def _rowids(self):
+        return iter(self.rowids)
+
+    def __iter__(self):
+        return (self.parent._decode(r) for r in self.rowids)
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def items(self):
+        p = self.parent
+        return ((p._decode(r), p.values[r]) for r in self.rowids)
+
+    def _match(self, item):
+        return len(item) == self.n and all(item[i] == y for i, y in zip(self.m, self.key))
+
+    def _lookup(self, item):
+        return self.parent._row(item) if self._match(item) else None
+
+    def __contains__(self, item):
+        item = _query(item)
+        return self._match(item) and item in self.parent
+
+    def __getitem__(self, query):
+        n, m, k = self._pattern(_query(query))
+        fixed = dict(zip(self.m, self.key))
+        for i, y in zip(m, k):
+            if fixed.setdefault(i, y) != y:   # conflicting constraints
+                return MultiMapView(MultiMap(), n, m, k)
+        if n != self.n:
+            return MultiMapView(MultiMap(), n, m, k)
+        m = tuple(sorted(fixed))
+        return MultiMapView(self.parent, n, m, tuple(fixed[i] for i in m))
+
+    def __setitem__(self, item, val):
+        item = _query(item)
+        assert self._match(item), f'{item} does not match the view'
+        self.parent[item] = val
+
+    def __delitem__(self, query):
+        query = _query(query)
+        if any(isinstance(y, slice) for y in query):
+            for r in list(self[query].rowids):
+                self.parent._delete(r)
+            self.parent._maybe_compact()
+            return
+        if query not in self: raise KeyError(query)
+        del self.parent[query]
+
+    def __repr__(self):
+        return f'MultiMapView({dict(self.items())})'
+
 
+class Var:
+    "A variable in a `join` pattern."
+    __slots__ = ('name',)
+    def __init__(self, name):
+        self.name = name
     def __eq__(self, other):
-        return self.vals == other.vals
+        return isinstance(other, Var) and self.name == other.name
+    def __hash__(self):
+        return hash((Var, self.name))
+    def __repr__(self):
+        return self.name
 
-    def __str__(self):
-        # Sort if types allow it, otherwise fall back to the order in vals dictionary
-        try:
-            vs = sorted(self.vals)
-        except TypeError:
-            vs = self.vals
-        return 'MultiMap {\n%s\n}' % '\n'.join(f'  {x}: {self.vals[x]},' for x in vs)
 
+class _Trie:
+    """
+    Trie of the rows of a `MultiMap` that match a join atom, with one level per
+    variable (in join order).  Each node has a sorted list of the codes of the
+    values of its variable and a dict from each code to its child.
+    """
+
+    def __init__(self, mm, pattern, order, symbols):
+        self.vars = [v for v in order if v in pattern]
+        query = tuple(slice(None) if isinstance(y, Var) else y for y in pattern)
+        view = mm[query]
+        pos = {}   # variable -> positions where it occurs in the pattern
+        for i, y in enumerate(pattern):
+            if isinstance(y, Var): pos.setdefault(y, []).append(i)
+        parent = mm.parent if isinstance(mm, MultiMapView) else mm
+        data, start = parent.data, parent.start
+        if parent.symbols is symbols:
+            recode = lambda c: c
+        else:
+            recode = lambda c: symbols.encode(parent.symbols.decode(c))
+        root = {}
+        self.empty = True
+        for r in view.rowids:
+            s = start[r]
+            path = []
+            for v in self.vars:
+                ps = pos[v]
+                c = data[s + ps[0]]
+                if any(data[s + p] != c for p in ps[1:]): break   # repeated variable disagrees
+                path.append(recode(c))
+            else:
+                self.empty = False
+                node = root
+                for c in path:
+                    node = node.setdefault(c, {})
+        self.root = self._freeze(root)
+
+    def _freeze(self, node):
+        return (sorted(node), {c: self._freeze(child) for c, child in node.items()})
+
+
+def join(atoms, order=None):
+    """
+    Enumerate the solutions of a conjunctive query lazily with generic join
+    (a worst-case optimal join algorithm, like leapfrog triejoin).
+
+    `atoms` is a list of `(multimap, pattern)` pairs, where each pattern is a
+    tuple of `Var`s and constants; a solution is a dict from each `Var` to a
+    value such that, for each atom, substituting the solution into its
+    pattern gives a key of its multimap.  Variables are bound one at a time,
+    in `order` (by default, order of first appearance; otherwise, it must
+    list each variable exactly once), by intersecting the sorted candidate
+    values from each atom that mentions the variable with
+    `sorted_intersection`.
+
+    >>> X, Y, Z = Var('X'), Var('Y'), Var('Z')
+    >>> E = MultiMap({(1, 2): 1, (2, 3): 1, (1, 3): 1, (3, 4): 1})
+    >>> [(r[X], r[Y], r[Z]) for r in join([(E, (X, Y)), (E, (Y, Z)), (E, (X, Z))])]
+    [(1, 2, 3)]
+
+    """
+    atoms = [(mm, _query(pattern)) for mm, pattern in atoms]
+    variables = []
+    for _, pattern in atoms:
+        for y in pattern:
+            if isinstance(y, Var) and y not in variables:
+                variables.append(y)
+    if order is None:
+        order = variables
+    else:
+        order = list(order)
+        if len(set(order)) != len(order) or set(order) != set(variables):
+            raise ValueError(f'order {order} must list each variable in the patterns'
+                             f' ({variables}) exactly once')
+    # Codes are compared across atoms, so they must come from one symbol table.
+    tables = {id(mm.symbols): mm.symbols for mm, _ in atoms}
+    symbols = next(iter(tables.values())) if len(tables) == 1 else Integerizer()
+    tries = [_Trie(mm, pattern, order, symbols) for mm, pattern in atoms]
+    if any(t.empty for t in tries): return
+    nodes = [t.root for t in tries]
+    uses = [[j for j, t in enumerate(tries) if v in t.vars] for v in order]
+    values = [None] * len(order)
+
+    def rec(i):
+        if i == len(order):
+            yield {v: symbols.decode(c) for v, c in zip(order, values)}
+            return
+        js = uses[i]
+        # smallest candidate list first
+        lists = sorted((nodes[j][0] for j in js), key=len)
+        candidates = lists[0]
+        for other in lists[1:]:
+            if not candidates: return
+            candidates = list(sorted_intersection(candidates, other))
+        saved = [nodes[j] for j in js]
+        for c in candidates:
+            values[i] = c
+            for j in js:
+                nodes[j] = nodes[j][1][c]
+            yield from rec(i + 1)
+            for j, node in zip(js, saved):
+                nodes[j] = node
+
+    yield from rec(0)
@@ -2,63 +2,162 @@
 OrderedSet -- a set which remembers insertion order.
 """
 
+_DEAD = object()   # tombstone for removed elements
+
+
+def _keys(other):
+    return other._pos.keys() if isinstance(other, OrderedSet) else other
+
+
 class OrderedSet:
     """
     Set which remembers insertion ordering allowed iteration while changing size
     and determinism.
+
+    Elements are stored in an array, in insertion order, along with a dict
+    from each element to its position.  Removing an element replaces it with a
+    tombstone (O(1) time); the array is compacted once tombstones outnumber the
+    elements, or when positional access (`s[i]`) needs it.  Compaction is
+    deferred while the set is being iterated over.
+
+    >>> s = OrderedSet('abcab')
+    >>> s.remove('b'); s.add('b')
+    >>> s, s[0], s[-1]
+    (OrderedSet(['a', 'c', 'b']), 'a', 'b')
+    >>> s - 'c', s & 'bcd', s | 'xa'
+    (OrderedSet(['a', 'b']), OrderedSet(['c', 'b']), OrderedSet(['a', 'c', 'b', 'x']))
+
     """
-    __slots__ = 'set', 'list'
+    __slots__ = '_items', '_pos', '_dead', '_iters'
+    compact_min = 32   # smallest number of tombstones worth compacting
+
     def __init__(self, elems=None):
-        self.set = set()
-        self.list = []
+        self._items = []   # elements in insertion order, with tombstones
+        self._pos = {}     # element -> position in `_items`
+        self._dead = 0     # number of tombstones
+        self._iters = 0    # number of iterations in progress
         if elems is not None:
-            for x in elems:
-                self.add(x)
+            self.update(elems)
+
+    @classmethod
+    def _from(cls, elems):
+        "Create an OrderedSet from a sequence of distinct elements."
+        new = cls()
+        new._items = items = list(elems)
+        new._pos = dict(zip(items, range(len(items))))
+        return new
+
+    @property
+    def set(self):
+        "Set-like view of the elements."
+        return self._pos.keys()
+
+    @property
+    def list(self):
+        "List of the elements in order."
+        return list(self._pos)
+
     def __contains__(self, item):
-        return item in self.set
+        return item in self._pos
+
     def __iter__(self):
-        return iter(self.list)
+        self._iters += 1
+        try:
+            i = 0
+            while True:
+                items = self._items   # may grow during iteration
+                if i >= len(items): return
+                x = items[i]
+                i += 1
+                if x is not _DEAD:
+                    yield x
+        finally:
+            self._iters -= 1
+
     def add(self, item):
-        if item not in self.set:
-            self.set.add(item)
-            self.list.append(item)
+        if item not in self._pos:
+            self._pos[item] = len(self._items)
+            self._items.append(item)
+
+    def update(self, elems):
+        "Add each of `elems` in order."
+        pos = self._pos
+        new = [x for x in dict.fromkeys(_keys(elems)) if x not in pos]
+        n = len(self._items)
+        self._items.extend(new)
+        pos.update(zip(new, range(n, n + len(new))))
+
     def __len__(self):
-        return len(self.set)
+        return len(self._pos)
+
     def __repr__(self):
         return 'OrderedSet(%r)' % self.list
+
     def __getitem__(self, *args):
-        return self.list.__getitem__(*args)
+        if not self._dead:
+            return self._items.__getitem__(*args)
+        if self._iters:   # can't move elements under the iterators
+            return self.list.__getitem__(*args)
+        self.compact()
+        return self._items.__getitem__(*args)
+
+    def copy(self):
+        return OrderedSet._from(self._pos)
+
+    # Set algebra uses the C implementation of set operations on the dict's
+    # keys to find the elements to keep, then keeps them in order.
     def __sub__(self, other):
-        new = OrderedSet()
-        for x in self:
-            if x not in other:
-                new.add(x)
-        return new
+        drop = self._pos.keys() & _keys(other)
+        if not drop: return self.copy()
+        return OrderedSet._from([x for x in self._pos if x not in drop])
+
+    def __and__(self, other):
+        keep = self._pos.keys() & _keys(other)
+        return OrderedSet._from([x for x in self._pos if x in keep])
+
     def __or__(self, other):
-        new = OrderedSet()
-        for x in self:
-            new.add(x)
-        for x in other:
-            new.add(x)
+        new = self.copy()
+        new.update(other)
         return new
+
     def __ior__(self, other):
-        for x in other:
-            self.add(x)
+        self.update(other)
         return self
+
+    def __isub__(self, other):
+        for x in self._pos.keys() & _keys(other):
+            self.remove(x)
+        return self
+
     def isdisjoint(self, other):
-        return self.set.isdisjoint(other.set)
+        return self._pos.keys().isdisjoint(_keys(other))
+
     def __lt__(self, other):
-        return self.set < other.set
+        return self._pos.keys() < _keys(other)
+
     def __le__(self, other):
-        return self.set <= other.set
+        return self._pos.keys() <= _keys(other)
+
     def __eq__(self, other):
         if isinstance(other, OrderedSet):
-            return self.set == other.set
-        elif isinstance(other, set):
-            return self.set == other
+            return self._pos.keys() == other._pos.keys()
+        elif isinstance(other, (set, frozenset)):
+            return self._pos.keys() == other
         else:
             return False
+
     def remove(self, x):
-        "this method is slow; avoid"
-        self.set.remove(x)
-        self.list = [y for y in self.list if x != y]
+        "Remove `x` in O(1) time; raises KeyError if it is not an element."
+        self._items[self._pos.pop(x)] = _DEAD
+        self._dead += 1
+        if self._dead > max(len(self._pos), self.compact_min) and not self._iters:
+            self.compact()
+
+    def discard(self, x):
+        if x in self._pos: self.remove(x)
+
+    def compact(self):
+        "Drop the tombstones from the array (not safe during iteration)."
+        self._items = items = list(self._pos)
+        self._pos = dict(zip(items, range(len(items))))
+        self._dead = 0
@@ -17,6 +17,7 @@ Original version by Ryan Cotterell
 import numpy as np
 from collections import defaultdict
 from arsenal import colors
+from arsenal.datastructures.dfa import minimize_dfa
 
 
 def stable(f, P):
@@ -33,46 +34,150 @@ def stable(f, P):
     return True
 
 
-def split(S, P):
-    return frozenset(P & S), frozenset(P-S)
+class PartitionRefinement:
+    """
+    Partition of the elements `0, ..., n-1` into blocks, which supports
+    splitting blocks in time proportional to the number of elements that move.
+
+    Blocks are contiguous ranges of the array `elems`; `loc` and `block` map
+    each element to its position in `elems` and to its block.  To refine the
+    partition by a set `S`, `mark` each element of `S` (which moves it to the
+    marked prefix of its block's range) and then call `split`, which turns the
+    marked prefix of each partially marked block into a new block.
+
+    >>> R = PartitionRefinement(6, [[0, 1, 2], [3, 4, 5]])
+    >>> R.refine([1, 2, 3, 4, 5])
+    [(0, 2)]
+    >>> sorted(sorted(R.members(b)) for b in range(len(R)))
+    [[0], [1, 2], [3, 4, 5]]
+
+    """
+
+    def __init__(self, n, blocks=None):
+        if blocks is None: blocks = [range(n)]
+        self.elems = []    # elements, grouped by block
+        self.loc = [None] * n     # element -> position in `elems`
+        self.block = [None] * n   # element -> block
+        self.first = []    # block -> start of its range in `elems`
+        self.end = []      # block -> end of its range
+        self.mid = []      # block -> end of its marked prefix
+        self.touched = []  # blocks with marked elements
+        for B in blocks:
+            b = len(self.first)
+            self.first.append(len(self.elems))
+            self.mid.append(len(self.elems))
+            for x in B:
+                assert self.block[x] is None, f'{x} is in more than one block'
+                self.block[x] = b
+                self.loc[x] = len(self.elems)
+                self.elems.append(x)
+            self.end.append(len(self.elems))
+        assert len(self.elems) == n, 'blocks must cover 0..n-1'
+
+    def __len__(self):
+        return len(self.first)
+
+    def size(self, b):
+        return self.end[b] - self.first[b]
+
+    def members(self, b):
+        "List of the elements of block `b`."
+        return self.elems[self.first[b]:self.end[b]]
+
+    def mark(self, x):
+        "Mark element `x` (in O(1) time)."
+        elems = self.elems; loc = self.loc
+        b = self.block[x]
+        i = loc[x]
+        m = self.mid[b]
+        if i < m: return   # already marked
+        if m == self.first[b]: self.touched.append(b)
+        # swap x into the marked prefix
+        y = elems[m]
+        elems[m] = x; loc[x] = m
+        elems[i] = y; loc[y] = i
+        self.mid[b] = m + 1
+
+    def split(self):
+        """
+        Split each block with marked elements (unless they are all marked) into
+        a new block of its marked elements and the rest, and unmark them.
+        Returns a list of pairs `(b, new)` of the old and new block ids.
+        """
+        first = self.first; end = self.end; mid = self.mid; block = self.block
+        splits = []
+        for b in self.touched:
+            m = mid[b]
+            if m == end[b]:   # no split
+                mid[b] = first[b]
+                continue
+            new = len(first)
+            first.append(first[b])
+            end.append(m)
+            mid.append(first[b])
+            first[b] = mid[b] = m
+            for x in self.elems[first[new]:m]:
+                block[x] = new
+            splits.append((b, new))
+        self.touched = []
+        return splits
+
+    def refine(self, S):
+        "Refine the partition by the set `S`; returns the splits."
+        for x in S: self.mark(x)
+        return self.split()
+
+    def blocks(self):
+        "List of the blocks, each a list of elements."
+        return [self.members(b) for b in range(len(self))]
 
 
 def hopcroft(f, P):
-
-    # compute the pre-image of f
-    finv = defaultdict(set)
-    for n in f:
-        finv[f[n]].add(n)
-
-    stack = list(P)
-
-    while stack: # empties in O(log n) steps
+    """
+    Coarsest refinement of the partition `P` that is stable with respect to
+    the function `f` (a dict), i.e., elements in the same block are mapped to
+    the same block.  Runs in O(n log n) time using `PartitionRefinement` and
+    Hopcroft's "process the smaller half" worklist.
+    """
+    elems = list(f)
+    index = {x: i for i, x in enumerate(elems)}
+    n = len(elems)
+
+    # pre-image of f
+    finv = [[] for _ in range(n)]
+    for x in elems:
+        finv[index[f[x]]].append(index[x])
+
+    R = PartitionRefinement(n, [[index[x] for x in B] for B in P])
+
+    # Every block but the largest is a splitter: splitting by the others also
+    # splits by their union's complement.
+    stack = sorted(range(len(R)), key=R.size)[:-1]
+    waiting = [False] * len(R)
+    for b in stack: waiting[b] = True
+
+    while stack:
         S = stack.pop()
-        R = set() # new refinement
-
-        # compute subset of the pre-image in O(n) time
-        Sinv = set.union(*[finv[x] for x in S])
-
-        for B in P: # entire loop runs in O(n) time
-            X, Y = split(Sinv, B) # runs in O(|B|) time
+        waiting[S] = False
+        for x in R.members(S):
+            for y in finv[x]:
+                R.mark(y)
+        for b, new in R.split():
+            waiting.append(False)
+            # Hopcroft's speed-up is that we only need to enqueue the smaller
+            # half, unless the block was already waiting to be processed.
+            if waiting[b] or R.size(new) <= R.size(b):
+                c = new
+            else:
+                c = b
+            stack.append(c)
+            waiting[c] = True
 
-            if len(X) > 0 and len(Y) > 0:
-                # X, Y are now part of the refinement
-                R.add(X)
-                R.add(Y)
+    return frozenset(frozenset(elems[x] for x in B) for B in R.blocks())
 
-                # Hopcroft's speed-up to the slower algorithm is that we
-                # only need to enqueue the smaller set.
-                if len(X) < len(Y):
-                    stack.append(X)
-                else:
-                    stack.append(Y)
-            else:
-                # Q remains part of the refinement
-                R.add(B)
-        P = R
 
-    return frozenset(P)
+def split(S, P):
+    return frozenset(P & S), frozenset(P-S)
 
 
 def slow(f, P):
@@ -12,44 +12,93 @@ class pdict(dict):
     that priorities of items can be efficiently updated (amortized O(1))
     using code as 'thedict[item] = new_priority.'
 
-    The 'smallest' method can be used to return the object with lowest
-    priority, and 'pop_smallest' also removes it.
+    The 'peekitem' method can be used to return the (item, priority) pair with
+    lowest priority, and 'popitem' also removes it.
 
     The 'sorted_iter' method provides a destructive sorted iterator.
+
+    Updated and deleted items leave stale entries in the heap, which are
+    skipped when popping.  The heap is rebuilt from the live items whenever
+    more than a `compact_ratio` fraction of its entries are stale, so its size
+    stays proportional to the number of items.
     """
 
+    compact_ratio = 0.5     # max fraction of stale entries in the heap
+    compact_min = 64        # don't bother compacting heaps smaller than this
+
     def __init__(self, *args, **kwargs):
         super(pdict, self).__init__(*args, **kwargs)
+        self.compactions = 0
         self._rebuild_heap()
 
     def _rebuild_heap(self):
         self._heap = [(v, k) for k, v in self.items()]
         heapify(self._heap)
 
-    def pop(self):
-        return self.popitem()[0]
+    @property
+    def stale(self):
+        "Number of stale entries in the heap."
+        return len(self._heap) - len(self)
 
-    def popitem(self):
-        """Return the item with the lowest priority.
+    @property
+    def stale_ratio(self):
+        "Fraction of the heap's entries that are stale."
+        return self.stale / len(self._heap) if self._heap else 0.0
+
+    def _maybe_compact(self):
+        n = len(self._heap)
+        if n > self.compact_min and n - len(self) > self.compact_ratio * n:
+            self._rebuild_heap()
+            self.compactions += 1
+
+    def peekitem(self):
+        """Return the item with the lowest priority, without removing it.
 
         Raises IndexError if the object is empty.
         """
-
         heap = self._heap
         v, k = heap[0]
         while k not in self or self[k] != v:
             heappop(heap)
             v, k = heap[0]
-        del self[k]
+        return (k, v)
+
+    def pop(self):
+        return self.popitem()[0]
+
+    def popitem(self):
+        """Return the item with the lowest priority.
+
+        Raises IndexError if the object is empty.
+        """
+
+        k, v = self.peekitem()
+        heappop(self._heap)
+        super(pdict, self).__delitem__(k)
+        if not self:
+            self._heap = []   # only stale entries are left
+        else:
+            self._maybe_compact()
         return (k, v)
 
     def __setitem__(self, key, val):
+        if key in self and super(pdict, self).__getitem__(key) == val:
+            return self   # already in the heap with this priority
         # We are not going to remove the previous value from the heap, since
         # this would have a cost O(n).
         super(pdict, self).__setitem__(key, val)
         heappush(self._heap, (val, key))
+        self._maybe_compact()
         return self
 
+    def __delitem__(self, key):
+        super(pdict, self).__delitem__(key)
+        self._maybe_compact()
+
+    def clear(self):
+        super(pdict, self).clear()
+        self._heap = []
+
     def setdefault(self, key, val):
         if key not in self:
             self[key] = val
@@ -65,10 +114,10 @@ class pdict(dict):
         self._rebuild_heap()
 
     def sorted_iter(self):
-        """Sorted iterator of the priority dictionary items.
+        """Sorted iterator of the priority dictionary's keys.
 
         Beware: this will destroy elements as they are returned.
         """
 
         while self:
-            yield self.pop_smallest()
+            yield self.pop()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class AbstractIntegerizer:
 
     def __getitem__(self, i):
@@ -89,6 +92,100 @@ class Integerizer(AbstractIntegerizer):
     def items(self):
         return self._map.items()
 
+    def encode_array(self, xs, dtype=None):
+        """
+        Encode `xs` as an integer array (of `dtype`; by default int32 if the
+        codes fit, else int64).  New keys get codes in order of first
+        appearance, as with `encode`.
+
+        Only the distinct keys are looked up in Python: NumPy arrays (e.g., of
+        strings or numbers, but not objects) and pandas Series are reduced to
+        their distinct values with `pandas.factorize`, and pandas Categoricals
+        (or categorical Series) to their codes.  On this path, keys are
+        normalized to Python scalars with `tolist` (e.g., `np.int64` becomes
+        `int` and `datetime64[D]` becomes `datetime.date`, whereas `encode`
+        would keep a NumPy scalar as the key), and NaNs are all encoded as the
+        key `np.nan` (whereas any other NaN object in a list is a distinct key).
+
+        >>> a = Integerizer()
+        >>> a.encode_array(np.array(['b', 'a', 'b', 'c']))
+        array([0, 1, 0, 2], dtype=int32)
+        >>> a.decode_array(a.encode_array(['c', 'd'])).tolist()
+        ['c', 'd']
+
+        """
+        cat = _categorical(xs)
+        if cat is not None:
+            categories, codes = cat
+            assert (codes >= 0).all(), 'missing values cannot be encoded'
+            return self._encode_ndarray(codes, lambda u: categories[u].tolist(), dtype)
+        if hasattr(xs, 'to_numpy'): xs = xs.to_numpy()   # pandas Series or Index
+        if isinstance(xs, np.ndarray):
+            if xs.dtype != object:
+                return self._encode_ndarray(xs, lambda u: u.tolist(), dtype)
+            # pandas would turn None into NaN, so object arrays are encoded in Python.
+            return self.encode_array(xs.ravel().tolist(), dtype).reshape(xs.shape)
+        if not isinstance(xs, (list, tuple)): xs = list(xs)
+        self._encode_distinct(list(dict.fromkeys(xs)))
+        return np.fromiter(map(self._map.__getitem__, xs), dtype=_dtype(self, dtype), count=len(xs))
+
+    def _encode_ndarray(self, xs, keys, dtype):
+        "Encode the array `xs`, whose distinct values `u` stand for the keys `keys(u)`."
+        import pandas as pd
+        # distinct values in order of first appearance (NaN included)
+        inv, uniq = pd.factorize(xs.ravel(), use_na_sentinel=False)
+        # Use one NaN object as the key, since NaNs are only equal to themselves.
+        ks = [np.nan if k != k else k for k in keys(uniq)]
+        m = self._encode_distinct(ks).astype(_dtype(self, dtype))
+        return m[inv].reshape(xs.shape)
+
+    def _encode_distinct(self, ks):
+        return np.fromiter(map(self._add, ks), dtype=np.int64, count=len(ks))
+
+    def decode_array(self, codes):
+        "Object array of the keys of an array of `codes`."
+        # Object array of the keys, which grows (by doubling) with the alphabet.
+        buf = getattr(self, '_decoder', None)
+        n = len(self._list)
+        if buf is None or len(buf) < n:
+            new = np.empty(max(n, 2 * (0 if buf is None else len(buf))), dtype=object)
+            m = 0 if buf is None else self._ndecoded
+            if m: new[:m] = buf[:m]
+            buf = self._decoder = new
+            self._ndecoded = m
+        m = self._ndecoded
+        if m < n:
+            buf[m:n] = np.fromiter(self._list[m:n], dtype=object, count=n - m)
+            self._ndecoded = n
+        return buf[:n][np.asarray(codes, dtype=np.intp)]
+
+    def merge(self, other):
+        """
+        Add the keys of the integerizer `other` to this one.  Returns the array
+        `remap` which converts codes from `other` into codes from this one
+        (i.e., `remap[other.encode_array(xs)] == self.encode_array(xs)`).
+
+        >>> a = Integerizer(list('abc')); b = Integerizer(list('dcb'))
+        >>> a.merge(b)
+        array([3, 2, 1], dtype=int32)
+        >>> list(a)
+        ['a', 'b', 'c', 'd']
+
+        """
+        return self.encode_array(other._list)
+
+
+def _dtype(alphabet, dtype):
+    if dtype is not None: return dtype
+    return np.int32 if len(alphabet) < 2**31 else np.int64
+
+
+def _categorical(xs):
+    "Categories and codes of a pandas Categorical (or categorical Series); otherwise, None."
+    if getattr(getattr(xs, 'dtype', None), 'name', None) != 'category': return None
+    if hasattr(xs, 'cat'): xs = xs.cat
+    return xs.categories, np.asarray(xs.codes)
+
 
 def jenkins32(a):
     assert isinstance(a, int) and a >= 0
@@ -1,3 +1,4 @@
+import heapq
 import numpy as np
 import matplotlib.pyplot as pl
 import scipy.stats as st
@@ -377,3 +378,138 @@ def sample_dict(x, *args, **kwargs):
     return keys[sample(vals, *args, **kwargs)]
 
 
+
+
+def gumbel_topk(w, k, log=False, seed=None, chunk=2**16):
+    """
+    Sample `k` indices without replacement from the (unnormalized) discrete
+    distribution `w` (log-weights if `log=True`), in the order they would be
+    drawn, using the Gumbel-top-k trick: perturb each log-weight with
+    independent Gumbel noise and keep the `k` largest.
+
+    Equivalently (and without computing any logs when `log=False`), keep the
+    `k` largest `w[i] / E[i]` where `E[i] ~ Exponential(1)`.  The weights are
+    processed in chunks against the running k-th largest key, so this is one
+    O(n) pass that uses O(k + chunk) extra memory.
+
+    >>> sorted(gumbel_topk([0, 1, 0, 2, 3], 3).tolist())
+    [1, 3, 4]
+
+    """
+    w = np.asarray(w, dtype=float)
+    n = np.count_nonzero(w > (-np.inf if log else 0))
+    assert k <= n, f'cannot draw {k} items from {n} items with nonzero weight'
+    if k == 0: return np.empty(0, dtype=np.intp)
+    rng = np.random.default_rng(seed)
+    top = np.empty(0, dtype=np.intp)
+    keys = np.empty(0)
+    threshold = -np.inf
+    buf = np.empty(min(chunk, len(w)))
+    for s in range(0, len(w), chunk):
+        x = w[s:s+chunk]
+        e = buf[:len(x)]
+        rng.standard_exponential(out=e)
+        if log:
+            np.log(e, out=e)
+            np.subtract(x, e, out=e)
+        else:
+            np.divide(x, e, out=e)
+        m = np.flatnonzero(e > threshold)
+        if not len(m): continue
+        top = np.concatenate([top, m + s])
+        keys = np.concatenate([keys, e[m]])
+        if len(keys) > k:
+            p = np.argpartition(-keys, k - 1)[:k]
+            top = top[p]
+            keys = keys[p]
+            threshold = keys.min()
+    return top[np.argsort(-keys, kind='stable')][:k]
+
+
+class WeightedReservoir:
+    """
+    Weighted reservoir sampling without replacement (algorithm A-ExpJ of
+    Efraimidis and Spirakis, 2006): keeps a sample of `k` items from a stream
+    of weighted items, where each item's chance of being drawn next is
+    proportional to its weight.  Uses O(k) memory and, for a stream of `n`
+    items, only O(k log(n/k)) random draws since it jumps over the items that
+    will not enter the reservoir.
+
+    Keys `u**(1/w)` are kept in log space to avoid underflow.
+
+    >>> R = WeightedReservoir(2, seed=0)
+    >>> R.extend('abcd', [1, 0, 1, 1])
+    >>> len(R.sample()), 'b' in R.sample()
+    (2, False)
+
+    """
+
+    def __init__(self, k, seed=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.heap = []     # min-heap of (log key, arrival index, item)
+        self.n = 0         # number of items seen
+        self.skip = None   # weight to skip over before the next insertion
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _push(self, logkey, item):
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (logkey, self.n, item))
+        else:
+            heapq.heapreplace(self.heap, (logkey, self.n, item))
+        if len(self.heap) == self.k:
+            # X_w = log(r) / log(T), where T is the smallest key.
+            self.skip = np.log(self.rng.uniform()) / self.heap[0][0]
+
+    def _jump(self, item, w):
+        # The item at which the skip runs out enters the reservoir, with a key
+        # drawn uniformly from (T**w, 1).
+        t = np.exp(w * self.heap[0][0])
+        self._push(np.log(self.rng.uniform(t, 1)) / w, item)
+
+    def add(self, item, w):
+        "Add `item` with weight `w` to the stream."
+        if w > 0 and self.k > 0:
+            if len(self.heap) < self.k:
+                self._push(np.log(self.rng.uniform()) / w, item)
+            else:
+                self.skip -= w
+                if self.skip <= 0:
+                    self._jump(item, w)
+        self.n += 1
+
+    def extend(self, items, weights):
+        """
+        Add each of `items` with the corresponding weight.  The jumps are found
+        with a binary search over cumulative weights, so the cost is dominated
+        by one vectorized pass over `weights`.
+        """
+        weights = np.asarray(weights, dtype=float)
+        assert len(items) == len(weights)
+        if self.k == 0:
+            self.n += len(weights)
+            return
+        i = 0
+        while i < len(weights) and len(self.heap) < self.k:
+            self.add(items[i], weights[i])
+            i += 1
+        if i == len(weights): return
+        start = self.n - i     # arrival index of items[0]
+        c = np.cumsum(weights[i:])
+        base = 0.0             # cumulative weight up to the last insertion
+        while True:
+            # The first item at which the cumulative weight reaches the skip.
+            j = int(c.searchsorted(base + self.skip, side='left'))
+            if j == len(c):
+                self.skip -= c[-1] - base
+                break
+            self.n = start + i + j
+            self._jump(items[i + j], weights[i + j])
+            base = c[j]
+        self.n = start + len(weights)
+
+    def sample(self):
+        "The items in the reservoir, in the order they would have been drawn."
+        return [item for _, _, item in sorted(self.heap, reverse=True)]
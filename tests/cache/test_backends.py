@@ -0,0 +1,81 @@
+import os
+import shelve
+import tempfile
+
+import numpy as np
+
+from arsenal.assertions import assert_throws
+from arsenal.cache.backends import Serializer, Shelf
+from arsenal.cache.memoize import persistent_cache
+
+
+def test_serializer():
+    x = {'a': np.arange(10000), 'b': [np.ones((3, 4)).T, 'c'], 'd': b'xyz'}
+    for s in [Serializer(), Serializer(compress='zlib'), Serializer(protocol=4)]:
+        y = s.loads(s.dumps(x))
+        assert (y['a'] == x['a']).all() and (y['b'][0] == x['b'][0]).all()
+        assert y['b'][1] == 'c' and y['d'] == b'xyz'
+
+    # compression is skipped below the threshold
+    s = Serializer(compress='zlib', threshold=100)
+    assert s.dumps('x')[:1] == b'-'
+    assert s.dumps('x' * 1000)[:1] == b'z'
+    assert len(s.dumps('x' * 1000)) < 100
+
+    # data compressed with one codec can be read by any serializer
+    assert Serializer().loads(s.dumps('x' * 1000)) == 'x' * 1000
+
+    with assert_throws(ValueError):
+        Serializer(compress='xxx')
+
+
+def test_shelf():
+    d = tempfile.mkdtemp()
+    for storage in ['dbm', 'sqlite']:
+        filename = os.path.join(d, storage)
+        s = Shelf(filename, storage=storage, compress='zlib', sync_every=3)
+        for i in range(10):
+            s[i, 'x'] = list(range(i))
+        s['str'] = 'value'
+        assert s.unsynced == 2
+        s.close()
+
+        s = Shelf(filename, storage=storage)
+        assert len(s) == 11
+        assert s[5, 'x'] == list(range(5)) and s['str'] == 'value'
+        assert (5, 'x') in s and (11, 'x') not in s
+        s.close()
+
+
+def test_persistent_cache():
+    d = tempfile.mkdtemp()
+    for storage in ['dbm', 'sqlite']:
+        calls = []
+
+        @persistent_cache(filename=os.path.join(d, storage), storage=storage,
+                          compress='zlib', None_is_bad=True)
+        def f(x):
+            calls.append(x)
+            return None if x < 0 else np.arange(x)
+
+        assert (f(3) == np.arange(3)).all()
+        assert (f(3) == np.arange(3)).all()
+        assert f(-1) is None and f(-1) is None
+        assert calls == [3, -1, -1]
+
+
+def test_persistent_cache_shelve_compat():
+    # Caches written with `shelve` (the old format) are still read.
+    d = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(d)
+    try:
+        def f(x):
+            return 'computed'
+        with shelve.open('f.shelf~') as old:
+            old['a'] = 'old value'
+        g = persistent_cache(key=lambda args: args[0])(f)
+        assert g.filename == 'f.shelf~'
+        assert g('a') == 'old value' and g('b') == 'computed'
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,102 @@
+import os
+import tempfile
+
+from arsenal.cache.codehash import code_hash
+from arsenal.cache.memoize import memoize, memoize_persistent
+
+
+def load_module(src):
+    env = {'__name__': 'mypackage.mymodule', 'memoize': memoize}
+    exec(src, env)
+    return env
+
+
+def test_code_hash():
+
+    before = load_module("""
+def helper(x):
+    return x + 1
+
+@memoize
+def other(x):
+    return 2*x
+
+def f(x):
+    return [helper(y) for y in range(x)] + [other(x)]
+
+def unrelated(x):
+    return x
+""")
+
+    # editing a helper (even through a decorator) changes the hash
+    after = load_module("""
+def helper(x):
+    return x + 2
+
+@memoize
+def other(x):
+    return 2*x
+
+def f(x):
+    return [helper(y) for y in range(x)] + [other(x)]
+
+def unrelated(x):
+    return x - 1
+""")
+    assert code_hash(before['f']) != code_hash(after['f'])
+
+    after = load_module("""
+def helper(x):
+    return x + 1
+
+@memoize
+def other(x):
+    return 3*x
+
+def f(x):
+    return [helper(y) for y in range(x)] + [other(x)]
+
+def unrelated(x):
+    return x - 1
+""")
+    assert code_hash(before['f']) != code_hash(after['f'])
+
+    # editing a function that is not called does not.
+    after = load_module("""
+def helper(x):
+    return x + 1
+
+@memoize
+def other(x):
+    return 2*x
+
+def f(x):
+    return [helper(y) for y in range(x)] + [other(x)]
+
+def unrelated(x):
+    return x - 1
+""")
+    assert code_hash(before['f']) == code_hash(after['f'])
+    assert code_hash(before['f']) == code_hash(memoize(before['f']))
+
+    # recursion is fine
+    env = load_module("""
+def fib(n):
+    return n if n <= 1 else fib(n-1) + fib(n-2)
+""")
+    assert code_hash(env['fib'])
+
+
+def test_memoize_persistent_version():
+    d = tempfile.mkdtemp()
+    calls = []
+    for incremental in [False, True]:
+        filename = os.path.join(d, f'cache-{incremental}')
+        for src, expect in [('x + 1', [1, 2]), ('x + 1', []), ('x + 2', [1, 2])]:
+            env = load_module(f'def f(x):\n    calls.append(x)\n    return {src}')
+            env['calls'] = calls
+            g = memoize_persistent(env['f'], filename=filename, incremental=incremental)
+            calls.clear()
+            assert [g(1), g(2)] == [eval(src, {'x': 1}), eval(src, {'x': 2})]
+            assert calls == expect, [incremental, src, calls]
+            g.save()
@@ -51,3 +51,53 @@ def test_lazy():
 
     # should still call both lazy properties again.
     assert not foo2.log
+
+
+def test_tracked_lazy():
+    import gc
+    from arsenal.cache.lazy import tracked_lazy, Tracked, _values
+
+    log = defaultdict(int)
+
+    class Node(Tracked):
+        def __init__(self, value, children=()):
+            self.value = value
+            self.children = children
+            self.label = 'node'
+        @tracked_lazy
+        def total(self):
+            log[id(self)] += 1
+            return self.value + sum(c.total for c in self.children)
+
+    a = Node(1); b = Node(2); c = Node(3, [a, b])
+    assert c.total == 6
+    assert log[id(c)] == log[id(a)] == log[id(b)] == 1
+
+    c.label = 'root'            # not an input
+    assert c.total == 6 and log[id(c)] == 1
+
+    a.value = 10                # an input of `a.total`, and so `c.total`
+    assert c.total == 15
+    assert log[id(c)] == log[id(a)] == 2 and log[id(b)] == 1
+
+    Node.total.reset(b)         # resetting invalidates dependents too
+    assert c.total == 15
+    assert log[id(c)] == 3 and log[id(b)] == 2
+
+    class Point(Tracked):
+        __slots__ = ('x', 'y')
+        def __init__(self, x, y):
+            self.x = x; self.y = y
+        @tracked_lazy
+        def norm(self):
+            log['norm'] += 1
+            return (self.x**2 + self.y**2) ** 0.5
+
+    p = Point(3, 4)
+    assert p.norm == 5.0 and p.norm == 5.0 and log['norm'] == 1
+    p.x = 0
+    assert p.norm == 4.0 and log['norm'] == 2
+
+    n = len(_values)
+    del p; gc.collect()
+    assert len(_values) == n - 1
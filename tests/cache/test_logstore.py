@@ -0,0 +1,100 @@
+import os
+import pickle
+import tempfile
+
+from arsenal.cache.logstore import LogStore
+from arsenal.cache.memoize import memoize_persistent
+
+
+def test_logstore():
+    filename = os.path.join(tempfile.mkdtemp(), 'store')
+
+    s = LogStore(filename, min_compact_size=0)
+    for i in range(100):
+        s[i % 10] = [i] * 100
+    assert len(s) == 10
+    assert s[3] == [93] * 100
+    s.close()
+
+    # compaction (triggered in the background) reclaimed the stale records.
+    record = len(pickle.dumps([0] * 100, protocol=s.protocol))
+    assert os.path.getsize(filename) <= 20 * record < 100 * record
+
+    s = LogStore(filename)
+    assert sorted(s) == list(range(10))
+    assert all(s[i] == [90 + i] * 100 for i in range(10))
+    s.close()
+
+    # A partially written index entry (e.g., due to a crash) is dropped.
+    with open(filename + '.idx', 'ab') as f:
+        f.write(b'\x80\x05\x95garbage')
+    s = LogStore(filename)
+    assert len(s) == 10
+    s['new'] = 'value'
+    s.close()
+    s = LogStore(filename)
+    assert s['new'] == 'value' and len(s) == 11
+    s.close()
+
+
+def test_memoize_persistent_incremental():
+    filename = os.path.join(tempfile.mkdtemp(), 'f.log')
+    calls = []
+
+    def f(x):
+        calls.append(x)
+        return x**2
+
+    g = memoize_persistent(f, filename=filename, incremental=True)
+    assert g(2) == 4 and g(3) == 9 and g(2) == 4
+    assert calls == [2, 3]
+    assert os.path.getsize(filename) > 0    # written without waiting for exit
+    g.save()
+
+    g = memoize_persistent(f, filename=filename, incremental=True)
+    assert g.get_cached(3) == 9
+    assert g(2) == 4 and g(4) == 16
+    assert calls == [2, 3, 4]
+    g.save()
+
+
+def test_logstore_interrupted_compaction():
+    filename = os.path.join(tempfile.mkdtemp(), 'store')
+    s = LogStore(filename)
+    for i in range(20):
+        s[i % 5] = i
+    s.close()
+
+    # Simulate a crash after the compacted record file replaced the old one,
+    # but before the index was replaced.
+    old_index = open(filename + '.idx', 'rb').read()
+    real_replace = os.replace
+    calls = []
+    def crash(src, dst):
+        calls.append(dst)
+        if len(calls) == 2: raise KeyboardInterrupt
+        real_replace(src, dst)
+    s = LogStore(filename)
+    os.replace = crash
+    try:
+        s.compact()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.replace = real_replace
+    assert open(filename + '.idx', 'rb').read() == old_index
+
+    # The new index is recovered.
+    s = LogStore(filename)
+    assert {k: s[k] for k in s} == {k: 15 + k for k in range(5)}
+    s.close()
+
+    # Without it, the mismatched index is not used.
+    s = LogStore(filename)
+    s[0] = 'x'
+    s.close()
+    with open(filename + '.idx', 'wb') as f:
+        f.write(old_index)
+    s = LogStore(filename)
+    assert len(s) == 0
+    s.close()
@@ -1,3 +1,4 @@
+from arsenal.assertions import assert_throws
 from arsenal.cache.memoize import memoize
 
 
@@ -28,3 +29,173 @@ def test_memoize():
     assert foo.goo(a, 4) == 2*4
 
     assert g(4) == 4**2
+
+
+def test_memoize_bounded():
+    from arsenal.cache.memoize import LRUCache, LFUCache, TTLCache
+
+    calls = []
+
+    @memoize(maxsize=2)
+    def f(x):
+        calls.append(x)
+        return x**2
+
+    assert [f(x) for x in [1, 2, 1, 3, 2, 1]] == [1, 4, 1, 9, 4, 1]
+    assert calls == [1, 2, 3, 2, 1]     # 2 was evicted by 3, then 1 by 2
+    assert f.cache_info() == (1, 5, 2, 2)
+    assert f.evictions == 3
+    f.cache_clear()
+    assert f.cache_info() == (0, 0, 2, 0) and f.evictions == 0
+
+    # LFU keeps the frequently used key around.
+    c = LFUCache(2)
+    c['a'] = 1; c['b'] = 2
+    c['a']; c['a']; c['b']
+    c['c'] = 3
+    assert 'a' in c and 'b' not in c and 'c' in c and c.evictions == 1
+    c['d'] = 4                     # 'c' is the least frequently used
+    assert 'a' in c and 'c' not in c and 'd' in c and len(c) == 2
+
+    c = LRUCache(2)
+    c['a'] = 1; c['b'] = 2
+    c['a']
+    c['c'] = 3
+    assert 'a' in c and 'b' not in c and 'c' in c
+
+    # TTL with a fake clock
+    now = [0]
+    c = TTLCache(None, ttl=10, timer=lambda: now[0])
+    c['a'] = 1
+    now[0] = 5
+    c['b'] = 2
+    assert c['a'] == 1
+    now[0] = 10
+    assert 'a' not in c and c['b'] == 2 and c.evictions == 1
+    now[0] = 20
+    c['c'] = 3                     # expires 'b'
+    assert len(c) == 1 and c.evictions == 2
+
+    with assert_throws(ValueError):
+        memoize(f, policy='xxx')
+
+
+def test_memoize_method_isolation():
+
+    class foo:
+        def __init__(self, a):
+            self.a = a
+        @memoize
+        def shared(self, x):
+            return self.a * x
+        @memoize(maxsize=10, shared=False)
+        def isolated(self, x):
+            return self.a * x
+
+    a = foo(2)
+    b = foo(3)
+    assert a.shared(5) == 10 and b.shared(5) == 15
+    assert foo.__dict__['shared'].cache_info().currsize == 2
+
+    assert a.isolated(5) == 10 and b.isolated(5) == 15 and a.isolated(5) == 10
+    assert a.isolated.cache_info() == (1, 1, 10, 1)
+    assert b.isolated.cache_info() == (0, 1, 10, 1)
+
+
+def test_memoize_concurrent_threads():
+    import time
+    from threading import Thread
+    from arsenal.cache.memoize import memoize_concurrent
+
+    calls = []
+
+    @memoize_concurrent
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x**2
+
+    results = []
+    threads = [Thread(target=lambda: results.append(slow(3))) for _ in range(10)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert results == [9]*10
+    assert calls == [3]
+    assert slow.cache_info() == (9, 1, None, 1)
+
+    # errors are propagated to all waiters and are not cached.
+    @memoize_concurrent
+    def fail(x):
+        calls.append(x)
+        raise ValueError(x)
+
+    with assert_throws(ValueError):
+        fail(1)
+    with assert_throws(ValueError):
+        fail(1)
+    assert calls == [3, 1, 1]
+
+
+def test_memoize_concurrent_async():
+    import asyncio
+    from arsenal.cache.memoize import memoize_concurrent
+
+    calls = []
+
+    @memoize_concurrent
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x**2
+
+    async def main():
+        rs = await asyncio.gather(*[slow(x) for x in [1, 2, 1, 1, 2]])
+        assert rs == [1, 4, 1, 1, 4]
+        assert await slow(2) == 4
+
+    asyncio.run(main())
+    assert calls == [1, 2]
+    assert slow.cache_info() == (4, 2, None, 2)
+
+
+def test_memoize_keys():
+    import numpy as np
+    from arsenal.cache.keys import canonical_key, Canonicalizer
+
+    calls = []
+
+    @memoize
+    def f(x, y=0):
+        calls.append((x, y))
+        return x + y
+
+    assert f(1) == 1 and f(1, y=2) == 3 and f(1, y=2) == 3 and f(x=1, y=2) == 3
+    assert calls == [(1, 0), (1, 2), (1, 2)]
+    with assert_throws(TypeError):
+        f([1])
+
+    @memoize(key=canonical_key)
+    def g(xs, opts=None):
+        calls.append(xs)
+        return float(np.sum(xs))
+
+    calls.clear()
+    a = np.arange(10.)
+    assert g(a) == 45 and g(a.copy()) == 45 and g(list(range(10))) == 45
+    assert g(a, opts={'b': 1, 'a': [2]}) == g(a, opts={'a': [2], 'b': 1}) == 45
+    assert len(calls) == 3
+    assert g(a[::2]) == 20 and g(a[::2].copy()) == 20 and len(calls) == 4
+
+    # sampled digests are fast, but only look at part of the array
+    key = Canonicalizer(sample=10)
+    big = np.zeros(1000)
+    other = big.copy(); other[1] = 1
+    assert key(big) == key(other)
+    assert Canonicalizer()(big) != Canonicalizer()(other)
+
+    # custom key functions
+    @memoize(key=lambda x, scale: x)
+    def h(x, scale):
+        return x * scale
+
+    assert h(2, scale=3) == 6 and h(2, scale=4) == 6
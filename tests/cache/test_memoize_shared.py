@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+import subprocess
+import multiprocessing
+from time import sleep
+
+from arsenal.cache.memoize import memoize, memoize_shared
+
+
+computed = multiprocessing.Value('i', 0)
+
+
+def square(x):
+    with computed.get_lock():
+        computed.value += 1
+    sleep(0.001)
+    return x**2
+
+
+@memoize_shared(filename=os.path.join(tempfile.mkdtemp(), 'square'))
+def shared_square(x):
+    return square(x)
+
+
+@memoize
+def local_square(x):
+    return square(x)
+
+
+def call_local_square(x):
+    return local_square(x)
+
+
+def test_memoize_shared():
+    computed.value = 0
+    xs = list(range(20))
+    assert [shared_square(x) for x in xs + xs] == [x**2 for x in xs + xs]
+    assert computed.value == 20
+    assert shared_square.cache_info()[:2] == (20, 20)
+
+    # Forget the process-local results; the values are still in the shared cache
+    shared_square.cache_clear()
+    assert shared_square(3) == 9
+    assert shared_square.shared_hits == 1 and computed.value == 20
+
+    # ... which is visible to the workers of a pool.
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        assert pool.map(shared_square, xs + [20, 21]) == [x**2 for x in xs + [20, 21]]
+    assert computed.value == 22
+    assert len(shared_square.shelf) == 22
+
+
+@memoize_shared(filename=os.path.join(tempfile.mkdtemp(), 'set_len'))
+def shared_set_len(xs):
+    return len(xs)
+
+
+def test_memoize_shared_stable_keys():
+    # A key with a set in it is encoded the same way under any hash seed.
+    code = ('import pickle; from arsenal.cache.keys import stable_key;'
+            'print(pickle.dumps(stable_key((frozenset("abcdefgh"), {1, "x"})), protocol=4).hex())')
+    out = {subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                          env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout
+           for seed in range(5)}
+    assert len(out) == 1
+
+    shared_set_len.cache_clear()
+    assert shared_set_len(frozenset('abc')) == 3
+    shared_set_len.cache_clear()
+    assert shared_set_len(frozenset('cba')) == 3 and shared_set_len.shared_hits == 1
+
+
+@memoize_shared(filename=os.path.join(tempfile.mkdtemp(), 'slow'))
+def shared_slow_square(x):
+    sleep(0.05)
+    return square(x)
+
+
+def test_memoize_shared_claims():
+    # Workers calling with the same argument at the same time compute it once.
+    computed.value = 0
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        assert pool.map(shared_slow_square, [7] * 8, chunksize=1) == [49] * 8
+    assert computed.value == 1
+
+    # A claim left by a process that died is taken over.
+    shelf = shared_slow_square.shelf
+    k = shelf.encode_key((8,))
+    p = multiprocessing.get_context('fork').Process(target=lambda: None)
+    p.start(); p.join()
+    shelf.storage.db.execute('INSERT INTO claims (key, pid) VALUES (?, ?)', (k, p.pid))
+    shelf.storage.db.commit()
+    assert shared_slow_square(8) == 64 and computed.value == 2
+    assert shelf.storage.db.execute('SELECT COUNT(*) FROM claims').fetchone()[0] == 0
+
+
+class Squarer:
+    def __init__(self, offset):
+        self.offset = offset
+    def __hash__(self):
+        return hash(self.offset)
+    def __eq__(self, other):
+        return self.offset == other.offset
+    def __reduce__(self):
+        return (Squarer, (self.offset,))
+    @memoize_shared(shared=False, filename=os.path.join(tempfile.mkdtemp(), 'method'))
+    def f(self, x):
+        return square(x) + self.offset
+
+
+def test_memoize_shared_method():
+    computed.value = 0
+    a, b = Squarer(0), Squarer(1)
+    assert (a.f(2), b.f(2), a.f(2)) == (4, 5, 4)
+    assert a.f is a.f and a.f.__name__ == 'f' and computed.value == 2
+    # per-instance caches share the file, keyed on the instance
+    assert len(a.f.shelf) == 2 and Squarer(1).f(2) == 5 and computed.value == 2
+
+
+def bench_pool(nworkers=4, nkeys=200, reps=5):
+    "Compare how often a pool of workers recomputes values."
+    from arsenal.timer import Benchmark
+    calls = list(range(nkeys)) * reps
+    T = Benchmark(f'pool of {nworkers} workers, {nkeys} keys x {reps} calls')
+    for name, f in [('memoize', call_local_square), ('memoize_shared', shared_square)]:
+        computed.value = 0
+        with multiprocessing.get_context('fork').Pool(nworkers) as pool:
+            with T[name]:
+                pool.map(f, calls, chunksize=10)
+        print(f'{name}: computed {computed.value} of {len(calls)} calls'
+              f' (hit rate {1 - computed.value / len(calls):.1%})')
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_pool()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+import numpy as np
+
+from arsenal.cache.pkl import load, save
+
+
+def test_pkl():
+    d = tempfile.mkdtemp()
+    x = {'a': [1, 2], 'b': ('c', np.arange(5))}
+
+    filename = os.path.join(d, 'plain.pkl')
+    save(filename, x)
+    y = load(filename)
+    assert y['a'] == [1, 2]
+    assert not isinstance(y['b'][1], np.memmap)
+    assert (y['b'][1] == np.arange(5)).all()
+
+
+def test_pkl_mmap():
+    d = tempfile.mkdtemp()
+    filename = os.path.join(d, 'mmap.pkl')
+
+    big = np.random.uniform(size=(100, 10))
+    x = {'a': [1, 2], 'b': ('c', big, {'d': big[::2].T}), 'e': np.array([None, 1])}
+    save(filename, x, mmap=True)
+    assert sorted(os.listdir(filename + '.arrays')) == ['0.npy', '1.npy']
+
+    y = load(filename)
+    assert y['a'] == [1, 2] and y['b'][0] == 'c'
+    assert isinstance(y['b'][1], np.memmap) and not y['b'][1].flags.writeable
+    assert (y['b'][1] == big).all()
+    assert (y['b'][2]['d'] == big[::2].T).all()
+    assert list(y['e']) == [None, 1]     # object arrays are pickled as usual
+
+    # re-saving replaces the old segments
+    save(filename, {'z': np.zeros(3)}, mmap=True)
+    assert os.listdir(filename + '.arrays') == ['0.npy']
+    assert (load(filename)['z'] == 0).all()
+
+    # on a miss, `default` is called and the result saved
+    other = os.path.join(d, 'other.pkl')
+    z = load(other, default=lambda: np.ones(4), saveit=True, mmap=True)
+    assert (z == 1).all()
+    assert isinstance(load(other), np.memmap)
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+from time import sleep
+
+import numpy as np
+
+from arsenal.cache.lazy import lazy
+from arsenal.cache.memoize import memoize, persistent_cache
+from arsenal.cache.stats import all_stats, report, benchmark
+
+
+def test_memoize_stats():
+
+    @memoize(maxsize=2, track_keys=True)
+    def f(x):
+        sleep(0.01 * x)
+        return np.zeros(x)
+
+    for x in [1, 5, 5, 5, 1, 2]:
+        f(x)
+
+    s = f.stats
+    assert (s.hits, s.misses) == (3, 3) == f.cache_info()[:2]
+    # (5,) was evicted, so it is forgotten
+    assert [k for k, _ in s.hottest(2)] == [(1,), (2,)]
+    assert [k for k, _ in s.most_expensive(1)] == [(2,)]
+    assert s.compute_time >= 0.08 and s.saved >= 0.11
+    assert s.nbytes == np.zeros(1).nbytes + np.zeros(2).nbytes
+
+    assert s in all_stats()
+    report([s])
+    B = benchmark([s])
+    assert list(B) == ['f'] and len(B['f'].times) == 3
+
+    f.cache_clear()
+    assert (s.hits, s.misses, s.nbytes) == (0, 0, 0)
+
+
+def test_bounded_stats():
+    # The statistics of a bounded cache stay bounded too.
+    @memoize(maxsize=10)
+    def f(x):
+        return x
+
+    f.stats.max_times = 100; f.stats.clear()
+    for x in range(10000): f(x)
+    s = f.stats
+    assert s.misses == 10000 and len(s.times) == 100
+    assert not s.keys and len(s.sizes) == 10 == len(f.cache)
+    assert s.nbytes == sum(map(sys.getsizeof, range(9990, 10000)))
+
+    @memoize(maxsize=10, track_keys=True)
+    def g(x):
+        return x
+
+    for x in range(1000): g(x)
+    assert set(g.stats.keys) == set(g.cache.data) and not g.stats.sizes
+
+
+def test_lazy_and_shelf_stats():
+
+    class Foo:
+        @lazy
+        def x(self):
+            return [1, 2, 3]
+
+    a, b = Foo(), Foo()
+    a.x; a.x; b.x
+    assert (Foo.x.stats.hits, Foo.x.stats.misses) == (1, 2)
+
+    @persistent_cache(filename=os.path.join(tempfile.mkdtemp(), 'g'))
+    def g(x):
+        return x + 1
+
+    g(1); g(1); g(2)
+    assert (g.stats.hits, g.stats.misses) == (1, 2)
@@ -0,0 +1,113 @@
+import random
+
+from arsenal.assertions import assert_throws
+from arsenal.datastructures.bucketqueue import BucketQueue, RadixHeap, CalendarQueue
+
+
+def random_graph(n, m, max_weight):
+    E = {i: [] for i in range(n)}
+    for _ in range(m):
+        E[random.randrange(n)].append((random.randrange(n), random.randint(0, max_weight)))
+    return E
+
+
+def dijkstra(E, s, Q):
+    d = {s: 0}
+    Q[s] = 0
+    done = set()
+    while Q:
+        u, du = Q.popitem()
+        assert du == d[u]
+        done.add(u)
+        for v, w in E[u]:
+            if v not in done and (v not in d or du + w < d[v]):
+                d[v] = du + w
+                Q[v] = du + w
+    return d
+
+
+def test_dijkstra():
+    for max_weight in [3, 10**9]:
+        for _ in range(10):
+            E = random_graph(200, 1000, max_weight)
+            want = dijkstra(E, 0, CalendarQueue()) if max_weight > 10 else dijkstra(E, 0, BucketQueue())
+            assert dijkstra(E, 0, RadixHeap()) == want
+            assert dijkstra(E, 0, CalendarQueue()) == want
+
+
+def test_random_workload():
+    for Q in [RadixHeap(), CalendarQueue()]:
+        D = {}
+        last = 0.0
+        for _ in range(5000):
+            if random.random() < .6 or not D:
+                x = random.randrange(100)
+                p = last + random.expovariate(1)
+                Q[x] = p
+                D[x] = p
+            elif random.random() < .2:
+                x = random.choice(list(D))
+                del Q[x]
+                del D[x]
+            else:
+                x, p = Q.popitem()
+                assert p == min(D.values()) == D.pop(x)
+                last = p
+            assert len(Q) == len(D)
+            assert all(Q[x] == D[x] for x in D)
+        assert [p for _, p in Q.items()] == sorted(D.values())
+
+
+def test_radix_heap_monotone():
+    Q = RadixHeap()
+    Q['a'] = 5
+    Q['b'] = 7
+    assert Q.popitem() == ('a', 5)
+    Q['c'] = 5
+    with assert_throws(ValueError):
+        Q['d'] = 4
+    with assert_throws(TypeError):
+        Q['d'] = 6.0
+    assert list(Q) == ['c', 'b']
+
+    Q = RadixHeap()
+    Q['a'] = -1.5
+    Q['b'] = -2.5
+    Q['c'] = 3
+    assert list(Q.items()) == [('b', -2.5), ('a', -1.5), ('c', 3)]
+
+    # negative integer priorities
+    Q = RadixHeap()
+    Q['x'] = -4; Q['y'] = 0; Q['z'] = 1
+    assert list(Q) == ['x', 'y', 'z']
+    with assert_throws(ValueError):
+        Q['w'] = -2**63 - 1
+    for _ in range(200):
+        Q = RadixHeap()
+        D = {}
+        last = -10**6
+        for _ in range(50):
+            if random.random() < .6 or not D:
+                x = random.randrange(20)
+                Q[x] = D[x] = random.randint(last, 100)
+            else:
+                x, p = Q.popitem()
+                assert p == min(D.values()) == D.pop(x)
+                last = p
+
+
+def bench_sparse(n=20_000, m=100_000, max_weight=10**6):
+    "Dijkstra with sparse, large integer priorities."
+    from arsenal.timer import Benchmark
+    from arsenal.datastructures.pdict import pdict
+    E = random_graph(n, m, max_weight)
+    T = Benchmark(f'dijkstra max_weight={max_weight}')
+    for _ in range(3):
+        for Q in [BucketQueue, RadixHeap, CalendarQueue, pdict]:
+            with T[Q.__name__]: dijkstra(E, 0, Q())
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_sparse(max_weight=10**3)
+    bench_sparse(max_weight=10**7)
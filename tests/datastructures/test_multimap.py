@@ -26,3 +26,157 @@ def test_multimap_basics():
     assert m[1,] == m[1] == m
 
     assert list(m) == [(1,)]
+
+
+def test_multimap_views_and_deletion():
+    m = MultiMap()
+    for i in range(5):
+        for j in range(5):
+            m[i, j, i + j] = i * j
+    m['x'] = 0
+
+    v = m[1, :, :]
+    assert len(v) == 5
+    assert list(v.rowids) == sorted(v.rowids)
+
+    # views are live: the index is maintained as entries are added and deleted
+    m[1, 10, 11] = 10
+    assert len(v) == 6 and (1, 10, 11) in v and (2, 0, 2) not in v
+    del m[1, 0, 1]
+    assert len(v) == 5 and (1, 0, 1) not in v and (1, 0, 1) not in m
+    with assert_throws(KeyError):
+        del m[1, 0, 1]
+
+    # queries on views
+    assert v[:, 2, :] == m[1, 2, :] == MultiMap({(1, 2, 3): 2})
+    assert len(v[2, :, :]) == 0 and len(v[1]) == 0
+
+    # deleting a pattern
+    del m[:, :, 4]
+    assert m[:, :, 4] == MultiMap()
+    assert (2, 2, 4) not in m and len(m) == 25 + 2 - 1 - 5
+    assert m[3, :, :].copy() == MultiMap({(3, j, 3 + j): 3 * j for j in range(5) if 3 + j != 4})
+
+    # unknown values
+    assert len(m['never seen', :]) == 0
+
+    m['x'] = 1
+    assert m['x'].vals == {('x',): 1}
+
+
+def test_multimap_symbols_and_compaction():
+    # Each map has its own symbol table: keys of one map don't leak into another.
+    a, b = MultiMap(), MultiMap()
+    a[True, 'x'] = 1
+    b[1, 'y'] = 2
+    assert list(b) == [(1, 'y')] and type(list(b)[0][0]) is int
+    assert a.symbols is not b.symbols
+
+    # ... unless a table is shared explicitly.
+    from arsenal.integerizer import Integerizer
+    S = Integerizer()
+    c, d = MultiMap(symbols=S), MultiMap(symbols=S)
+    assert c.symbols is d.symbols is S and c.copy().symbols is S
+
+    # Deleted rows (and symbols) are reclaimed under churn.
+    m = MultiMap()
+    v = m['k', :]
+    for i in range(10_000):
+        m['k', i] = i
+        if i % 2: m['j', i] = i
+        del m['k', i]
+    assert len(m) == 5000 and len(v) == 0
+    assert len(m.values) <= 2 * max(len(m), m.compact_min)
+    assert len(m.symbols) <= 2 * len(m) + m.compact_min + 2
+    m['k', 3] = 'three'
+    assert v.vals == {('k', 3): 'three'} and m['j', 3].copy() == MultiMap({('j', 3): 3})
+
+    # Deleting a pattern through a view (which compacts) leaves a consistent map.
+    del m['j', :]
+    assert list(m.items()) == [(('k', 3), 'three')] and m.dead == 0
+
+    # vals is a read-only live view
+    vals = m.vals
+    with assert_throws(TypeError):
+        vals['k', 4] = 4
+    assert vals['k', 3] == 'three' and ('k', 4) not in vals and 'k' not in vals
+    m['k', 4] = 4
+    assert vals['k', 4] == 4 and len(vals) == 2 and v.vals == {('k', 3): 'three', ('k', 4): 4}
+    del m['k', 4]
+    assert m != MultiMap({('k', 3): 'four'}) and m != MultiMap({('k', 4): 'three'})
+    assert str(v) == str(m) and v == m and v.copy() == m
+
+
+def brute_triangles(E):
+    return {(x, y, z) for (x, y) in E for (y2, z) in E if y == y2 and (x, z) in E}
+
+
+def test_join():
+    import random
+    from arsenal.datastructures.multimap import Var, join
+
+    X, Y, Z = Var('X'), Var('Y'), Var('Z')
+    for _ in range(10):
+        E = MultiMap({(random.randint(0, 20), random.randint(0, 20)): 1 for _ in range(100)})
+        want = brute_triangles(E)
+        have = [(s[X], s[Y], s[Z]) for s in join([(E, (X, Y)), (E, (Y, Z)), (E, (X, Z))])]
+        assert len(have) == len(set(have)) and set(have) == want
+        # a different variable order gives the same answer
+        have = {(s[X], s[Y], s[Z]) for s in join([(E, (X, Y)), (E, (Y, Z)), (E, (X, Z))],
+                                                 order=[Z, X, Y])}
+        assert have == want
+
+    # the order must list each variable exactly once
+    for order in [[X, Y], [X, Y, Z, Var('W')], [X, Y, Z, X]]:
+        with assert_throws(ValueError):
+            list(join([(E, (X, Y)), (E, (Y, Z)), (E, (X, Z))], order=order))
+
+    # constants, repeated variables, and views
+    m = MultiMap({('f', 1, 1): 0, ('f', 1, 2): 0, ('g', 2, 2): 0, ('f', 3, 3): 0})
+    n = MultiMap({(1,): 0, (2,): 0})
+    assert sorted(s[X] for s in join([(m, ('f', X, X)), (n, (X,))])) == [1]
+    assert sorted(s[X] for s in join([(m['f', :, :], ('f', X, X))])) == [1, 3]
+    assert list(join([(m, ('f', 1, 2)), (n, (X,))])) == [{X: 1}, {X: 2}]
+    assert list(join([(m, ('h', 1, 2)), (n, (X,))])) == []
+
+    # multimaps with different symbol tables
+    from arsenal.integerizer import Integerizer
+    k = MultiMap({('b',): 0, ('a',): 0, ('c',): 0}, symbols=Integerizer())
+    l = MultiMap({('c',): 0, ('b',): 0, ('d',): 0}, symbols=Integerizer())
+    assert sorted(s[X] for s in join([(k, (X,)), (l, (X,))])) == ['b', 'c']
+
+    # lazy enumeration (in order of the symbols' codes)
+    big = MultiMap({(i,): 0 for i in range(1000)})
+    assert next(join([(big, (X,)), (big, (X,))]))[X] in range(1000)
+
+
+def bench_triangle():
+    import random
+    from arsenal.timer import Benchmark
+    from arsenal.datastructures.multimap import Var, join
+
+    X, Y, Z = Var('X'), Var('Y'), Var('Z')
+    # A graph with a few high-degree vertices, which is hard for pairwise joins.
+    N = 2000
+    E = MultiMap()
+    for i in range(N):
+        E[0, i] = E[i, 0] = 1
+        E[random.randint(0, N), random.randint(0, N)] = 1
+
+    def naive():
+        out = []
+        for (x, y) in E:
+            for (_, z) in E[y, :]:
+                if (x, z) in E: out.append((x, y, z))
+        return out
+
+    T = Benchmark(f'triangles n={N}')
+    for _ in range(3):
+        with T['naive']: a = naive()
+        with T['join']: b = [(s[X], s[Y], s[Z]) for s in join([(E, (X, Y)), (E, (Y, Z)), (E, (X, Z))])]
+        assert sorted(a) == sorted(b)
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_triangle()
@@ -0,0 +1,82 @@
+import random
+
+from arsenal.datastructures import OrderedSet
+
+
+def test_orderedset():
+    s = OrderedSet()
+    want = []   # reference: a list without duplicates
+    for _ in range(2000):
+        x = random.randint(0, 100)
+        if random.random() < 0.5:
+            s.add(x)
+            if x not in want: want.append(x)
+        elif x in want:
+            s.remove(x)
+            want.remove(x)
+        else:
+            s.discard(x)
+        assert len(s) == len(want)
+    assert list(s) == want == s.list
+    i = random.randint(0, len(want) - 1)
+    assert s[i] == want[i] and s[-1] == want[-1] and s[1:5] == want[1:5]
+    assert s._dead == 0   # positional access compacted the array
+
+    other = OrderedSet(random.sample(range(100), 50))
+    assert (s - other).list == [x for x in want if x not in other]
+    assert (s & other).list == [x for x in want if x in other]
+    assert (s | other).list == want + [x for x in other if x not in want]
+    assert (s - other) == set(want) - set(other)
+    assert (s & other) <= s and (s - other).isdisjoint(other)
+
+    t = s.copy()
+    t |= [1000, 1001, 1000]
+    t -= other
+    assert t.list == [x for x in want if x not in other] + [1000, 1001]
+
+    # iteration while adding and removing (like an agenda)
+    s = OrderedSet(range(100))
+    seen = []
+    for x in s:
+        seen.append(x)
+        if x < 100: s.add(x + 100)
+        s.discard(x + 1)
+    assert seen == list(range(0, 100, 2)) + list(range(100, 200, 2))
+    assert s._iters == 0
+    assert s[0] == 0 and s[1] == 2
+
+
+def bench_orderedset():
+    from arsenal.timer import Benchmark
+
+    class ListOrderedSet:
+        "The previous implementation: a set and a list."
+        def __init__(self, elems):
+            self.set = set(elems); self.list = list(elems)
+        def remove(self, x):
+            self.set.remove(x)
+            self.list = [y for y in self.list if x != y]
+
+    N = 10_000
+    T = Benchmark(f'OrderedSet: remove all n={N}')
+    for _ in range(3):
+        xs = random.sample(range(N), N)
+        with T['list']:
+            s = ListOrderedSet(range(N))
+            for x in xs: s.remove(x)
+        with T['tombstones']:
+            s = OrderedSet(range(N))
+            for x in xs: s.remove(x)
+    T.compare()
+
+    a = OrderedSet(random.sample(range(10**6), 10**6 // 2))
+    b = OrderedSet(random.sample(range(10**6), 10**6 // 2))
+    T = Benchmark('OrderedSet: set algebra n=500000')
+    for _ in range(3):
+        with T['set']: a.set - b.set; a.set | b.set
+        with T['OrderedSet']: a - b; a | b
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_orderedset()
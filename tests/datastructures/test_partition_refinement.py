@@ -2,7 +2,9 @@ import random
 
 import numpy as np
 
-from arsenal.datastructures.partition_refinement import slow, hopcroft, stable
+from arsenal.datastructures.partition_refinement import (
+    slow, hopcroft, stable, PartitionRefinement, minimize_dfa
+)
 
 
 def test_partition():
@@ -21,3 +23,135 @@ def test_partition():
         have = hopcroft(f, P)
         assert want == have
         assert stable(f, have)
+
+
+def test_partition_adversarial():
+    # A path: every element ends up in its own block.
+    N = 200
+    f = {i: min(i + 1, N - 1) for i in range(N)}
+    P = {frozenset([N - 1]), frozenset(range(N - 1))}
+    have = hopcroft(f, P)
+    assert have == slow(f, P)
+    assert len(have) == N
+
+
+def test_partition_refinement():
+    N = 100
+    blocks = [list(range(0, 30)), list(range(30, N))]
+    R = PartitionRefinement(N, blocks)
+    want = [set(B) for B in blocks]
+    for _ in range(50):
+        S = set(random.sample(range(N), random.randint(0, N)))
+        splits = R.refine(S)
+        want = [C for B in want for C in [B & S, B - S] if C]
+        assert len(R) == len(want)
+        assert sorted(map(sorted, R.blocks())) == sorted(map(sorted, want))
+        for b, new in splits:
+            assert set(R.members(new)) <= S and not set(R.members(b)) & S
+        for x in range(N):
+            assert R.elems[R.loc[x]] == x
+            assert x in R.members(R.block[x])
+
+
+def bench_hopcroft():
+    from arsenal.timer import Benchmark, timers
+
+    def random_function(N):
+        f = dict(zip(range(N), random.choices(range(N), k=N)))
+        P = np.random.permutation(range(N))
+        return f, {frozenset(P[:N//2]), frozenset(P[N//2:])}
+
+    def path(N):
+        f = {i: min(i + 1, N - 1) for i in range(N)}
+        return f, {frozenset([N - 1]), frozenset(range(N - 1))}
+
+    for name, make in [('random', random_function), ('path', path)]:
+        f, P = make(1000)
+        T = Benchmark(f'{name} n=1000')
+        for _ in range(3):
+            with T['slow']: slow(f, P)
+            with T['hopcroft']: hopcroft(f, P)
+        T.compare()
+
+        # should grow like n log n
+        T = timers()
+        for N in [2**k for k in range(10, 19)]:
+            f, P = make(N)
+            with T['hopcroft'](N=N): hopcroft(f, P)
+        df = T['hopcroft'].dataframe()
+        df['time/(n log n)'] = df.timer / (df.N * np.log2(df.N))
+        print(name)
+        print(df[['N', 'timer', 'time/(n log n)']].to_string(index=False))
+
+
+
+
+def moore(table, finals):
+    "Minimize a (total) DFA by refining states by their successors' blocks until nothing changes."
+    n = len(table)
+    labels = [int(q in finals) for q in range(n)]
+    while True:
+        sig = [(labels[q], *(labels[r] for r in table[q])) for q in range(n)]
+        ids = {}
+        new = [ids.setdefault(s, len(ids)) for s in sig]
+        if len(ids) == len(set(labels)):
+            return new
+        labels = new
+
+
+def test_minimize_dfa():
+    for _ in range(50):
+        n = random.randint(1, 40)
+        k = random.randint(1, 3)
+        table = np.random.randint(-1, n, size=(n, k))
+        finals = set(random.sample(range(n), random.randint(0, n)))
+
+        labels, T, final = minimize_dfa(table, range(k), finals)
+
+        # compare to Moore's algorithm on the automaton completed with a dead state
+        total = np.vstack([table, np.full((1, k), n)])
+        total[total < 0] = n
+        want = moore(total.tolist(), finals)
+        dead = {labels[q] for q in range(n) if want[q] == want[n]} or {-1}
+        assert all((labels[p] == labels[q]) == (want[p] == want[q])
+                   for p in range(n) for q in range(n))
+
+        # minimized automaton agrees with the original
+        assert (labels <= np.maximum.accumulate(np.append(-1, labels[:-1])) + 1).all()
+        for q in range(n):
+            assert final[labels[q]] == (q in finals)
+            for a in range(k):
+                r = table[q, a]
+                if r >= 0:
+                    assert T[labels[q], a] == labels[r]
+                else:
+                    assert T[labels[q], a] in dead
+
+
+def test_minimize_dfa_empty_alphabet():
+    labels, T, final = minimize_dfa(np.empty((4, 0), dtype=int), '', [0, 2])
+    assert labels.tolist() == [0, 1, 0, 1] and T.shape == (2, 0)
+    assert final.tolist() == [True, False]
+    labels, T, final = minimize_dfa(np.empty((3, 0), dtype=int), '', [])
+    assert labels.tolist() == [0, 0, 0] and final.tolist() == [False]
+
+
+def bench_minimize_dfa():
+    from arsenal.timer import timers
+    T = timers()
+    for N in [10**4, 10**5, 10**6]:
+        # random automaton over two symbols
+        table = np.random.randint(0, N, size=(N, 2))
+        finals = np.flatnonzero(np.random.uniform(size=N) < .5)
+        with T['random'](N=N): minimize_dfa(table, 'ab', finals)
+        # adversarial: a path, every state distinct
+        table = np.minimum(np.arange(N) + 1, N - 1)[:, None]
+        with T['path'](N=N): minimize_dfa(table, 'a', [N - 1])
+    for name in ['random', 'path']:
+        print(name)
+        print(T[name].dataframe()[['N', 'timer']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    bench_hopcroft()
+    bench_minimize_dfa()
@@ -0,0 +1,37 @@
+import random
+
+from arsenal.datastructures.pdict import pdict
+
+
+def test_pdict():
+    p = pdict({'a': 3, 'b': 1})
+    p['c'] = 2
+    p['a'] = 0
+    assert p.peekitem() == ('a', 0)
+    assert list(p.sorted_iter()) == ['a', 'b', 'c']
+    assert not p
+
+
+def test_compaction():
+    p = pdict()
+    D = {}
+    for _ in range(20_000):
+        k = random.randrange(100)
+        if random.random() < .9:
+            v = random.random()
+            p[k] = v
+            D[k] = v
+        elif k in D:
+            del p[k]
+            del D[k]
+        assert len(p._heap) <= max(2 * len(p), p.compact_min + 1)
+        assert 0 <= p.stale_ratio <= p.compact_ratio or len(p._heap) <= p.compact_min
+        assert p.stale <= max(len(p), p.compact_min)
+    assert p.compactions > 0
+    assert dict(p) == D
+    # re-setting a key to its current priority does not add a heap entry
+    n = len(p._heap)
+    for k, v in D.items(): p[k] = v
+    assert len(p._heap) == n
+    assert list(p.sorted_iter()) == [k for k, _ in sorted(D.items(), key=lambda x: (x[1], x[0]))]
+    assert p.stale == 0 and not p._heap
@@ -0,0 +1,66 @@
+import numpy as np
+
+from arsenal.assertions import assert_throws
+from arsenal.datastructures.heap import SumHeap
+
+
+def test_sample_many():
+    w = np.random.uniform(0, 1, size=50)
+    w[3] = 0
+
+    # reproducible given the seed
+    a = SumHeap(w, seed=123).sample_many(1000)
+    b = SumHeap(w, seed=np.random.default_rng(123)).sample_many(1000)
+    assert (a == b).all()
+
+    z = SumHeap(w, seed=0).sample_many(200_000)
+    assert (z != 3).all()
+    f = np.bincount(z, minlength=len(w)) / len(z)
+    assert np.abs(f - w / w.sum()).max() < 0.005
+
+
+def test_sample_empty():
+    for w in [np.zeros(0), np.zeros(5)]:
+        h = SumHeap(w)
+        with assert_throws(ValueError):
+            h.sample()
+        with assert_throws(ValueError):
+            h.sample(0.5)
+        with assert_throws(ValueError):
+            h.sample_many(3)
+        assert len(h.sample_many(0)) == 0
+    h = SumHeap(np.zeros(5))
+    h[2] = 1.0
+    assert h.sample() == 2
+
+
+def test_swor():
+    w = np.random.uniform(0, 1, size=37)
+    w[::5] = 0
+    h = SumHeap(w, seed=0)
+    before = np.array(h.S)
+
+    z = h.swor(20)
+    assert len(set(z.tolist())) == 20
+    assert all(w[k] > 0 for k in z)
+    assert np.allclose(h.S, before)   # weights restored
+
+    # all of the nonzero weights
+    k = np.count_nonzero(w)
+    assert set(h.swor(k).tolist()) == set(np.flatnonzero(w).tolist())
+
+
+def test_update_many():
+    w = np.random.uniform(0, 1, size=100)
+    h1 = SumHeap(w)
+    h2 = SumHeap(w)
+
+    idx = np.random.randint(0, 100, size=30)
+    vals = np.random.uniform(0, 1, size=30)
+    for i, v in zip(idx, vals):
+        h1.update(i, v)
+    h2.update_many(idx, vals)
+
+    assert np.allclose(np.array(h1.S)[1:], np.array(h2.S)[1:])
+    for k in range(100):
+        assert h1[k] == h2[k]
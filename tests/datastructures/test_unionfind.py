@@ -0,0 +1,66 @@
+import numpy as np
+
+from arsenal.datastructures import UnionFind, IntUnionFind
+
+
+def test_int_unionfind():
+    for _ in range(20):
+        n = 100
+        a = np.random.randint(0, n, size=60)
+        b = np.random.randint(0, n, size=60)
+
+        U = UnionFind(range(n))
+        for x, y in zip(a.tolist(), b.tolist()):
+            U.union(x, y)
+
+        V = IntUnionFind(n)
+        merges = V.union_many(a[:30], b[:30])
+        for x, y in zip(a[30:45].tolist(), b[30:45].tolist()):
+            V.union(x, y)
+        V.union_many(a[45:], b[45:])
+        assert merges <= 30
+
+        want = {frozenset(c) for c in U.classes()}
+        assert {frozenset(c.tolist()) for c in V.classes()} == want
+        assert V.nclasses == len(want)
+        for x in range(n):
+            assert set(V.class_of(x).tolist()) == set(U.class_of(x))
+
+        labels = V.labels()
+        roots = V.find_many(np.arange(n))
+        assert (V.find_many(a) == V.find_many(b)).all()
+        for x in range(n):
+            for y in range(n):
+                assert (labels[x] == labels[y]) == (roots[x] == roots[y]) == U.connected(x, y)
+
+
+def test_find_many_layout():
+    V = IntUnionFind(6)
+    V.union_many([0, 2], [1, 3])
+    x = np.asfortranarray([[0, 1, 2], [3, 4, 5]])
+    want = [[V[int(y)] for y in row] for row in x.tolist()]
+    assert V.find_many(x).tolist() == want
+    assert V.find_many(x.T).tolist() == np.array(want).T.tolist()
+    assert V.find_many(np.arange(6)[::2]).tolist() == [V[0], V[2], V[4]]
+
+
+def bench_unionfind(n=100_000, m=500_000):
+    from arsenal.timer import Benchmark
+    a = np.random.randint(0, n, size=m)
+    b = np.random.randint(0, n, size=m)
+    al, bl = a.tolist(), b.tolist()
+    T = Benchmark(f'union-find n={n} m={m}')
+    for _ in range(3):
+        with T['UnionFind']:
+            U = UnionFind(range(n))
+            for x, y in zip(al, bl): U.union(x, y)
+            U.classes()
+        with T['IntUnionFind']:
+            V = IntUnionFind(n)
+            V.union_many(a, b)
+            V.classes()
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_unionfind()
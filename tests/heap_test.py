@@ -1,6 +1,9 @@
 import numpy as np
 from random import random, choice
-from arsenal.datastructures.heap import MaxHeap, LocatorMaxHeap, MinMaxHeap, BoundedMaxHeap
+from arsenal.datastructures.heap import (
+    MaxHeap, LocatorMaxHeap, IntLocatorMaxHeap, DaryLocatorMaxHeap,
+    PairingLocatorMaxHeap, MinMaxHeap, BoundedMaxHeap
+)
 
 
 class SlowPriorityQueue:
@@ -137,6 +140,11 @@ def test_minmax():
 
             #print('upsert', k, v)
 
+        elif np.random.uniform(0, 1) < .1 and S.items:
+            k = choice(list(S.items))
+            del L[k]
+            del S.items[k]
+
         else:
 
             A = S.items
@@ -207,6 +215,186 @@ def test_bounded():
     print('[bounded random workload] pass.')
 
 
+def test_batched():
+    for n, m in [(0, 50), (10, 50), (50, 10), (50, 0)]:
+        xs = np.random.uniform(-1, 1, size=n)
+        ys = np.random.uniform(-1, 1, size=m)
+
+        H = MaxHeap(values=xs)
+        H.check()
+        H.push_many(ys)
+        H.check()
+        assert len(H) == n + m
+        want = np.sort(np.concatenate([xs, ys]))[::-1]
+        top = H.pop_k(5)
+        assert np.all(top == want[:5])
+        H.check()
+        assert np.all(H.pop_k(n + m) == want[5:])
+        assert len(H) == 0
+
+    for n, m in [(0, 50), (10, 50), (50, 10), (50, 0)]:
+        keys = list(range(n))
+        xs = np.random.uniform(-1, 1, size=n)
+        L = LocatorMaxHeap(keys=keys, values=xs, cap=1)
+        L.check()
+        S = dict(zip(keys, xs))
+
+        ks = np.random.randint(0, n + m + 1, size=m)
+        ys = np.random.uniform(-1, 1, size=m)
+        L.update_many(ks, ys)
+        L.check()
+        S.update(zip(ks.tolist(), ys))
+
+        assert {k: L[k] for k in L.loc} == S
+        want = sorted(S.items(), key=lambda kv: -kv[1])
+        keys, vals = L.pop_k(3)
+        assert keys == [k for k, _ in want[:3]]
+        assert np.all(vals == [v for _, v in want[:3]])
+        L.check()
+
+
+def test_int_locator():
+    L = IntLocatorMaxHeap(1)
+    S = SlowLocatorHeap()
+
+    K = 1
+    for _ in range(1000):
+
+        if np.random.uniform(0, 1) < .5:
+
+            if np.random.uniform(0, 1) < .1:  # new key:
+                K += 1
+                k = K
+            else:
+                k = int(np.random.randint(K))
+
+            v = np.random.uniform(-1, 1)
+            L[k] = v
+            S[k] = v
+
+        elif np.random.uniform(0, 1) < .1 and S.items:
+            k = choice(list(S.items))
+            del L[k]
+            del S.items[k]
+
+        else:
+            assert S.items == {k: L[k] for k in range(K+1) if k in L}
+            if L or S:
+                assert L.pop() == S.popmax()
+
+        L.check()
+
+    ks = np.random.randint(0, 2*K, size=100)
+    vs = np.random.uniform(-1, 1, size=100)
+    L.update_many(ks, vs)
+    L.check()
+    for k, v in zip(ks.tolist(), vs): S[k] = v
+    keys, vals = L.pop_k(len(S.items))
+    assert list(zip(keys.tolist(), vals)) == [S.popmax() for _ in range(len(keys))]
+
+
+def test_locator_variants():
+    for make in [lambda: DaryLocatorMaxHeap(d=4), lambda: DaryLocatorMaxHeap(d=8),
+                 lambda: DaryLocatorMaxHeap(d=3, cap=1), PairingLocatorMaxHeap]:
+        L = make()
+        S = SlowLocatorHeap()
+        for _ in range(2000):
+            r = np.random.uniform(0, 1)
+            k = int(np.random.randint(100))
+            if r < .6:
+                v = np.random.uniform(-1, 1)
+                L[k] = v
+                S[k] = v
+            elif r < .7 and S.items:
+                k = choice(list(S.items))
+                del L[k]
+                del S.items[k]
+            else:
+                assert S.items == {k: L[k] for k in range(100) if k in L}
+                if S.items:
+                    assert L.peek() == max(S.items.items(), key=lambda x: x[1])
+                    assert L.pop() == S.popmax()
+            assert len(L) == len(S)
+            L.check()
+
+    vs = np.random.uniform(0, 1, 50)
+    L = DaryLocatorMaxHeap(d=4, keys=list(range(50)), values=vs)
+    L.check()
+    assert [L.pop()[1] for _ in range(50)] == sorted(vs, reverse=True)
+
+
+def bench_variants(n=10_000, steps=200_000):
+    "Push-heavy, pop-heavy, and update-heavy workloads for each locator heap."
+    from arsenal.timer import Benchmark
+
+    heaps = {
+        'LocatorMaxHeap': LocatorMaxHeap,
+        'DaryLocatorMaxHeap(d=4)': lambda: DaryLocatorMaxHeap(d=4),
+        'DaryLocatorMaxHeap(d=8)': lambda: DaryLocatorMaxHeap(d=8),
+        'PairingLocatorMaxHeap': PairingLocatorMaxHeap,
+    }
+
+    ks = np.random.randint(0, n, size=steps).tolist()
+    vs = np.random.uniform(0, 1, size=steps).tolist()
+
+    def push_heavy(H):
+        # distinct keys, nothing popped until the end
+        for i, v in enumerate(vs): H[i] = v
+        for _ in range(n): H.pop()
+
+    def pop_heavy(H):
+        for i in range(n): H[i] = vs[i]
+        for k, v in zip(ks, vs):
+            H.pop()
+            H[k] = v
+
+    def update_heavy(H):
+        for i in range(n): H[i] = vs[i]
+        for k, v in zip(ks, vs):
+            H[k] = H[k] + v if v < .8 else v * .1   # mostly increases, some decreases
+
+    for workload in [push_heavy, pop_heavy, update_heavy]:
+        T = Benchmark(workload.__name__)
+        for _ in range(3):
+            for name, make in heaps.items():
+                with T[name]: workload(make())
+        T.compare()
+
+
+def bench_locators(n=10_000, steps=200_000):
+    "Dijkstra-like workload: random upserts to integer keys interleaved with pops."
+    from arsenal.timer import Benchmark
+    from arsenal.datastructures.pdict import pdict
+
+    ks = np.random.randint(0, n, size=steps)
+    vs = np.random.uniform(0, 1, size=steps)
+    pops = np.random.uniform(0, 1, size=steps) < 0.3
+    ks_list, vs_list, pops_list = ks.tolist(), vs.tolist(), pops.tolist()
+
+    def run(H, negate=False):
+        for k, v, p in zip(ks_list, vs_list, pops_list):
+            if p and H:
+                H.popitem()
+            else:
+                H[k] = -v if negate else v
+
+    T = Benchmark('locator heaps')
+    for _ in range(3):
+        with T['LocatorMaxHeap']: run(LocatorMaxHeap())
+        with T['IntLocatorMaxHeap']: run(IntLocatorMaxHeap(n))
+        with T['pdict']: run(pdict(), negate=True)
+        with T['IntLocatorMaxHeap.update_many']:
+            H = IntLocatorMaxHeap(n)
+            H.update_many(ks, vs)
+            H.pop_k(n)
+    T.compare()
+
+
 if __name__ == '__main__':
-    from arsenal import testing_framework
-    testing_framework(globals())
+    import sys
+    if sys.argv[1:] == ['bench']:
+        bench_locators()
+        bench_variants()
+    else:
+        from arsenal import testing_framework
+        testing_framework(globals())
@@ -2,7 +2,8 @@ import numpy as np
 from collections import Counter
 
 from arsenal.maths.rvs import (
-    TruncatedDistribution, Mixture, cdf, sample_dict,
+    TruncatedDistribution, Mixture, cdf, sample_dict, gumbel_topk,
+    WeightedReservoir,
 )
 
 
@@ -67,3 +68,70 @@ def test_sample_dict():
 
     x = sample_dict(ws, u=.91)
     assert x == 'b'
+
+
+def _first_two(w):
+    "Exact distribution over the first two items drawn without replacement from `w`."
+    W = sum(w)
+    return {(i, j): w[i]/W * w[j]/(W - w[i])
+            for i in range(len(w)) for j in range(len(w)) if i != j and w[i] * w[j] > 0}
+
+
+def _check_first_two(draw, w, reps=20_000):
+    want = _first_two(w)
+    c = Counter(tuple(draw(seed)[:2]) for seed in range(reps))
+    assert set(c) <= set(want)
+    for x in want:
+        assert abs(c[x]/reps - want[x]) < 0.01, [x, c[x]/reps, want[x]]
+
+
+def test_gumbel_topk():
+    w = [1, 2, 3, 4, 0, 10]
+    _check_first_two(lambda seed: gumbel_topk(w, 2, seed=seed).tolist(), w)
+    with np.errstate(divide='ignore'):
+        _check_first_two(lambda seed: gumbel_topk(np.log(w), 3, log=True, seed=seed, chunk=2).tolist(), w)
+    assert sorted(gumbel_topk(w, 5).tolist()) == [0, 1, 2, 3, 5]
+    assert gumbel_topk(w, 0).tolist() == []
+    assert gumbel_topk([], 0).tolist() == []
+
+
+def test_weighted_reservoir():
+    w = [1, 2, 3, 4, 0, 10]
+
+    def add(seed):
+        R = WeightedReservoir(2, seed=seed)
+        for i, x in enumerate(w): R.add(i, x)
+        return R.sample()
+
+    def extend(seed):
+        R = WeightedReservoir(2, seed=seed)
+        R.extend(range(3), w[:3])
+        R.extend(range(3, 6), w[3:])
+        return R.sample()
+
+    _check_first_two(add, w)
+    for seed in range(100):
+        assert add(seed) == extend(seed)   # same random draws
+
+    R = WeightedReservoir(0)
+    R.add('a', 1)
+    R.extend('bc', [1, 2])
+    assert len(R) == 0 and R.sample() == [] and R.n == 3
+
+
+def bench_swor(n=10**7, k=100):
+    "Compare the samplers without replacement on a large weight array."
+    from arsenal.timer import Benchmark
+    from arsenal.datastructures.heap import SumHeap
+    w = np.random.uniform(0, 1, size=n)
+    items = np.arange(n)
+    T = Benchmark(f'swor n={n} k={k}')
+    for _ in range(3):
+        with T['SumHeap.swor']: SumHeap(w).swor(k)
+        with T['gumbel_topk']: gumbel_topk(w, k)
+        with T['WeightedReservoir']: WeightedReservoir(k).extend(items, w)
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_swor()
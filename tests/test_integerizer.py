@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from arsenal.alphabet import Alphabet
+from arsenal.assertions import assert_throws
+from arsenal.integerizer import Integerizer
+
+
+def test_encode_array():
+    words = np.random.choice(['the', 'cat', 'sat', 'on', 'mat', 'a'], size=(50, 3))
+    for A in [Integerizer, Alphabet]:
+        # all input types agree with encoding one key at a time
+        want = A()
+        want_codes = [want.encode(x) for x in words.ravel().tolist()]
+        for xs in [words, words.ravel().tolist(), iter(words.ravel().tolist()),
+                   pd.Categorical(words.ravel()), pd.Series(words.ravel(), dtype='category')]:
+            a = A()
+            codes = a.encode_array(xs)
+            assert codes.dtype == np.int32
+            assert codes.ravel().tolist() == want_codes and list(a) == list(want)
+            assert (a.decode_array(codes) == words.reshape(codes.shape)).all()
+        assert words.shape == A().encode_array(words).shape
+        assert A().encode_array([1, 2], dtype=np.int64).dtype == np.int64
+
+        # existing keys keep their codes
+        a = A(); a.encode('sat')
+        assert a.encode_array(np.array(['cat', 'sat', 'cat'])).tolist() == [1, 0, 1]
+
+        a.freeze()
+        with assert_throws(ValueError):
+            a.encode_array(np.array(['dog']))
+
+    # tuples (object keys) decode as keys, not as rows
+    a = Integerizer()
+    codes = a.encode_array([(1, 2), (3, 4), (1, 2)])
+    assert a.decode_array(codes).tolist() == [(1, 2), (3, 4), (1, 2)]
+    x = np.array([[None, 'a'], [1, None]], dtype=object)
+    assert a.encode_array(x).tolist() == [[2, 3], [4, 2]]
+    assert a.decode_array([2, 3, 4]).tolist() == [None, 'a', 1]
+
+    with assert_throws(AssertionError):
+        Integerizer().encode_array(pd.Categorical(['a', None]))
+
+
+def test_encode_array_nan():
+    nan = float('nan')
+    for A in [Integerizer, Alphabet]:
+        a = A()
+        assert a.encode_array(np.array([1.0, nan, 2.0])).tolist() == [0, 1, 2]
+        assert a.encode_array(np.array([2.0, nan])).tolist() == [2, 1]
+        assert a.encode_array(pd.Series([nan, 1.0])).tolist() == [1, 0]
+        assert a.encode_array([1.0, np.nan, 3.0]).tolist() == [0, 1, 3]
+        assert np.isnan(a.decode_array([1])[0])
+
+
+def test_decode_array_cache():
+    a = Integerizer()
+    assert a.decode_array([]).tolist() == []
+    a.encode_array(np.arange(10))
+    assert a.decode_array([]).dtype == object and a.decode_array(np.empty((0, 2), dtype=int)).shape == (0, 2)
+    assert a.decode_array([3, 9]).tolist() == [3, 9]
+    buf = a._decoder
+    assert a.decode_array([0]).tolist() == [0] and a._decoder is buf
+    a.encode_array(np.arange(10, 15))   # doubles the capacity
+    assert a.decode_array([14, 2]).tolist() == [14, 2] and len(a._decoder) == 20
+    buf = a._decoder
+    a.encode_array(np.arange(15, 18))   # grows within the capacity
+    assert a.decode_array([17, 2]).tolist() == [17, 2] and a._decoder is buf
+    a.encode_array(np.arange(1000))
+    assert a.decode_array(np.arange(1000)).tolist() == list(range(1000))
+
+
+def test_merge():
+    a = Integerizer(list('abc'))
+    b = Integerizer(list('dcbe'))
+    xs = list('cbdeed')
+    remap = a.merge(b)
+    assert remap[b.encode_array(xs)].tolist() == a.encode_array(xs).tolist()
+    assert list(a) == list('abcde')
+
+    c = Alphabet('xyz')
+    assert c.merge(Alphabet('zw')).tolist() == [2, 3]
+
+
+def bench_encode_array():
+    from arsenal.timer import Benchmark
+    vocab = np.array([f'w{i}' for i in range(50_000)])
+    tokens = vocab[np.random.zipf(1.3, size=2_000_000) % len(vocab)]
+    as_list = tokens.tolist()
+    T = Benchmark(f'encode {len(tokens):,} tokens')
+    for _ in range(3):
+        with T['encode (list)']: Integerizer().encode(as_list)
+        with T['encode_array (list)']: Integerizer().encode_array(as_list)
+        with T['encode_array (ndarray)']: Integerizer().encode_array(tokens)
+        cat = pd.Categorical(tokens)
+        with T['encode_array (Categorical)']: Integerizer().encode_array(cat)
+    T.compare()
+
+
+if __name__ == '__main__':
+    bench_encode_array()